@@ -1,28 +1,29 @@
 import json
-import mysql.connector
 from datetime import datetime
 from typing import List, Dict, Any
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.engine_registry import engine_registry
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 class FeedbackService:
     def __init__(self):
-        self.db_config = {
-            'host': os.getenv('MYSQL_HOST', 'localhost'),
-            'port': int(os.getenv('MYSQL_PORT', 3306)),
-            'user': os.getenv('MYSQL_USER'),
-            'password': os.getenv('MYSQL_PASSWORD'),
-            'database': os.getenv('MYSQL_DATABASE', 'org_insights')
-        }
         self.init_database()
     
+    def _connect(self):
+        """Borrow a connection from the shared pool; close() hands it back"""
+        return engine_registry.raw_connection()
+    
     def init_database(self):
         """Initialize the feedback database"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Create feedback table
@@ -59,7 +60,7 @@ class FeedbackService:
     
     def submit_feedback(self, feedback_data: Dict[str, Any]) -> Dict[str, Any]:
         """Submit user feedback"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -84,7 +85,7 @@ class FeedbackService:
     
     def get_pending_feedbacks(self) -> List[Dict[str, Any]]:
         """Get all pending feedbacks for admin review"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -112,7 +113,7 @@ class FeedbackService:
     
     def approve_feedback(self, feedback_id: int) -> Dict[str, Any]:
         """Approve feedback and add to training data"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Get feedback details
@@ -144,7 +145,7 @@ class FeedbackService:
     
     def reject_feedback(self, feedback_id: int) -> Dict[str, Any]:
         """Reject feedback"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('UPDATE feedback SET status = %s WHERE id = %s', ('rejected', feedback_id))
@@ -156,7 +157,7 @@ class FeedbackService:
     
     def get_training_data(self) -> List[Dict[str, Any]]:
         """Get all training data"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -181,7 +182,7 @@ class FeedbackService:
     
     def add_training_data(self, training_data: Dict[str, Any]) -> Dict[str, Any]:
         """Add new training data"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -202,7 +203,7 @@ class FeedbackService:
     
     def get_semantic_context(self, query: str) -> List[Dict[str, Any]]:
         """Get relevant training data for semantic enhancement"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Simple keyword matching - in production, use vector similarity
@@ -227,7 +228,7 @@ class FeedbackService:
     
     def get_all_feedbacks(self) -> List[Dict[str, Any]]:
         """Get all feedbacks for admin review"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -255,7 +256,7 @@ class FeedbackService:
     
     def create_feedback(self, feedback_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new feedback"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -281,7 +282,7 @@ class FeedbackService:
     
     def update_feedback(self, feedback_id: int, update_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update existing feedback"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Build dynamic update query
@@ -294,6 +295,7 @@ class FeedbackService:
                 update_values.append(value)
         
         if not update_fields:
+            conn.close()
             raise ValueError("No fields to update")
         
         update_values.append(feedback_id)
@@ -316,7 +318,7 @@ class FeedbackService:
     
     def delete_feedback(self, feedback_id: int) -> Dict[str, Any]:
         """Delete feedback"""
-        conn = mysql.connector.connect(**self.db_config)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM feedback WHERE id = %s', (feedback_id,))
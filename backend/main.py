@@ -1,9 +1,11 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
+import asyncio
 import logging
 import uuid
 from datetime import datetime
@@ -19,9 +21,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'smbc_reporting_tool', 'backend'))
 
 from src.core.config import Config
-from src.services.schema_cache import SchemaCache
+from src.services.schema_state import schema_watcher
+from src.services.schema_index import schema_index
+from src.services.value_dictionary import value_dictionary
+from src.services.llm_cache import llm_cache
+from src.services.prompt_builder import prompt_stats
+from src.services.semantic_cache import semantic_cache
+from src.services.sql_templates import sql_templates
 from src.services.database import DatabaseManager
-from src.services.ai_service import AIService
+from src.services.ai_service import AsyncAIService
+from src.services.engine_registry import engine_registry
+from src.services.replica_router import replica_router
+from src.services import query_cache
+from src.services.typed_tables import TypedTableMaterializer
+from src.services.rollups import RollupRefresher, rollup_router
+from src.services.index_advisor import index_advisor
+from src.services.result_pages import result_pager
+from src.services.local_mirror import local_mirror
+from src.utils.sql_text import is_read_only
+from src.utils.result_format import iter_ndjson, iter_json_array, sse_event, to_records, to_columns
 from feedback_service import FeedbackService
 from ccr_endpoints import upload_images, configure_cropping, analyze, download_report, get_image, get_templates, select_template
 
@@ -37,7 +55,6 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global schema
     logger.info("Starting Counterparty Risk Assistant API...")
     
     # Test database connection
@@ -45,18 +62,21 @@ async def lifespan(app: FastAPI):
         logger.error("Database connection failed!")
         raise Exception("Database connection failed")
     
-    # Load or generate schema
-    try:
-        schema = schema_cache.load_schema_from_cache()
-        logger.info("Schema loaded from cache")
-    except FileNotFoundError:
-        logger.info("No schema cache found, generating...")
-        schema = schema_cache.save_schema_to_cache()
-        logger.info("Schema generated and cached")
+    # Load the cached schema if its fingerprint still matches, else regenerate; then keep polling
+    state = schema_watcher.load()
+    logger.info(f"Schema version {state.version} loaded")
+    schema_watcher.start()
+    value_dictionary.load()
+    value_dictionary.start()
     
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await schema_watcher.stop()
+    await value_dictionary.stop()
+    await ai_service.aclose()
+    await engine_registry.dispose_async()
+    engine_registry.dispose()
 
 app = FastAPI(title="Counterparty Risk Assistant API", version="1.0.0", lifespan=lifespan)
 
@@ -77,6 +97,7 @@ class ChatRequest(BaseModel):
 class ConfirmRequest(BaseModel):
     confirmed: bool
     session_id: str
+    result_format: str = "records"  # "records" (one object per row) or "columns" (one array per column)
 
 class RefineRequest(BaseModel):
     original_question: str
@@ -126,10 +147,18 @@ class FeedbackUpdateRequest(BaseModel):
     response: str = None
     status: str = None
 
+class CacheInvalidateRequest(BaseModel):
+    tables: list = None
+
+class IndexApplyRequest(BaseModel):
+    table: str
+    columns: List[str]
+
 class ChatResponse(BaseModel):
     response: str
     sql_query: str = None
     raw_data: list = None
+    columns: list = None
     row_count: int = 0
     success: bool
     session_id: str
@@ -138,18 +167,159 @@ class ChatResponse(BaseModel):
     needs_confirmation: bool = False
     interpreted_question: dict = None
     data_sources: list = None
+    truncated: bool = False
+    result_handle: str = None
+    next_cursor: str = None
 
 # Global instances
 config = Config()
-schema_cache = SchemaCache()
 db_manager = DatabaseManager()
-ai_service = AIService()
+ai_service = AsyncAIService()
 feedback_service = FeedbackService()
-schema = None
+
+@schema_watcher.on_change
+def _drop_schema_keyed_state(old, new):
+    """Cached results and rollup availability may reference dropped or changed columns"""
+    if old.version:
+        query_cache.invalidate()
+        rollup_router.reset()
+        semantic_cache.evict()
+
+@schema_watcher.on_change
+def _rebuild_schema_index(old, new):
+    """Build the pruning index with the schema rather than on the first question"""
+    if new.text:
+        schema_index.get(new.text)
+
+@schema_watcher.on_change
+def _rescan_value_dictionaries(old, new):
+    """Dictionary columns may have been renamed or retyped"""
+    if old.version:
+        value_dictionary.refresh(force=True)
 
 # Session storage (in production, use Redis or database)
 sessions = {}
 
+async def _answer_question(question: str) -> dict:
+    """SQL (from the template engine, the semantic cache or the LLM) and, when it is read-only, its result"""
+    question_vector, cached = None, None
+    
+    # Formulaic questions get their SQL locally: no embedding, training context or LLM call
+    matched = ai_service.template_sql(question)
+    if matched:
+        logger.info(f"SQL template '{matched['template']}' answered: {question}")
+        result = await db_manager.execute_query_async(matched["sql"]) if is_read_only(matched["sql"]) else None
+        return {"sql_query": matched["sql"], "question_vector": None, "cached": None, "result": result}
+    
+    training_context = await run_in_threadpool(feedback_service.get_semantic_context, question)
+    
+    # Reuse the SQL of a confirmed near-duplicate question, else generate it with training context
+    if semantic_cache.enabled:
+        try:
+            question_vector = await ai_service.embed(question)
+            cached = semantic_cache.lookup(question, question_vector, schema_watcher.current.fingerprint)
+        except Exception as e:
+            logger.warning(f"Semantic cache unavailable: {str(e)}")
+    if cached:
+        logger.info(f"Semantic cache hit ({cached['score']}) for: {cached['question']}")
+        sql_query = cached["sql"]
+    else:
+        sql_query = await ai_service.question_to_sql(question, schema_watcher.schema, training_context)
+    
+    result = await db_manager.execute_query_async(sql_query) if is_read_only(sql_query) else None
+    return {"sql_query": sql_query, "question_vector": question_vector, "cached": cached, "result": result}
+
+def _speculate(question: str) -> asyncio.Task:
+    """Answer the question while the user reads the interpretation; /confirm picks the task up"""
+    task = asyncio.create_task(_answer_question(question))
+    # Mark failures as retrieved: a declined or abandoned speculation is never awaited
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+def _cancel_speculation(pending: dict):
+    speculation = (pending or {}).get("speculation")
+    if speculation is not None and not speculation.done():
+        speculation.cancel()
+
+async def _run_confirmed(session_id: str, pending: dict) -> dict:
+    """Everything /confirm does before narrating: SQL, execution, first result page, data sources"""
+    original_question = pending.get("original_question", "")
+    
+    # Clear pending confirmation first
+    sessions[session_id].pop("pending_confirmation", None)
+    
+    # Use the answer speculated since /chat when it succeeded, else produce it now
+    answer = None
+    speculation = pending.get("speculation")
+    if speculation is not None and not speculation.cancelled():
+        try:
+            answer = await speculation
+        except Exception as e:
+            logger.warning(f"Speculative answer failed, retrying: {str(e)}")
+    if answer is None:
+        answer = await _answer_question(original_question)
+    sql_query, question_vector, cached = answer["sql_query"], answer["question_vector"], answer["cached"]
+    
+    # Execute query (speculation only runs read-only SQL ahead of the confirmation)
+    result = answer["result"] if answer["result"] is not None else await db_manager.execute_query_async(sql_query)
+    
+    # Past ROW_LIMIT, serve the first page and hand back a cursor for the rest
+    first_page = None
+    if result["success"] and result.get("truncated"):
+        try:
+            first_page = await run_in_threadpool(result_pager.open, sql_query, result["columns"], config.ROW_LIMIT)
+        except Exception as e:
+            logger.warning(f"Result paging unavailable: {str(e)}")
+        if first_page:
+            result = {**result, "data": first_page["data"], "row_count": first_page["row_count"]}
+    
+    if result["success"] and question_vector is not None and not cached:
+        semantic_cache.add(original_question, sql_query, question_vector, schema_watcher.current.fingerprint)
+    
+    # Extract data sources
+    data_sources = []
+    sql_lower = sql_query.lower()
+    if 'counterparty_new' in sql_lower:
+        data_sources.append('counterparty_new')
+    if 'trade_new' in sql_lower:
+        data_sources.append('trade_new')
+    if 'concentration_new' in sql_lower:
+        data_sources.append('concentration_new')
+    
+    return {
+        "question": original_question,
+        "sql_query": sql_query,
+        "formatted_sql": ai_service.format_sql(sql_query),
+        "result": result,
+        "first_page": first_page,
+        "data_sources": data_sources
+    }
+
+def _result_payload(run: dict, raw_data_serializable: list, result_format: str) -> dict:
+    """Row fields of a confirmed answer; column-oriented names each column once instead of once per row"""
+    result, first_page = run["result"], run["first_page"]
+    return {
+        "raw_data": to_columns(result["columns"], result["data"]) if result_format == "columns" else raw_data_serializable,
+        "columns": result["columns"] if result_format == "columns" else None,
+        "row_count": result["row_count"],
+        "truncated": result.get("truncated", False),
+        "result_handle": first_page["handle"] if first_page else None,
+        "next_cursor": first_page["next_cursor"] if first_page else None
+    }
+
+def _record_answer(session_id: str, run: dict, natural_response: str, raw_data_serializable: list):
+    """Store in session history"""
+    sessions[session_id]["history"].append({
+        "question": run["question"],
+        "sql": run["sql_query"],
+        "response": natural_response,
+        "raw_data": raw_data_serializable,
+        "row_count": run["result"]["row_count"],
+        "data_sources": run["data_sources"],
+        "timestamp": datetime.now().isoformat(),
+        "success": True
+    })
+
 
 
 @app.get("/health")
@@ -184,12 +354,13 @@ async def chat(request: ChatRequest):
             )
         
         # Generate structured interpretation of the question
-        interpretation = ai_service.interpret_question(request.message)
+        interpretation = await ai_service.interpret_question(request.message)
         
-        # Store pending question for confirmation
+        # Store pending question for confirmation and start answering it speculatively
         sessions[session_id]["pending_confirmation"] = {
             "original_question": request.message,
-            "interpretation": interpretation
+            "interpretation": interpretation,
+            "speculation": _speculate(request.message)
         }
         
         return ChatResponse(
@@ -206,19 +377,12 @@ async def chat(request: ChatRequest):
         
         if result["success"]:
             # Generate natural language response
-            natural_response = ai_service.generate_natural_response(
+            natural_response = await ai_service.generate_natural_response(
                 request.message, sql_query, result["data"]
             )
             
             # Convert raw data to serializable format
-            raw_data_serializable = []
-            if result["data"]:
-                for row in result["data"]:
-                    if hasattr(row, '_fields'):
-                        row_dict = {col: getattr(row, col) for col in row._fields}
-                        raw_data_serializable.append(row_dict)
-                    else:
-                        raw_data_serializable.append(dict(row) if hasattr(row, 'keys') else str(row))
+            raw_data_serializable = to_records(result["columns"], result["data"])
             
             # Store in session history
             sessions[session_id]["history"].append({
@@ -277,6 +441,40 @@ async def get_session_history(session_id: str):
     
     return sessions[session_id]["history"]
 
+@app.get("/sessions/{session_id}/export")
+async def export_session_result(session_id: str, format: str = "ndjson", index: int = -1):
+    """Stream the full, untruncated result of a previously answered question"""
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'json'")
+    
+    answered = [entry for entry in sessions[session_id]["history"] if entry.get("success") and entry.get("sql")]
+    try:
+        sql_query = answered[index]["sql"]
+    except IndexError:
+        raise HTTPException(status_code=404, detail="No query result to export")
+    if not is_read_only(sql_query):
+        raise HTTPException(status_code=400, detail="Only read-only queries can be exported")
+
+    stream = db_manager.stream_query(sql_query)
+    try:
+        columns = await run_in_threadpool(next, stream)
+    except Exception as e:
+        logger.error(f"Error starting export for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if format == "ndjson":
+        body, media_type, extension = iter_ndjson(columns, stream), "application/x-ndjson", "ndjson"
+    else:
+        body, media_type, extension = iter_json_array(columns, stream), "application/json", "json"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="export-{session_id}.{extension}"'}
+    )
+
 @app.post("/confirm", response_model=ChatResponse)
 async def confirm_question(request: ConfirmRequest):
     """Handle question confirmation"""
@@ -291,84 +489,39 @@ async def confirm_question(request: ConfirmRequest):
         
         if request.confirmed:
             # User confirmed - execute the query
-            original_question = pending.get("original_question", "")
-            
-            # Clear pending confirmation first
-            if "pending_confirmation" in sessions[request.session_id]:
-                del sessions[request.session_id]["pending_confirmation"]
-            
-            # Get training context for semantic enhancement
-            training_context = feedback_service.get_semantic_context(original_question)
-            
-            # Generate SQL query with training context
-            sql_query = ai_service.question_to_sql(original_question, schema, training_context)
-            formatted_sql = ai_service.format_sql(sql_query)
-            
-            # Execute query
-            result = db_manager.execute_query(sql_query)
+            run = await _run_confirmed(request.session_id, pending)
+            result = run["result"]
             
             if result["success"]:
                 # Generate natural language response
-                natural_response = ai_service.generate_natural_response(
-                    original_question, sql_query, result["data"]
+                natural_response = await ai_service.generate_natural_response(
+                    run["question"], run["sql_query"], result["data"]
                 )
                 
                 # Convert raw data to serializable format
-                raw_data_serializable = []
-                if result["data"]:
-                    for row in result["data"]:
-                        if hasattr(row, '_fields'):
-                            row_dict = {col: getattr(row, col) for col in row._fields}
-                            raw_data_serializable.append(row_dict)
-                        else:
-                            raw_data_serializable.append(dict(row) if hasattr(row, 'keys') else str(row))
-                
-                # Extract data sources
-                data_sources = []
-                sql_lower = sql_query.lower()
-                if 'counterparty_new' in sql_lower:
-                    data_sources.append('counterparty_new')
-                if 'trade_new' in sql_lower:
-                    data_sources.append('trade_new')
-                if 'concentration_new' in sql_lower:
-                    data_sources.append('concentration_new')
-                
-                # Store in session history
-                sessions[request.session_id]["history"].append({
-                    "question": original_question,
-                    "sql": sql_query,
-                    "response": natural_response,
-                    "raw_data": raw_data_serializable,
-                    "row_count": result['row_count'],
-                    "data_sources": data_sources,
-                    "timestamp": datetime.now().isoformat(),
-                    "success": True
-                })
+                raw_data_serializable = to_records(result["columns"], result["data"])
+                _record_answer(request.session_id, run, natural_response, raw_data_serializable)
                 
                 return ChatResponse(
                     response=natural_response,
-                    sql_query=formatted_sql,
-                    raw_data=raw_data_serializable,
-                    row_count=result['row_count'],
+                    sql_query=run["formatted_sql"],
                     success=True,
                     session_id=request.session_id,
                     timestamp=datetime.now().isoformat(),
-                    data_sources=data_sources
+                    data_sources=run["data_sources"],
+                    **_result_payload(run, raw_data_serializable, request.result_format)
                 )
             else:
-                # Clear pending confirmation
-                if "pending_confirmation" in sessions[request.session_id]:
-                    del sessions[request.session_id]["pending_confirmation"]
-                
                 return ChatResponse(
                     response=f"Query failed: {result['error']}",
-                    sql_query=formatted_sql,
+                    sql_query=run["formatted_sql"],
                     success=False,
                     session_id=request.session_id,
                     timestamp=datetime.now().isoformat()
                 )
         else:
-            # User declined - ask for clarification
+            # User declined - drop the speculative answer and ask for clarification
+            _cancel_speculation(pending)
             if "pending_confirmation" in sessions[request.session_id]:
                 del sessions[request.session_id]["pending_confirmation"]
             
@@ -383,12 +536,50 @@ async def confirm_question(request: ConfirmRequest):
         logger.error(f"KeyError in confirmation: {e}")
         # Reset session state
         if request.session_id in sessions:
-            sessions[request.session_id].pop("pending_confirmation", None)
+            _cancel_speculation(sessions[request.session_id].pop("pending_confirmation", None))
         raise HTTPException(status_code=500, detail=f"Session error: {str(e)}")
     except Exception as e:
         logger.error(f"Error confirming question: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/confirm/stream")
+async def confirm_question_stream(request: ConfirmRequest):
+    """/confirm as server-sent events: `sql`, then `rows`, then narrative `token`s and a final `done`"""
+    if request.session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    pending = sessions[request.session_id].get("pending_confirmation")
+    if not pending:
+        raise HTTPException(status_code=400, detail="No pending confirmation")
+    if not request.confirmed:
+        return await confirm_question(request)
+    
+    async def events():
+        try:
+            run = await _run_confirmed(request.session_id, pending)
+            result = run["result"]
+            yield sse_event("sql", {"sql_query": run["formatted_sql"], "data_sources": run["data_sources"]})
+            if not result["success"]:
+                yield sse_event("error", {"detail": f"Query failed: {result['error']}"})
+                return
+            
+            raw_data_serializable = to_records(result["columns"], result["data"])
+            yield sse_event("rows", _result_payload(run, raw_data_serializable, request.result_format))
+            
+            parts = []
+            async for delta in ai_service.stream_natural_response(run["question"], run["sql_query"], result["data"]):
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+            natural_response = "".join(parts).strip()
+            _record_answer(request.session_id, run, natural_response, raw_data_serializable)
+            yield sse_event("done", {"response": natural_response, "session_id": request.session_id,
+                                     "timestamp": datetime.now().isoformat()})
+        except Exception as e:
+            logger.error(f"Error streaming confirmation: {e}")
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/refine", response_model=ChatResponse)
 async def refine_question(request: RefineRequest):
     """Refine a question based on user feedback"""
@@ -421,7 +612,7 @@ async def generate_report(request: ReportRequest):
                 mock_results.append(MockRow(row_data))
         
         # Generate executive summary
-        executive_summary = ai_service.generate_executive_summary(
+        executive_summary = await ai_service.generate_executive_summary(
             request.question, request.sql_query, mock_results
         )
         
@@ -456,13 +647,21 @@ async def generate_report(request: ReportRequest):
         logger.error(f"Error generating report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/schema/tables/{table_name}")
+async def get_schema_table(table_name: str):
+    """Get one table's columns, keys, indexes, comments and size estimates from the structured schema cache"""
+    store = schema_watcher.current.store
+    table = store.table(table_name) if store is not None else None
+    if table is None:
+        raise HTTPException(status_code=404, detail="Table not found in schema cache")
+    return table
+
 @app.post("/schema/refresh")
 async def refresh_schema():
     """Refresh the database schema cache"""
-    global schema
     try:
-        schema = schema_cache.save_schema_to_cache()
-        return {"message": "Schema refreshed successfully"}
+        state = await run_in_threadpool(schema_watcher.refresh, True)
+        return {"message": "Schema refreshed successfully", **state.info()}
     except Exception as e:
         logger.error(f"Error refreshing schema: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -471,6 +670,8 @@ async def refresh_schema():
 async def submit_feedback(request: FeedbackRequest):
     try:
         result = feedback_service.submit_feedback(request.dict())
+        if request.type == "down":
+            semantic_cache.evict(request.originalQuery)
         return result
     except Exception as e:
         logger.error(f"Error submitting feedback: {str(e)}")
@@ -480,30 +681,23 @@ async def submit_feedback(request: FeedbackRequest):
 async def process_feedback(request: ProcessFeedbackRequest):
     try:
         # Get training context for semantic enhancement
-        context = feedback_service.get_semantic_context(request.original_query)
+        context = await run_in_threadpool(feedback_service.get_semantic_context, request.original_query)
         
         # Use the original successful query approach instead of generating new SQL
         # This prevents column existence errors
-        sql_query = ai_service.question_to_sql(request.original_query, schema, context)
-        result = db_manager.execute_query(sql_query)
+        sql_query = await ai_service.question_to_sql(request.original_query, schema_watcher.schema, context)
+        result = await db_manager.execute_query_async(sql_query)
         
         if result["success"]:
             # Generate response with feedback context but use original query structure
             response_context = f"Based on your feedback: {request.feedback}" if request.feedback else ""
-            natural_response = ai_service.generate_natural_response(
+            natural_response = await ai_service.generate_natural_response(
                 request.original_query, sql_query, result["data"]
             )
             if response_context:
                 natural_response = f"{response_context}\n\n{natural_response}"
             
-            raw_data_serializable = []
-            if result["data"]:
-                for row in result["data"]:
-                    if hasattr(row, '_fields'):
-                        row_dict = {col: getattr(row, col) for col in row._fields}
-                        raw_data_serializable.append(row_dict)
-                    else:
-                        raw_data_serializable.append(dict(row) if hasattr(row, 'keys') else str(row))
+            raw_data_serializable = to_records(result["columns"], result["data"])
             
             return ChatResponse(
                 response=natural_response,
@@ -607,6 +801,202 @@ async def add_training_data(request: TrainingDataRequest):
         logger.error(f"Error adding training data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/results/{handle}")
+async def get_result_page(handle: str, cursor: str = None, page_size: int = None, result_format: str = "records"):
+    """Fetch the next page of a truncated /confirm result"""
+    try:
+        page = await run_in_threadpool(result_pager.page, handle, cursor, page_size)
+        data = to_columns(page["columns"], page["data"]) if result_format == "columns" else to_records(page["columns"], page["data"])
+        return {
+            "handle": handle,
+            "columns": page["columns"],
+            "data": data,
+            "row_count": page["row_count"],
+            "next_cursor": page["next_cursor"]
+        }
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Result handle not found or expired")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching result page: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/db/pool-stats")
+async def get_pool_stats():
+    """Get connection pool statistics - requires admin access"""
+    try:
+        return engine_registry.pool_stats()
+    except Exception as e:
+        logger.error(f"Error getting pool stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/db/replicas")
+async def get_replica_status():
+    """Get read-replica health, lag and routing counts - requires admin access"""
+    try:
+        return replica_router.status()
+    except Exception as e:
+        logger.error(f"Error getting replica status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/query-cache/stats")
+async def get_query_cache_stats():
+    """Get query result cache statistics - requires admin access"""
+    return query_cache.query_cache.stats()
+
+@app.post("/admin/query-cache/invalidate")
+async def invalidate_query_cache(request: CacheInvalidateRequest = None):
+    """Invalidate cached query results, optionally only for some tables - requires admin access"""
+    try:
+        tables = request.tables if request else None
+        removed = query_cache.invalidate(tables)
+        return {"status": "invalidated", "entries_removed": removed, "tables": tables or "all"}
+    except Exception as e:
+        logger.error(f"Error invalidating query cache: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/semantic-cache/stats")
+async def get_semantic_cache_stats():
+    """Get near-duplicate question cache size and hit ratio - requires admin access"""
+    try:
+        return semantic_cache.stats()
+    except Exception as e:
+        logger.error(f"Error getting semantic cache stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/llm-cache/stats")
+async def get_llm_cache_stats():
+    """Get per-method LLM response cache hit ratios and saved latency - requires admin access"""
+    try:
+        return await run_in_threadpool(llm_cache.stats)
+    except Exception as e:
+        logger.error(f"Error getting LLM cache stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/llm-cache/clear")
+async def clear_llm_cache():
+    """Drop every cached LLM response, in memory and on disk - requires admin access"""
+    try:
+        removed = await run_in_threadpool(llm_cache.clear)
+        return {"status": "cleared", "entries_removed": removed}
+    except Exception as e:
+        logger.error(f"Error clearing LLM cache: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/sql-templates/stats")
+async def get_sql_template_stats():
+    """Get how many questions each local SQL template answered and how many fell through to the LLM - requires admin access"""
+    try:
+        return sql_templates.stats()
+    except Exception as e:
+        logger.error(f"Error getting SQL template stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/prompt-stats")
+async def get_prompt_stats():
+    """Get per-method prompt token counts, budget truncations and provider prefix-cache hits - requires admin access"""
+    try:
+        return prompt_stats.stats()
+    except Exception as e:
+        logger.error(f"Error getting prompt stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/typed-tables/refresh")
+async def refresh_typed_tables():
+    """Rebuild the typed shadow tables and the schema cache that points at them - requires admin access"""
+    try:
+        results = await run_in_threadpool(TypedTableMaterializer().refresh_all)
+        query_cache.invalidate([result["table"] for result in results])
+        rollups = await run_in_threadpool(RollupRefresher().refresh_all)
+        query_cache.invalidate([rollup["rollup"] for rollup in rollups])
+        await run_in_threadpool(schema_watcher.refresh, True)
+        mirrored = await run_in_threadpool(local_mirror.refresh) if local_mirror.enabled else []
+        return {"status": "refreshed", "tables": results, "rollups": rollups, "mirror": mirrored}
+    except Exception as e:
+        logger.error(f"Error refreshing typed tables: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/rollups/refresh")
+async def refresh_rollups():
+    """Incrementally refresh the rollup tables for changed as_of_date snapshots - requires admin access"""
+    try:
+        rollups = await run_in_threadpool(RollupRefresher().refresh_all)
+        query_cache.invalidate([rollup["rollup"] for rollup in rollups])
+        return {"status": "refreshed", "rollups": rollups}
+    except Exception as e:
+        logger.error(f"Error refreshing rollups: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/mirror/refresh")
+async def refresh_mirror():
+    """Snapshot the reporting tables into the local DuckDB mirror - requires admin access"""
+    try:
+        tables = await run_in_threadpool(local_mirror.refresh)
+        return {"status": "refreshed", "tables": tables}
+    except Exception as e:
+        logger.error(f"Error refreshing mirror: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/mirror/stats")
+async def get_mirror_stats():
+    """Get local mirror hit and MySQL fallback counts - requires admin access"""
+    try:
+        return local_mirror.stats()
+    except Exception as e:
+        logger.error(f"Error getting mirror stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/schema-index/stats")
+async def get_schema_index_stats():
+    """Get schema pruning coverage and prompt characters saved - requires admin access"""
+    try:
+        return schema_index.stats()
+    except Exception as e:
+        logger.error(f"Error getting schema index stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/value-dictionary/stats")
+async def get_value_dictionary_stats():
+    """Get distinct-value counts per dictionary column and last scan times - requires admin access"""
+    try:
+        return value_dictionary.stats()
+    except Exception as e:
+        logger.error(f"Error getting value dictionary stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/value-dictionary/refresh")
+async def refresh_value_dictionary(force: bool = False):
+    """Rescan dictionary columns of tables whose data changed (all with force=true) - requires admin access"""
+    try:
+        tables = await run_in_threadpool(value_dictionary.refresh, force)
+        return {"message": "Value dictionaries refreshed", "tables": tables}
+    except Exception as e:
+        logger.error(f"Error refreshing value dictionaries: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/index-advisor/report")
+async def index_advisor_report(limit: int = 20):
+    """Rank missing indexes for the captured query workload by EXPLAIN-estimated benefit - requires admin access"""
+    try:
+        return await run_in_threadpool(index_advisor.report, limit)
+    except Exception as e:
+        logger.error(f"Error building index advisor report: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/index-advisor/apply")
+async def index_advisor_apply(request: IndexApplyRequest):
+    """Create one recommended index (needs INDEX_ADVISOR_ALLOW_APPLY=true) - requires admin access"""
+    try:
+        return await run_in_threadpool(index_advisor.apply, request.table, request.columns)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error applying index: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/sample-data")
 @app.get("/api/sample-data")
 async def get_sample_data():
@@ -615,7 +1005,7 @@ async def get_sample_data():
         # First, try to get data from any available table
         # Check what tables exist in the database
         show_tables_query = "SHOW TABLES"
-        tables_result = db_manager.execute_query(show_tables_query)
+        tables_result = await db_manager.execute_query_async(show_tables_query)
         
         available_tables = []
         if tables_result["success"] and tables_result["data"]:
@@ -633,7 +1023,7 @@ async def get_sample_data():
         for table in available_tables:
             try:
                 desc_query = f"DESCRIBE {table}"
-                desc_result = db_manager.execute_query(desc_query)
+                desc_result = await db_manager.execute_query_async(desc_query)
                 if desc_result["success"] and desc_result["data"]:
                     columns = []
                     for col_row in desc_result["data"]:
@@ -723,17 +1113,11 @@ async def get_sample_data():
         for table_name, query in table_queries:
             try:
                 logger.info(f"Trying dynamic query for table: {table_name}")
-                result = db_manager.execute_query(query)
+                result = await db_manager.execute_query_async(query)
                 
                 if result["success"] and result["data"]:
                     # Convert to serializable format
-                    data = []
-                    for row in result["data"]:
-                        if hasattr(row, '_fields'):
-                            row_dict = {col: getattr(row, col) for col in row._fields}
-                            data.append(row_dict)
-                        else:
-                            data.append(dict(row) if hasattr(row, 'keys') else str(row))
+                    data = to_records(result["columns"], result["data"])
                     
                     logger.info(f"Successfully got {len(data)} records from {table_name}")
                     return {
@@ -753,17 +1137,12 @@ async def get_sample_data():
         for table_name in available_tables:
             try:
                 simple_query = f"SELECT * FROM {table_name}"
-                result = db_manager.execute_query(simple_query)
+                result = await db_manager.execute_query_async(simple_query)
                 
                 if result["success"] and result["data"]:
                     # Convert any table data to our format
                     data = []
-                    for i, row in enumerate(result["data"]):
-                        if hasattr(row, '_fields'):
-                            row_dict = {col: getattr(row, col) for col in row._fields}
-                        else:
-                            row_dict = dict(row) if hasattr(row, 'keys') else {"col1": str(row)}
-                        
+                    for i, row_dict in enumerate(to_records(result["columns"], result["data"])):
                         # Map available columns to our display format
                         mapped_row = {
                             "Entity": str(row_dict.get('entity_id', row_dict.get('counterparty_id', row_dict.get('id', f'ENT-{i+1}')))),
@@ -5,21 +5,84 @@ load_dotenv()
 
 class Config:
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+    OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 8))
+    OPENAI_TIMEOUT = int(os.environ.get("OPENAI_TIMEOUT", 60))
     
     MYSQL_HOST = os.environ.get("MYSQL_HOST", "localhost")
     MYSQL_PORT = int(os.environ.get("MYSQL_PORT", 3306))
     MYSQL_USER = os.environ.get("MYSQL_USER", "phpmyadmin")
     MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "StrongPasswordHere!")
     MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE", "org_insights")
+    MYSQL_REPLICA_HOSTS = [h.strip() for h in os.environ.get("MYSQL_REPLICA_HOSTS", "").split(",") if h.strip()]
+    REPLICA_MAX_LAG_SECONDS = int(os.environ.get("REPLICA_MAX_LAG_SECONDS", 30))
+    REPLICA_HEALTH_INTERVAL = int(os.environ.get("REPLICA_HEALTH_INTERVAL", 10))
     
     ROW_LIMIT = int(os.environ.get("ROW_LIMIT", 500))
+    RESULT_HANDLE_TTL = int(os.environ.get("RESULT_HANDLE_TTL", 1800))
+    RESULT_HANDLE_MAX = int(os.environ.get("RESULT_HANDLE_MAX", 200))
+    RESULT_SNAPSHOT_MAX_ROWS = int(os.environ.get("RESULT_SNAPSHOT_MAX_ROWS", 20000))
+    RESULT_SNAPSHOT_TOTAL_ROWS = int(os.environ.get("RESULT_SNAPSHOT_TOTAL_ROWS", 100000))
+    SCHEMA_POLL_INTERVAL = int(os.environ.get("SCHEMA_POLL_INTERVAL", 60))
+    SCHEMA_PRUNING_ENABLED = os.environ.get("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+    SCHEMA_PRUNE_TOP_TABLES = int(os.environ.get("SCHEMA_PRUNE_TOP_TABLES", 3))
+    SCHEMA_PRUNE_TOP_COLUMNS = int(os.environ.get("SCHEMA_PRUNE_TOP_COLUMNS", 15))
+    VALUE_DICTIONARY_COLUMNS = os.environ.get(
+        "VALUE_DICTIONARY_COLUMNS",
+        "counterparty_new.counterparty_sector,counterparty_new.internal_rating,counterparty_new.counterparty_country,"
+        "counterparty_new.entity,counterparty_new.product_type,trade_new.product_type,"
+        "concentration_new.concentration_group,concentration_new.entity"
+    )
+    VALUE_DICTIONARY_MAX_DISTINCT = int(os.environ.get("VALUE_DICTIONARY_MAX_DISTINCT", 500))
+    LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3")
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 512))
+    LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 86400))
+    LLM_CACHE_MAX_TEMPERATURE = float(os.environ.get("LLM_CACHE_MAX_TEMPERATURE", 0.1))
+    SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.92))
+    SEMANTIC_CACHE_CAPACITY = int(os.environ.get("SEMANTIC_CACHE_CAPACITY", 2000))
+    SEMANTIC_CACHE_EMBEDDING_MODEL = os.environ.get("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+    NARRATIVE_TOKEN_BUDGET = int(os.environ.get("NARRATIVE_TOKEN_BUDGET", 800))
+    PROMPT_SCHEMA_TOKEN_BUDGET = int(os.environ.get("PROMPT_SCHEMA_TOKEN_BUDGET", 1500))
+    PROMPT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("PROMPT_CONTEXT_TOKEN_BUDGET", 400))
+    PROMPT_QUESTION_TOKEN_BUDGET = int(os.environ.get("PROMPT_QUESTION_TOKEN_BUDGET", 200))
+    PROMPT_USAGE_LOG = os.environ.get("PROMPT_USAGE_LOG", "false").lower() == "true"
+    SQL_TEMPLATES_ENABLED = os.environ.get("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
     ALLOWED_SCHEMAS = os.environ.get("ALLOWED_SCHEMAS", "").split(",") if os.environ.get("ALLOWED_SCHEMAS") else []
     ALLOWED_TABLES = os.environ.get("ALLOWED_TABLES", "").split(",") if os.environ.get("ALLOWED_TABLES") else []
+    USE_TYPED_TABLES = os.environ.get("USE_TYPED_TABLES", "false").lower() == "true"
+    ROLLUP_ROUTING_ENABLED = os.environ.get("ROLLUP_ROUTING_ENABLED", "true").lower() == "true"
+    
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    
+    QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 256))
+    QUERY_CACHE_MAX_MB = int(os.environ.get("QUERY_CACHE_MAX_MB", 64))
+    QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", 900))
+    QUERY_CACHE_VERSION_TTL = int(os.environ.get("QUERY_CACHE_VERSION_TTL", 30))
+    
+    MIRROR_ENABLED = os.environ.get("MIRROR_ENABLED", "false").lower() == "true"
+    MIRROR_ONLY = os.environ.get("MIRROR_ONLY", "false").lower() == "true"
+    MIRROR_PATH = os.environ.get("MIRROR_PATH", "mirror.duckdb")
+    
+    INDEX_ADVISOR_ENABLED = os.environ.get("INDEX_ADVISOR_ENABLED", "true").lower() == "true"
+    INDEX_ADVISOR_ALLOW_APPLY = os.environ.get("INDEX_ADVISOR_ALLOW_APPLY", "false").lower() == "true"
     
     @property
     def mysql_connection_string(self):
         return f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
     
+    @property
+    def mysql_async_connection_string(self):
+        return f"mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+    
+    def replica_connection_string(self, host: str, port: int, driver: str = "pymysql"):
+        return f"mysql+{driver}://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{host}:{port}/{self.MYSQL_DATABASE}"
+    
     def validate(self):
         if not self.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is required")
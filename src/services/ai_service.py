@@ -1,5 +1,65 @@
-from openai import OpenAI
+import asyncio
+import functools
+import json
+import time
+from openai import AsyncOpenAI, OpenAI
 from src.core.config import Config
+from src.services.llm_cache import llm_cache, make_key
+from src.services.prompt_builder import PromptBuilder, prompt_stats
+from src.services.result_summary import summarize_results
+from src.services.schema_index import schema_index
+from src.services.schema_state import schema_watcher
+from src.services.sql_templates import sql_templates
+from src.services.typed_tables import typed_name
+from src.services.value_dictionary import value_dictionary
+
+# Columns the prompt rules below name explicitly; pruning must never drop them
+PROMPT_COLUMNS = (
+    "trade_id", "notional_usd", "batch_mtm", "as_of_date", "reporting_counterparty_id", "counterparty_id",
+    "counterparty_sector", "counterparty_name", "mpe", "mpe_limit", "counterparty_count",
+    "concentration_group", "concentration_value", "entity", "counterparty_country", "internal_rating"
+)
+
+NO_DATA_RESPONSE = "No data found for this query."
+
+def _strip(content: str) -> str:
+    return content.strip()
+
+def _parse_json(content: str):
+    """JSON from a completion, tolerating a ```json fence around it"""
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content.replace('```json', '').replace('```', '').strip()
+    return json.loads(content)
+
+def _ai_error(error: Exception):
+    raise Exception(f"AI service error: {error}")
+
+def _interpretation_fallback(question: str, error: Exception) -> dict:
+    """Fallback structure for any parsing errors"""
+    return {
+        "data_requested": f"Analysis of: {question}",
+        "analysis_type": "Data query and analysis", 
+        "context_significance": "Provides business insights from database"
+    }
+
+def _intent_array_fallback(error: Exception) -> list:
+    return [
+        "entity: Data",
+        "metrics: ANALYSIS"
+    ]
+
+def _explanation_fallback(error: Exception) -> str:
+    return f"Could not generate explanation: {error}"
+
+def _alternatives_fallback(error: Exception) -> str:
+    return "Try checking the date format or available data in the tables."
+
+def _executive_summary_fallback(results: list, error: Exception) -> str:
+    return f"Analysis of {len(results)} records shows key business insights related to the query."
+
+def _executive_report_fallback(error: Exception) -> str:
+    return f"Error generating executive report: {error}"
 
 class AIService:
     def __init__(self):
@@ -7,27 +67,108 @@ class AIService:
         self.config.validate()
         self.client = OpenAI(api_key=self.config.OPENAI_API_KEY)
     
-    def question_to_sql(self, question: str, schema: str, training_context: list = None) -> str:
-        # Handle system queries only
-        question_lower = question.lower()
+    def _cache_key(self, model: str, messages: list, temperature: float, max_tokens: int):
+        """(key, schema_tag) for a cacheable call, or None for sampled ones"""
+        if not self.config.LLM_CACHE_ENABLED or temperature > self.config.LLM_CACHE_MAX_TEMPERATURE:
+            return None
+        return make_key(model, messages, {"temperature": temperature, "max_tokens": max_tokens}), schema_watcher.current.fingerprint
+    
+    def _complete(self, method: str, prompt: str, temperature: float, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+        """Single-prompt chat completion, served from the LLM cache for low-temperature calls"""
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(model, messages, temperature, max_tokens)
+        if cache_key:
+            cached = llm_cache.get(method, *cache_key)
+            if cached is not None:
+                return cached
         
-        # MySQL system queries
-        if (("show" in question_lower or "all" in question_lower) and "users" in question_lower):
-            if "active" in question_lower:
-                return "SHOW PROCESSLIST;"
-            else:
-                return "SELECT User, Host FROM mysql.user;"
-        elif "active" in question_lower and "user" in question_lower:
-            return "SHOW PROCESSLIST;"
-        elif "show" in question_lower and "databases" in question_lower:
-            return "SHOW DATABASES;"
-        elif "show" in question_lower and "tables" in question_lower:
-            return "SHOW TABLES;"
-        elif "show" in question_lower and "processes" in question_lower:
-            return "SHOW PROCESSLIST;"
-        elif "current" in question_lower and "user" in question_lower:
-            return "SELECT USER(), CURRENT_USER();"
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        prompt_stats.record_usage(method, response.usage)
+        content = response.choices[0].message.content
+        if cache_key and content:
+            llm_cache.put(method, cache_key[0], content, time.perf_counter() - started, cache_key[1])
+        return content
+    
+    def _ask(self, request: dict, parse, fallback):
+        """`parse` the completion of `request`; if the call or the parsing fails, `fallback(error)`"""
+        try:
+            return parse(self._complete(**request))
+        except Exception as e:
+            return fallback(e)
+    
+    def _stream_complete(self, method: str, prompt: str, temperature: float, max_tokens: int, model: str = "gpt-4o-mini"):
+        """`_complete` as a generator of text deltas, requested with token streaming"""
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(model, messages, temperature, max_tokens)
+        if cache_key:
+            cached = llm_cache.get(method, *cache_key)
+            if cached is not None:
+                yield cached
+                return
         
+        started = time.perf_counter()
+        parts = []
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                prompt_stats.record_usage(method, chunk.usage)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        if cache_key and parts:
+            llm_cache.put(method, cache_key[0], "".join(parts), time.perf_counter() - started, cache_key[1])
+    
+    def _stream(self, request: dict, fallback):
+        """Text deltas of `request` as they arrive, or `fallback(error)` whole if it fails before the first"""
+        streamed = False
+        try:
+            for delta in self._stream_complete(**request):
+                yield delta if streamed else delta.lstrip()
+                streamed = True
+        except Exception as e:
+            if streamed:
+                raise
+            yield fallback(e)
+    
+    def stream_natural_response(self, question: str, sql_query: str, results: list):
+        if not results:
+            yield NO_DATA_RESPONSE
+            return
+        yield from self._stream(self._natural_response_request(question, results),
+                                functools.partial(self._natural_response_fallback, question, results))
+    
+    def stream_executive_report(self, question: str, sql_query: str, results: list, row_count: int):
+        yield from self._stream(self._executive_report_request(question, sql_query, results, row_count),
+                                _executive_report_fallback)
+    
+    def embed(self, text: str) -> list:
+        """Embedding vector for `text` (used by the semantic question cache)"""
+        response = self.client.embeddings.create(model=self.config.SEMANTIC_CACHE_EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+    
+    def question_to_sql(self, question: str, schema: str, training_context: list = None, value_hints: list = None) -> str:
+        # System queries and formulaic risk questions are answered without the LLM
+        matched = self.template_sql(question)
+        if matched:
+            return matched["sql"]
+        request = self._question_to_sql_request(question, schema, training_context, value_hints)
+        return self._ask(request, functools.partial(self._sql_from_response, question), _ai_error)
+    
+    def _question_to_sql_request(self, question: str, schema: str, training_context: list = None, value_hints: list = None) -> dict:
         # Get training context if not provided
         if training_context is None:
             from backend.feedback_service import FeedbackService
@@ -37,130 +178,169 @@ class AIService:
         # Build training context string
         context_str = ""
         if training_context:
-            context_str = "\n\nTRAINING CONTEXT (use this to improve query generation):\n"
             for ctx in training_context[:3]:  # Use top 3 relevant contexts
                 context_str += f"- Q: {ctx['question']}\n  A: {ctx['answer']}\n"
                 if ctx.get('context'):
                     context_str += f"  Context: {ctx['context']}\n"
         
+        # Literal spellings resolved against the value dictionaries
+        if value_hints is None:
+            value_hints = value_dictionary.resolve(question)
+        values_str = "".join(f"- {hint['column']} = '{hint['value']}' (question says \"{hint['mention']}\")\n"
+                             for hint in value_hints or [])
+        
         # Regular data queries
-        prompt = f"""
+        sql = self._sql_dialect()
+        trade, counterparty, concentration = sql["trade"], sql["counterparty"], sql["concentration"]
+        core_tables = (trade, counterparty, concentration)
+        core_schema = schema_index.tables(schema, core_tables)
+        schema, _ = schema_index.prune(question, schema, excluded_tables=core_tables, pinned_columns=PROMPT_COLUMNS)
+        # Everything through the core tables' schema depends only on USE_TYPED_TABLES and the schema
+        # version, so it forms a reusable prefix past the provider's caching threshold
+        prompt = PromptBuilder("question_to_sql").static(f"""
 Generate MySQL query using the exact schema provided.
 
-Schema: {schema}
-Question: {question}{context_str}
-
 CRITICAL TABLE AND COLUMN MAPPING:
 
-TRADE_NEW table has: trade_id, notional_usd, batch_mtm, as_of_date, reporting_counterparty_id
-COUNTERPARTY_NEW table has: counterparty_id, counterparty_sector, counterparty_name, mpe, mpe_limit
-CONCENTRATION_NEW table has: counterparty_count, concentration_group, entity
+{trade.upper()} table has: trade_id, notional_usd, batch_mtm, as_of_date, reporting_counterparty_id
+{counterparty.upper()} table has: counterparty_id, counterparty_sector, counterparty_name, mpe, mpe_limit
+{concentration.upper()} table has: counterparty_count, concentration_group, entity
 
 IMPORTANT RULES:
-- MPE (Market Price Exposure) is ONLY in counterparty_new table.
-- Use MPE filters (mpe IS NOT NULL AND mpe != '' AND mpe != '0') **ONLY** for MPE-related questions.
+- MPE (Market Price Exposure) is ONLY in {counterparty} table.
+- Use MPE filters ({sql["mpe_filter"]}) **ONLY** for MPE-related questions.
 - For exposure or trade-related questions (e.g., total notional, sector exposure, trade count), DO NOT apply MPE filters.
-- counterparty_sector is ONLY in counterparty_new table.
-- counterparty_count is ONLY in concentration_new table.
-- For CCR portfolio exposure questions, use mpe from counterparty_new.
+- counterparty_sector is ONLY in {counterparty} table.
+- counterparty_count is ONLY in {concentration} table.
+- For CCR portfolio exposure questions, use mpe from {counterparty}.{sql["typed_rule"]}
 
 Use correct aliases: 
-t = trade_new, c = counterparty_new, con = concentration_new
+t = {trade}, c = {counterparty}, con = {concentration}
 
 ### Examples of correct usage (follow these patterns):
 
 -- Sector analysis:
 SELECT c.counterparty_sector, COUNT(t.trade_id) AS trade_count
-FROM trade_new t
-JOIN counterparty_new c ON t.reporting_counterparty_id = c.counterparty_id
+FROM {trade} t
+JOIN {counterparty} c ON t.reporting_counterparty_id = c.counterparty_id
 GROUP BY c.counterparty_sector;
 
 -- Concentration group analysis:
-SELECT con.concentration_group, SUM(CAST(con.counterparty_count AS UNSIGNED)) AS total_count
-FROM concentration_new con
+SELECT con.concentration_group, SUM({sql["count_expr"]}) AS total_count
+FROM {concentration} con
 GROUP BY con.concentration_group;
 
 -- Monthly trend:
-SELECT DATE_FORMAT(as_of_date, '%Y-%m') AS month,
-       SUM(CAST(notional_usd AS DECIMAL(15,2))) AS monthly_notional
-FROM trade_new
-WHERE YEAR(as_of_date) = 2024
+SELECT DATE_FORMAT(t.as_of_date, '%Y-%m') AS month,
+       SUM({sql["notional_expr"]}) AS monthly_notional
+FROM {trade} t
+WHERE {sql["trend_year_filter"]}
 GROUP BY month
 ORDER BY month;
 
 -- MPE analysis:
-SELECT DATE_FORMAT(as_of_date, '%Y-%m') AS month,
-       SUM(CAST(mpe AS DECIMAL(15,2))) AS total_mpe
-FROM counterparty_new
-WHERE as_of_date LIKE '2024%'
-  AND mpe IS NOT NULL
-  AND mpe != ''
-  AND mpe != '0'
+SELECT DATE_FORMAT(c.as_of_date, '%Y-%m') AS month,
+       SUM({sql["mpe_expr"]}) AS total_mpe
+FROM {counterparty} c
+WHERE {sql["year_filter"]}
+  AND {sql["mpe_filter"].replace(" AND ", chr(10) + "  AND ")}
 GROUP BY month
 ORDER BY month;
 
 ### MANDATORY JOIN PATTERNS (ALWAYS use these exact patterns):
 
 -- For counterparty-trade relationships:
-SELECT * FROM counterparty_new, trade_new 
-WHERE counterparty_new.entity = trade_new.entity 
-  AND counterparty_new.counterparty_id = trade_new.reporting_counterparty_id
+SELECT * FROM {counterparty}, {trade} 
+WHERE {counterparty}.entity = {trade}.entity 
+  AND {counterparty}.counterparty_id = {trade}.reporting_counterparty_id
 LIMIT 10;
 
 -- For counterparty-concentration by COUNTRY (REQUIRED pattern):
-SELECT * FROM counterparty_new, concentration_new 
-WHERE counterparty_new.entity = concentration_new.entity 
-  AND counterparty_new.counterparty_country = concentration_new.concentration_value
+SELECT * FROM {counterparty}, {concentration} 
+WHERE {counterparty}.entity = {concentration}.entity 
+  AND {counterparty}.counterparty_country = {concentration}.concentration_value
 LIMIT 10;
 
 -- For counterparty-concentration by RATING (REQUIRED pattern):
-SELECT * FROM counterparty_new, concentration_new 
-WHERE counterparty_new.entity = concentration_new.entity 
-  AND counterparty_new.internal_rating = concentration_new.concentration_value
+SELECT * FROM {counterparty}, {concentration} 
+WHERE {counterparty}.entity = {concentration}.entity 
+  AND {counterparty}.internal_rating = {concentration}.concentration_value
 LIMIT 10;
 
 -- For counterparty-concentration by SECTOR (REQUIRED pattern):
-SELECT * FROM counterparty_new, concentration_new 
-WHERE counterparty_new.entity = concentration_new.entity 
-  AND counterparty_new.counterparty_sector = concentration_new.concentration_value
+SELECT * FROM {counterparty}, {concentration} 
+WHERE {counterparty}.entity = {concentration}.entity 
+  AND {counterparty}.counterparty_sector = {concentration}.concentration_value
 LIMIT 10;
 
-CRITICAL: When joining counterparty_new with concentration_new:
-- ALWAYS use: counterparty_new.entity = concentration_new.entity
+CRITICAL: When joining {counterparty} with {concentration}:
+- ALWAYS use: {counterparty}.entity = {concentration}.entity
 - PLUS one of these specific conditions:
-  * counterparty_new.counterparty_country = concentration_new.concentration_value (for country analysis)
-  * counterparty_new.internal_rating = concentration_new.concentration_value (for rating analysis)  
-  * counterparty_new.counterparty_sector = concentration_new.concentration_value (for sector analysis)
-- DO NOT use standard JOIN syntax - use WHERE clause with comma-separated tables
-
-
-Return ONLY the SQL query:
-
-SQL:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=500
-            )
-
-            sql_query = response.choices[0].message.content.strip()
-            cleaned_sql = self._clean_sql_output(sql_query)
-            
-            # Validate and fix forbidden functions
-            if any(forbidden in cleaned_sql.upper() for forbidden in ['LAG', 'LEAD', 'OVER', 'WINDOW']):
-                # Generate simpler query for MPE questions
-                if 'mpe' in question.lower() or 'ccr' in question.lower():
-                    return "SELECT DATE_FORMAT(as_of_date, '%Y-%m') AS month, SUM(CAST(mpe AS DECIMAL(15,2))) AS total_mpe, counterparty_sector FROM counterparty_new WHERE as_of_date LIKE '2024%' AND mpe IS NOT NULL AND mpe != '' AND mpe != '0' GROUP BY month, counterparty_sector ORDER BY month;"
-                else:
-                    return "SELECT counterparty_sector, COUNT(*) as count FROM counterparty_new GROUP BY counterparty_sector;"
-            
-            return cleaned_sql
-            
-        except Exception as e:
-            raise Exception(f"AI service error: {e}")
+  * {counterparty}.counterparty_country = {concentration}.concentration_value (for country analysis)
+  * {counterparty}.internal_rating = {concentration}.concentration_value (for rating analysis)  
+  * {counterparty}.counterparty_sector = {concentration}.concentration_value (for sector analysis)
+- DO NOT use standard JOIN syntax - use WHERE clause with comma-separated tables""")
+        if core_schema:
+            prompt.static(f"Core tables schema:\n{core_schema}")
+        prompt.dynamic("Other relevant tables schema" if core_schema else "Schema", schema,
+                       self.config.PROMPT_SCHEMA_TOKEN_BUDGET)
+        prompt.dynamic("TRAINING CONTEXT (use this to improve query generation)", context_str,
+                       self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+        prompt.dynamic("KNOWN VALUES (the question's terms as stored in the data; use these exact literals)",
+                       values_str, self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+        prompt.dynamic("Question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt = prompt.closing("Return ONLY the SQL query:\n\nSQL:").build()
+        return dict(method="question_to_sql", prompt=prompt, temperature=0, max_tokens=500)
+    
+    def _sql_from_response(self, question: str, content: str) -> str:
+        sql_query = content.strip()
+        cleaned_sql = self._clean_sql_output(sql_query)
+        
+        # Validate and fix forbidden functions
+        if any(forbidden in cleaned_sql.upper() for forbidden in ['LAG', 'LEAD', 'OVER', 'WINDOW']):
+            sql = self._sql_dialect()
+            counterparty = sql["counterparty"]
+            # Generate simpler query for MPE questions
+            if 'mpe' in question.lower() or 'ccr' in question.lower():
+                return f"SELECT DATE_FORMAT(c.as_of_date, '%Y-%m') AS month, SUM({sql['mpe_expr']}) AS total_mpe, c.counterparty_sector FROM {counterparty} c WHERE {sql['year_filter']} AND {sql['mpe_filter']} GROUP BY month, c.counterparty_sector ORDER BY month;"
+            else:
+                return f"SELECT counterparty_sector, COUNT(*) as count FROM {counterparty} GROUP BY counterparty_sector;"
+        
+        return cleaned_sql
+    
+    def template_sql(self, question: str):
+        """Locally generated SQL for questions the template engine recognises, else None"""
+        return sql_templates.match(question, self._sql_dialect())
+    
+    def _sql_dialect(self) -> dict:
+        """Table names and column expressions for the varchar base tables or their typed copies"""
+        if self.config.USE_TYPED_TABLES:
+            return {
+                "trade": typed_name("trade_new"),
+                "counterparty": typed_name("counterparty_new"),
+                "concentration": typed_name("concentration_new"),
+                "mpe_filter": "c.mpe IS NOT NULL AND c.mpe <> 0",
+                "mpe_expr": "c.mpe",
+                "notional_expr": "t.notional_usd",
+                "count_expr": "con.counterparty_count",
+                "year_filter": "c.as_of_date >= '2024-01-01' AND c.as_of_date < '2025-01-01'",
+                "trend_year_filter": "t.as_of_date >= '2024-01-01' AND t.as_of_date < '2025-01-01'",
+                "year_range": "{column} >= '{year}-01-01' AND {column} < '{next_year}-01-01'",
+                "typed_rule": "\n- Amounts, counts and dates are already DECIMAL/INT/DATE: never CAST them, and filter dates with ranges (as_of_date >= ... AND as_of_date < ...), not YEAR() or LIKE."
+            }
+        return {
+            "trade": "trade_new",
+            "counterparty": "counterparty_new",
+            "concentration": "concentration_new",
+            "mpe_filter": "c.mpe IS NOT NULL AND c.mpe != '' AND c.mpe != '0'",
+            "mpe_expr": "CAST(c.mpe AS DECIMAL(15,2))",
+            "notional_expr": "CAST(t.notional_usd AS DECIMAL(15,2))",
+            "count_expr": "CAST(con.counterparty_count AS UNSIGNED)",
+            "year_filter": "c.as_of_date LIKE '2024%'",
+            "trend_year_filter": "YEAR(t.as_of_date) = 2024",
+            "year_range": "{column} LIKE '{year}%'",
+            "typed_rule": ""
+        }
     
     def _clean_sql_output(self, sql_query: str) -> str:
         if sql_query.startswith("```"):
@@ -209,74 +389,51 @@ SQL:"""
         
         return '\n'.join(formatted_lines)
     
-    def interpret_question(self, question: str) -> dict:
+    def interpret_question(self, question: str, include_intent: bool = True) -> dict:
         """Provide structured interpretation of user question"""
-        prompt = f"""
+        interpretation = self._ask(self._interpret_question_request(question), _parse_json,
+                                   functools.partial(_interpretation_fallback, question))
+        if include_intent:
+            interpretation["intent_array"] = self.generate_intent_array(question)
+        return interpretation
+    
+    def _interpret_question_request(self, question: str) -> dict:
+        prompt = PromptBuilder("interpret_question").static("""
 Analyze this user question and provide a structured interpretation in JSON format.
 
-User question: {question}
-
 Provide analysis in this exact JSON structure:
-{{
+{
   "data_requested": "What specific data/metrics they want (e.g., total trade notional, counterparty exposure)",
   "analysis_type": "What type of analysis (e.g., comparison between periods, ranking, trend analysis)",
   "context_significance": "Why this analysis matters in risk/finance context"
-}}
+}
 
 Examples:
 - "How did total trade notional change between 2023 and 2024?"
-{{
+{
   "data_requested": "Total trade notional (value of all executed trades)",
   "analysis_type": "Comparison between 2023 and 2024, with absolute and percentage changes",
   "context_significance": "Provides insight into shifts in exposure concentration and market activity"
-}}
+}
 
 - "top 5 counterparties with highest exposure"
-{{
+{
   "data_requested": "Counterparty exposure rankings",
   "analysis_type": "Ranking analysis to identify top 5 counterparties by exposure amount",
   "context_significance": "Critical for concentration risk assessment and regulatory compliance"
-}}
-
-Return only valid JSON:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=200
-            )
-            
-            import json
-            content = response.choices[0].message.content.strip()
-            # Clean up any markdown formatting
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            
-            interpretation = json.loads(content)
-            
-            # Add Intent array
-            interpretation["intent_array"] = self.generate_intent_array(question)
-            
-            return interpretation
-            
-        except Exception as e:
-            # Fallback structure for any parsing errors
-            return {
-                "data_requested": f"Analysis of: {question}",
-                "analysis_type": "Data query and analysis", 
-                "context_significance": "Provides business insights from database",
-                "intent_array": self.generate_intent_array(question)
-            }
+}""")
+        prompt.dynamic("User question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt = prompt.closing("Return only valid JSON:").build()
+        return dict(method="interpret_question", prompt=prompt, temperature=0.1, max_tokens=200)
     
     def generate_intent_array(self, question: str) -> list:
         """Generate flattened Intent array representation from NLQ"""
-        prompt = f"""
+        return self._ask(self._intent_array_request(question), _parse_json, _intent_array_fallback)
+    
+    def _intent_array_request(self, question: str) -> dict:
+        prompt = PromptBuilder("generate_intent_array").static("""
 Analyze this natural language question and extract structured intent as a flattened array.
 
-Question: {question}
-
 Extract intent components and return as a JSON array of strings in this format:
 [
   "entity: [entity_type]",
@@ -294,121 +451,70 @@ Rules:
 - slice.scenario: Scenario type (BASELINE, STRESS, etc.) - default to BASELINE
 - Only include components that are present in the question
 - Use UPPERCASE for identifiers and metrics
-- Convert dates to YYYY-MM-DD format
-
-Return only the JSON array:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=150
-            )
-            
-            import json
-            content = response.choices[0].message.content.strip()
-            # Clean up any markdown formatting
-            if content.startswith('```json'):
-                content = content.replace('```json', '').replace('```', '').strip()
-            
-            return json.loads(content)
-            
-        except Exception as e:
-            # Fallback intent array
-            return [
-                "entity: Data",
-                "metrics: ANALYSIS"
-            ]
+- Convert dates to YYYY-MM-DD format""")
+        prompt.dynamic("Question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt = prompt.closing("Return only the JSON array:").build()
+        return dict(method="generate_intent_array", prompt=prompt, temperature=0, max_tokens=150)
     
     def generate_natural_response(self, question: str, sql_query: str, results: list) -> str:
         """Generate risk analyst-style response using actual data"""
         if not results:
-            return "No data found for this query."
-        
-        # Prepare actual data for AI analysis
-        data_sample = ""
-        if results:
-            if hasattr(results[0], '_fields'):
-                sample_rows = []
-                for row in results:
-                    row_dict = {col: getattr(row, col) for col in row._fields}
-                    sample_rows.append(str(row_dict))
-                data_sample = "\n".join(sample_rows)
-            else:
-                data_sample = "\n".join([str(row) for row in results])
+            return NO_DATA_RESPONSE
+        return self._ask(self._natural_response_request(question, results), _strip,
+                         functools.partial(self._natural_response_fallback, question, results))
+    
+    def _natural_response_request(self, question: str, results: list) -> dict:
+        # Rows verbatim when small, otherwise a profile of all of them within the token budget
+        data_sample = summarize_results(results)
         
-        prompt = f"""
+        prompt = PromptBuilder("generate_natural_response").static("""
 You are a senior risk analyst providing a briefing to a portfolio manager. Generate a concise, professional response using ONLY the actual data provided.
 
-Question: {question}
-Actual Data: {data_sample}
-
 Rules:
 - Use ONLY the exact names/values from the data (like TSE_C1, NASDAQ_C3, etc.)
 - Write as a risk analyst explaining findings
 - Use financial terms: exposure concentration, counterparty risk, long-dated trades
 - Be concise (1-2 sentences max)
 - NO placeholders or generic names
-- Focus on risk implications
-
-Analyst Response:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=150
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            # Fallback to direct data extraction if AI fails
-            values = []
-            if hasattr(results[0], '_fields'):
-                for row in results:
-                    for col in row._fields:
-                        val = getattr(row, col)
-                        if val and str(val).strip() and str(val) != 'None':
-                            values.append(str(val))
-            
-            if 'counterpart' in question.lower():
-                return f"Counterparty risk concentration identified across {', '.join(values[:5])}."
-            else:
-                return f"Risk exposure analysis shows: {', '.join(values[:5])}."
+- Focus on risk implications""")
+        prompt.dynamic("Question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt.dynamic("Actual Data", data_sample, self.config.NARRATIVE_TOKEN_BUDGET)
+        prompt = prompt.closing("Analyst Response:").build()
+        return dict(method="generate_natural_response", prompt=prompt, temperature=0, max_tokens=150)
+    
+    @staticmethod
+    def _natural_response_fallback(question: str, results: list, error: Exception) -> str:
+        # Fallback to direct data extraction if AI fails
+        values = []
+        if hasattr(results[0], '_fields'):
+            for row in results:
+                for col in row._fields:
+                    val = getattr(row, col)
+                    if val and str(val).strip() and str(val) != 'None':
+                        values.append(str(val))
+        
+        if 'counterpart' in question.lower():
+            return f"Counterparty risk concentration identified across {', '.join(values[:5])}."
+        else:
+            return f"Risk exposure analysis shows: {', '.join(values[:5])}."
     
     def explain_sql(self, sql_query: str) -> str:
-        prompt = f"""
-Explain this SQL query in simple terms:
-
-{sql_query}
-
-Provide a clear, concise explanation of what this query does and which table it's querying from."""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=300
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return f"Could not generate explanation: {e}"
+        return self._ask(self._explain_sql_request(sql_query), _strip, _explanation_fallback)
+    
+    def _explain_sql_request(self, sql_query: str) -> dict:
+        prompt = (PromptBuilder("explain_sql")
+                  .static("Provide a clear, concise explanation of what this query does and which table it's querying from.")
+                  .dynamic("Explain this SQL query in simple terms", sql_query, self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+                  .build())
+        return dict(method="explain_sql", prompt=prompt, temperature=0.3, max_tokens=300)
     
     def suggest_query_alternatives(self, question: str, failed_sql: str, schema: str) -> str:
         """Suggest alternative queries when original fails or returns no results"""
-        prompt = f"""
-The user asked: "{question}"
-The generated SQL query was: {failed_sql}
-But it returned no results or failed.
-
-Database schema:
-{schema}
+        return self._ask(self._alternatives_request(question, failed_sql, schema), _strip, _alternatives_fallback)
+    
+    def _alternatives_request(self, question: str, failed_sql: str, schema: str) -> dict:
+        prompt = PromptBuilder("suggest_query_alternatives").static("""
+The generated SQL query below returned no results or failed.
 
 Suggest 2-3 alternative approaches with actual SQL queries:
 - Check for different date formats with example queries
@@ -417,126 +523,75 @@ Suggest 2-3 alternative approaches with actual SQL queries:
 - Include queries to inspect available data
 
 Format suggestions with SQL code blocks using ```sql``` for easy execution.
-Provide practical, actionable suggestions."""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=300
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return "Try checking the date format or available data in the tables."
+Provide practical, actionable suggestions.""")
+        prompt.dynamic("Database schema", schema, self.config.PROMPT_SCHEMA_TOKEN_BUDGET)
+        prompt.dynamic("The user asked", f'"{question}"', self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt = prompt.dynamic("The generated SQL query was", failed_sql, self.config.PROMPT_CONTEXT_TOKEN_BUDGET).build()
+        return dict(method="suggest_query_alternatives", prompt=prompt, temperature=0.3, max_tokens=300)
     
     def fix_sql_query(self, failed_sql: str, error_message: str, schema: str) -> str:
         """Attempt to fix a failed SQL query based on error message"""
-        prompt = f"""
-This SQL query failed:
-{failed_sql}
-
-Error message:
-{error_message}
-
-Database schema:
-{schema}
-
-Fix the SQL query by:
+        return self._ask(self._fix_sql_request(failed_sql, error_message, schema), self._fixed_sql, lambda e: None)
+    
+    def _fix_sql_request(self, failed_sql: str, error_message: str, schema: str) -> dict:
+        prompt = PromptBuilder("fix_sql_query").static("""
+Fix the failed SQL query below by:
 - Correcting column names that don't exist
 - Fixing syntax errors
 - Using proper table names
-- Adjusting data types or formats
-
-Return only the corrected SQL query, no explanation:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=300
-            )
-            
-            fixed_sql = response.choices[0].message.content.strip()
-            return self._clean_sql_output(fixed_sql)
-            
-        except Exception as e:
-            return None
+- Adjusting data types or formats""")
+        prompt.dynamic("Database schema", schema, self.config.PROMPT_SCHEMA_TOKEN_BUDGET)
+        prompt.dynamic("This SQL query failed", failed_sql, self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+        prompt.dynamic("Error message", str(error_message), self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+        prompt = prompt.closing("Return only the corrected SQL query, no explanation:").build()
+        return dict(method="fix_sql_query", prompt=prompt, temperature=0, max_tokens=300)
+    
+    def _fixed_sql(self, content: str) -> str:
+        fixed_sql = content.strip()
+        return self._clean_sql_output(fixed_sql)
     
     def generate_executive_summary(self, question: str, sql_query: str, results: list) -> str:
         """Generate executive summary for report"""
+        return self._ask(self._executive_summary_request(question, results), _strip,
+                         functools.partial(_executive_summary_fallback, results))
+    
+    def _executive_summary_request(self, question: str, results: list) -> dict:
         # Prepare data for analysis
-        data_sample = ""
-        if results:
-            if hasattr(results[0], '_fields'):
-                sample_rows = []
-                for row in results[:5]:
-                    row_dict = {col: getattr(row, col) for col in row._fields}
-                    sample_rows.append(str(row_dict))
-                data_sample = "\n".join(sample_rows)
-            else:
-                data_sample = "\n".join([str(row) for row in results[:5]])
+        data_sample = summarize_results(results)
         
-        prompt = f"""
+        prompt = PromptBuilder("generate_executive_summary").static("""
 Generate a concise executive summary for this database query result.
 
-Question: {question}
-Data Results: {data_sample}
-Total Records: {len(results)}
-
 Write a professional executive summary that:
 - Highlights key findings and trends
 - Mentions specific numbers/values from the data
 - Identifies risks or business implications
 - Uses financial/risk terminology
-- Keep it 2-3 sentences maximum
-
-Executive Summary:"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=150
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            return f"Analysis of {len(results)} records shows key business insights related to the query."
+- Keep it 2-3 sentences maximum""")
+        prompt.dynamic("Question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt.dynamic("Data Results", data_sample, self.config.NARRATIVE_TOKEN_BUDGET)
+        prompt.dynamic("Total Records", len(results))
+        prompt = prompt.closing("Executive Summary:").build()
+        return dict(method="generate_executive_summary", prompt=prompt, temperature=0.1, max_tokens=150)
     
     def generate_executive_report(self, question: str, sql_query: str, results: list, row_count: int) -> str:
         """Generate comprehensive executive summary report"""
+        return self._ask(self._executive_report_request(question, sql_query, results, row_count), _strip,
+                         _executive_report_fallback)
+    
+    def _executive_report_request(self, question: str, sql_query: str, results: list, row_count: int) -> dict:
         # Prepare data summary
         data_summary = ""
         if results and hasattr(results[0], '_fields'):
             columns = results[0]._fields
             data_summary = f"Data includes {len(columns)} columns: {', '.join(columns[:10])}{'...' if len(columns) > 10 else ''}"
         
-        # Sample data for analysis
-        sample_rows = []
-        for i, row in enumerate(results[:3]):
-            if hasattr(row, '_fields'):
-                row_dict = {col: row[j] for j, col in enumerate(row._fields)}
-                sample_rows.append(str(row_dict)[:200])
-            else:
-                sample_rows.append(str(row)[:200])
+        # Profile of every row rather than a three-row sample
+        data_profile = summarize_results(results)
         
-        prompt = f"""
+        prompt = PromptBuilder("generate_executive_report").static("""
 Generate a comprehensive executive summary report based on this database query analysis.
 
-Original Business Question: {question}
-SQL Query: {sql_query}
-Total Records Found: {row_count}
-{data_summary}
-
-Sample Data:
-{chr(10).join(sample_rows)}
-
 Create a professional executive report with:
 
 1. EXECUTIVE SUMMARY (2-3 sentences)
@@ -546,17 +601,153 @@ Create a professional executive report with:
 5. RECOMMENDATIONS (2-3 actionable items)
 
 Use professional business language, focus on insights rather than technical details.
-Format with clear sections and bullet points for readability."""
+Format with clear sections and bullet points for readability.""")
+        prompt.dynamic("Original Business Question", question, self.config.PROMPT_QUESTION_TOKEN_BUDGET)
+        prompt.dynamic("SQL Query", sql_query, self.config.PROMPT_CONTEXT_TOKEN_BUDGET)
+        prompt.dynamic("Total Records Found", row_count)
+        prompt.dynamic("", data_summary)
+        prompt = prompt.dynamic("Data", data_profile, self.config.NARRATIVE_TOKEN_BUDGET).build()
+        return dict(method="generate_executive_report", prompt=prompt, temperature=0.3, max_tokens=800)
+
+class AsyncAIService(AIService):
+    """AIService for the API: the same methods as coroutines, built from the same prompt and
+    parsing helpers, awaited on one AsyncOpenAI client (and so one keep-alive connection pool)
+    with at most OPENAI_MAX_CONCURRENCY calls in flight process-wide"""
 
+    def __init__(self):
+        super().__init__()
+        self.async_client = AsyncOpenAI(api_key=self.config.OPENAI_API_KEY, timeout=self.config.OPENAI_TIMEOUT)
+        self._semaphore = asyncio.Semaphore(self.config.OPENAI_MAX_CONCURRENCY)
+    
+    async def _acomplete(self, method: str, prompt: str, temperature: float, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(model, messages, temperature, max_tokens)
+        if cache_key:
+            cached = await asyncio.to_thread(llm_cache.get, method, *cache_key)
+            if cached is not None:
+                return cached
+        
+        async with self._semaphore:
+            started = time.perf_counter()
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        prompt_stats.record_usage(method, response.usage)
+        content = response.choices[0].message.content
+        if cache_key and content:
+            await asyncio.to_thread(llm_cache.put, method, cache_key[0], content, time.perf_counter() - started, cache_key[1])
+        return content
+    
+    async def _aask(self, request: dict, parse, fallback):
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=800
+            return parse(await self._acomplete(**request))
+        except Exception as e:
+            return fallback(e)
+    
+    async def _stream_complete(self, method: str, prompt: str, temperature: float, max_tokens: int, model: str = "gpt-4o-mini"):
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(model, messages, temperature, max_tokens)
+        if cache_key:
+            cached = await asyncio.to_thread(llm_cache.get, method, *cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        async with self._semaphore:
+            started = time.perf_counter()
+            stream = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            
-            return response.choices[0].message.content.strip()
-            
+            async for chunk in stream:
+                if chunk.usage:
+                    prompt_stats.record_usage(method, chunk.usage)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        if cache_key and parts:
+            await asyncio.to_thread(llm_cache.put, method, cache_key[0], "".join(parts), time.perf_counter() - started, cache_key[1])
+    
+    async def _stream(self, request: dict, fallback):
+        streamed = False
+        try:
+            async for delta in self._stream_complete(**request):
+                yield delta if streamed else delta.lstrip()
+                streamed = True
         except Exception as e:
-            return f"Error generating executive report: {e}"
\ No newline at end of file
+            if streamed:
+                raise
+            yield fallback(e)
+    
+    async def stream_natural_response(self, question: str, sql_query: str, results: list):
+        if not results:
+            yield NO_DATA_RESPONSE
+            return
+        async for delta in self._stream(self._natural_response_request(question, results),
+                                        functools.partial(self._natural_response_fallback, question, results)):
+            yield delta
+    
+    async def stream_executive_report(self, question: str, sql_query: str, results: list, row_count: int):
+        async for delta in self._stream(self._executive_report_request(question, sql_query, results, row_count),
+                                        _executive_report_fallback):
+            yield delta
+    
+    async def embed(self, text: str) -> list:
+        async with self._semaphore:
+            response = await self.async_client.embeddings.create(model=self.config.SEMANTIC_CACHE_EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+    
+    async def question_to_sql(self, question: str, schema: str, training_context: list = None, value_hints: list = None) -> str:
+        matched = self.template_sql(question)
+        if matched:
+            return matched["sql"]
+        request = self._question_to_sql_request(question, schema, training_context, value_hints)
+        return await self._aask(request, functools.partial(self._sql_from_response, question), _ai_error)
+    
+    async def interpret_question(self, question: str, include_intent: bool = True) -> dict:
+        """Interpretation and intent array are independent prompts, so they run side by side"""
+        interpreting = self._aask(self._interpret_question_request(question), _parse_json,
+                                  functools.partial(_interpretation_fallback, question))
+        if not include_intent:
+            return await interpreting
+        interpretation, intent_array = await asyncio.gather(interpreting, self.generate_intent_array(question))
+        interpretation["intent_array"] = intent_array
+        return interpretation
+    
+    async def generate_intent_array(self, question: str) -> list:
+        return await self._aask(self._intent_array_request(question), _parse_json, _intent_array_fallback)
+    
+    async def generate_natural_response(self, question: str, sql_query: str, results: list) -> str:
+        if not results:
+            return NO_DATA_RESPONSE
+        return await self._aask(self._natural_response_request(question, results), _strip,
+                                functools.partial(self._natural_response_fallback, question, results))
+    
+    async def explain_sql(self, sql_query: str) -> str:
+        return await self._aask(self._explain_sql_request(sql_query), _strip, _explanation_fallback)
+    
+    async def suggest_query_alternatives(self, question: str, failed_sql: str, schema: str) -> str:
+        return await self._aask(self._alternatives_request(question, failed_sql, schema), _strip, _alternatives_fallback)
+    
+    async def fix_sql_query(self, failed_sql: str, error_message: str, schema: str) -> str:
+        return await self._aask(self._fix_sql_request(failed_sql, error_message, schema), self._fixed_sql, lambda e: None)
+    
+    async def generate_executive_summary(self, question: str, sql_query: str, results: list) -> str:
+        return await self._aask(self._executive_summary_request(question, results), _strip,
+                                functools.partial(_executive_summary_fallback, results))
+    
+    async def generate_executive_report(self, question: str, sql_query: str, results: list, row_count: int) -> str:
+        return await self._aask(self._executive_report_request(question, sql_query, results, row_count), _strip,
+                                _executive_report_fallback)
+    
+    async def aclose(self):
+        await self.async_client.close()
@@ -0,0 +1,459 @@
+"""Bulk loader for SQL dumps and CSV/XLSX extracts.
+
+Sources are first spooled into per-table tab-separated files (LOAD DATA's default
+format), parsing the dump's multi-row INSERTs without executing them. Tables then load
+in parallel, each on its own connection with FOREIGN_KEY_CHECKS/UNIQUE_CHECKS off:
+secondary indexes are dropped, rows go in via LOAD DATA LOCAL INFILE (or batched
+executemany when the server refuses local infile), and the indexes are rebuilt in a
+single ALTER TABLE. Each batch commits on its own instead of one dump-long transaction.
+
+    python -m src.services.bulk_loader data/org_insights_final.sql --truncate
+    python -m src.services.bulk_loader trade_new.csv counterparty_new.xlsx --workers 2"""
+import argparse
+import csv
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, time as dt_time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.utils.console import Console
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+BULK_ENGINE = "bulk"
+READ_CHUNK = 1024 * 1024
+
+_STATEMENT_TOKEN_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|--[^\n]*\n|#[^\n]*\n|/\*.*?\*/|;|[^'\"`;#/-]+|.",
+    re.S
+)
+_INSERT_RE = re.compile(r"^\s*insert\s+(?:ignore\s+)?into\s+`?(\w+)`?\s*(?:\(([^)]*)\))?\s*values\s*", re.I | re.S)
+_CREATE_RE = re.compile(r"^\s*create\s+table\s+(?:if\s+not\s+exists\s+)?`?(\w+)`?", re.I)
+_ALTER_RE = re.compile(r"^\s*alter\s+table\s+`?(\w+)`?", re.I)
+_VALUE_RE = re.compile(r"\s*(?:'((?:[^'\\]|\\.|'')*)'|(null)\b|([^,()\s]+))\s*([,)])", re.I | re.S)
+_UNESCAPE_RE = re.compile(r"\\(.)|''", re.S)
+_UNESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+
+def split_statements(path: str):
+    """Yield the statements of a SQL file one at a time, respecting quotes and comments"""
+    buffer, statement = "", []
+    with open(path, "r", encoding="utf-8", errors="replace") as handle:
+        eof = False
+        while not eof:
+            chunk = handle.read(READ_CHUNK)
+            eof = not chunk
+            buffer += chunk if chunk else "\n"
+            pos = 0
+            while pos < len(buffer):
+                match = _STATEMENT_TOKEN_RE.match(buffer, pos)
+                token = match.group(0)
+                # A token, quote or comment cut off by the chunk boundary: wait for more input
+                following = buffer[pos + 1:pos + 2]
+                if not eof and (match.end() == len(buffer) or token in ("'", '"', "`", "#")
+                                or (token == "-" and following == "-") or (token == "/" and following == "*")):
+                    break
+                pos = match.end()
+                if token == ";":
+                    text = "".join(statement).strip()
+                    if text:
+                        yield text
+                    statement = []
+                elif not token.startswith(("--", "#", "/*")):
+                    statement.append(token)
+            buffer = buffer[pos:]
+    text = "".join(statement).strip()
+    if text:
+        yield text
+
+def _unescape(value: str) -> str:
+    return _UNESCAPE_RE.sub(lambda m: "'" if m.group(0) == "''" else _UNESCAPES.get(m.group(1), m.group(1)), value)
+
+def parse_values(text: str, start: int = 0):
+    """Yield each tuple of an INSERT ... VALUES list as a list of str/None"""
+    pos = start
+    length = len(text)
+    while pos < length:
+        open_paren = text.find("(", pos)
+        if open_paren < 0:
+            return
+        pos = open_paren + 1
+        row = []
+        while True:
+            match = _VALUE_RE.match(text, pos)
+            if not match:
+                raise ValueError(f"Unparseable VALUES near: {text[pos:pos + 80]!r}")
+            quoted, null, bare, terminator = match.groups()
+            row.append(None if null else _unescape(quoted) if quoted is not None else bare)
+            pos = match.end()
+            if terminator == ")":
+                break
+        yield row
+
+def _tsv_field(value) -> str:
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+            .replace("\r", "\\r").replace("\0", "\\0"))
+
+_TSV_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r", "0": "\0", "\\": "\\"}
+
+def _tsv_value(field: str):
+    if field == "\\N":
+        return None
+    if "\\" not in field:
+        return field
+    return re.sub(r"\\(.)", lambda m: _TSV_UNESCAPES.get(m.group(1), m.group(1)), field)
+
+def _cell_text(value):
+    """Spreadsheet cells as the dump would store them: 1000000 not 1000000.0, dates without 00:00:00"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, datetime) and value.time() == dt_time(0):
+        return value.date().isoformat()
+    return value
+
+class Spool:
+    """Rows for one table, staged in a LOAD DATA-compatible TSV file"""
+
+    def __init__(self, table: str, columns: list):
+        self.table = table
+        self.columns = columns
+        handle, self.path = tempfile.mkstemp(prefix=f"{table}_", suffix=".tsv")
+        self._file = os.fdopen(handle, "w", encoding="utf-8", newline="\n")
+        self.rows = 0
+
+    def write(self, rows):
+        lines = []
+        for row in rows:
+            lines.append("\t".join(_tsv_field(value) for value in row))
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self.rows += len(lines)
+
+    def close(self):
+        self._file.close()
+
+    def batches(self, size: int):
+        with open(self.path, "r", encoding="utf-8", newline="\n") as handle:
+            batch = []
+            for line in handle:
+                batch.append([_tsv_value(field) for field in line.rstrip("\n").split("\t")])
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class BulkLoader:
+    def __init__(self, workers: int = 4, batch_size: int = 5000, method: str = "auto",
+                 truncate: bool = False, keep_indexes: bool = False, tables: list = None):
+        self.config = Config()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.method = method
+        self.truncate = truncate
+        self.keep_indexes = keep_indexes
+        self.tables = set(tables) if tables else None
+        self.create_statements = {}
+        self.alter_statements = []  # (table, statement) in dump order
+        self.created_tables = set()
+        self._print_lock = threading.Lock()
+        engine_registry.get_engine(BULK_ENGINE, f"{self.config.mysql_connection_string}?local_infile=1")
+
+    def _wanted(self, table: str) -> bool:
+        return self.tables is None or table in self.tables
+
+    def _spool_for(self, spools: dict, table: str, columns: list) -> Spool:
+        key = (table, tuple(columns))
+        if key not in spools:
+            spools[key] = Spool(table, columns)
+        return spools[key]
+
+    def spool_dump(self, path: str, spools: dict):
+        for statement in split_statements(path):
+            created = _CREATE_RE.match(statement)
+            if created:
+                self.create_statements[created.group(1)] = statement
+                continue
+            altered = _ALTER_RE.match(statement)
+            if altered:
+                self.alter_statements.append((altered.group(1), statement))
+                continue
+            insert = _INSERT_RE.match(statement)
+            if not insert or not self._wanted(insert.group(1)):
+                continue
+            if not insert.group(2):
+                raise ValueError(f"INSERT into {insert.group(1)} has no column list; re-dump with complete inserts")
+            columns = [c.strip().strip("`") for c in insert.group(2).split(",")]
+            spool = self._spool_for(spools, insert.group(1), columns)
+            batch = []
+            for row in parse_values(statement, insert.end()):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    spool.write(batch)
+                    batch = []
+            spool.write(batch)
+
+    def spool_csv(self, path: str, spools: dict):
+        table = os.path.splitext(os.path.basename(path))[0]
+        if not self._wanted(table):
+            return
+        with open(path, "r", encoding="utf-8-sig", newline="") as handle:
+            reader = csv.reader(handle)
+            columns = [c.strip() for c in next(reader)]
+            spool = self._spool_for(spools, table, columns)
+            batch = []
+            for row in reader:
+                batch.append([None if value == "" else value for value in row])
+                if len(batch) >= self.batch_size:
+                    spool.write(batch)
+                    batch = []
+            spool.write(batch)
+
+    def spool_xlsx(self, path: str, spools: dict):
+        """One table per worksheet, named after the sheet, header in the first row"""
+        if openpyxl is None:
+            raise RuntimeError("openpyxl is required for .xlsx input (pip install openpyxl)")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                if not self._wanted(sheet.title):
+                    continue
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if not header:
+                    continue
+                columns = [str(c).strip() for c in header if c is not None]
+                spool = self._spool_for(spools, sheet.title, columns)
+                batch = []
+                for row in rows:
+                    values = [_cell_text(value) for value in row[:len(columns)]]
+                    if all(value is None for value in values):
+                        continue
+                    batch.append(values)
+                    if len(batch) >= self.batch_size:
+                        spool.write(batch)
+                        batch = []
+                spool.write(batch)
+        finally:
+            workbook.close()
+
+    def _secondary_indexes(self, cursor, table: str) -> dict:
+        cursor.execute("""
+            SELECT index_name, non_unique, column_name, sub_part, index_type
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name <> 'PRIMARY'
+            ORDER BY index_name, seq_in_index
+        """, (table,))
+        indexes = {}
+        for name, non_unique, column, sub_part, index_type in cursor.fetchall():
+            index = indexes.setdefault(name, {"unique": not int(non_unique), "type": index_type, "columns": []})
+            index["columns"].append(f"`{column}`" + (f"({sub_part})" if sub_part else ""))
+        return indexes
+
+    def _index_definition(self, name: str, index: dict) -> str:
+        kind = {"FULLTEXT": "FULLTEXT INDEX", "SPATIAL": "SPATIAL INDEX"}.get(index["type"],
+                                                                           "UNIQUE INDEX" if index["unique"] else "INDEX")
+        return f"ADD {kind} `{name}` ({', '.join(index['columns'])})"
+
+    def _drop_indexes(self, conn, cursor, table: str) -> dict:
+        """Drop secondary indexes, returning the ones to rebuild; indexes a foreign key needs stay"""
+        dropped = {}
+        for name, index in self._secondary_indexes(cursor, table).items():
+            try:
+                cursor.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`")
+                dropped[name] = index
+            except Exception as e:
+                conn.rollback()
+                self._report(f"{table}: keeping index {name} ({e})")
+        return dropped
+
+    def _load_infile(self, cursor, spool: Spool):
+        columns = ", ".join(f"`{c}`" for c in spool.columns)
+        path = spool.path.replace("\\", "\\\\").replace("'", "\\'")
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{spool.table}` CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})"
+        )
+
+    def _load_executemany(self, conn, cursor, spool: Spool, started: float):
+        columns = ", ".join(f"`{c}`" for c in spool.columns)
+        placeholders = ", ".join(["%s"] * len(spool.columns))
+        insert = f"INSERT INTO `{spool.table}` ({columns}) VALUES ({placeholders})"
+        loaded = 0
+        for batch in spool.batches(self.batch_size):
+            cursor.executemany(insert, batch)
+            conn.commit()
+            loaded += len(batch)
+            self._progress(spool.table, loaded, spool.rows, started)
+
+    def _progress(self, table: str, loaded: int, total: int, started: float):
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self._report(f"{table}: {loaded:,}/{total:,} rows ({loaded / elapsed:,.0f} rows/s)")
+
+    def _report(self, message: str):
+        with self._print_lock:
+            Console.processing(message)
+
+    def load_table(self, spool: Spool) -> dict:
+        started = time.perf_counter()
+        conn = engine_registry.raw_connection(BULK_ENGINE)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET SESSION FOREIGN_KEY_CHECKS = 0")
+            cursor.execute("SET SESSION UNIQUE_CHECKS = 0")
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = %s
+            """, (spool.table,))
+            if not cursor.fetchone()[0]:
+                if spool.table not in self.create_statements:
+                    raise ValueError(f"Table {spool.table} does not exist")
+                cursor.execute(self.create_statements[spool.table])
+                with self._print_lock:
+                    self.created_tables.add(spool.table)
+            if self.truncate:
+                cursor.execute(f"TRUNCATE TABLE `{spool.table}`")
+
+            dropped = {} if self.keep_indexes else self._drop_indexes(conn, cursor, spool.table)
+            method = self.method
+            if method in ("auto", "infile"):
+                try:
+                    self._load_infile(cursor, spool)
+                    conn.commit()
+                    method = "infile"
+                    self._progress(spool.table, spool.rows, spool.rows, started)
+                except Exception as e:
+                    conn.rollback()
+                    if self.method == "infile":
+                        raise
+                    self._report(f"{spool.table}: LOAD DATA LOCAL INFILE unavailable ({e}), using executemany")
+                    method = "executemany"
+            if method == "executemany":
+                self._load_executemany(conn, cursor, spool, started)
+
+            index_seconds = 0.0
+            index_errors = {}
+            if dropped:
+                index_started = time.perf_counter()
+                self._report(f"{spool.table}: rebuilding {len(dropped)} indexes")
+                try:
+                    cursor.execute(f"ALTER TABLE `{spool.table}` " + ", ".join(
+                        self._index_definition(name, index) for name, index in dropped.items()
+                    ))
+                except Exception:
+                    # e.g. duplicates under a UNIQUE index: rebuild the rest one at a time
+                    for name, index in dropped.items():
+                        try:
+                            cursor.execute(f"ALTER TABLE `{spool.table}` {self._index_definition(name, index)}")
+                        except Exception as e:
+                            index_errors[name] = str(e)
+                            Console.error(f"{spool.table}: could not rebuild index {name}: {e}")
+                index_seconds = time.perf_counter() - index_started
+            conn.commit()
+        finally:
+            conn.close()
+
+        seconds = time.perf_counter() - started
+        return {
+            "table": spool.table,
+            "rows": spool.rows,
+            "method": method,
+            "indexes_rebuilt": len(dropped) - len(index_errors),
+            "index_errors": index_errors,
+            "index_seconds": round(index_seconds, 3),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(spool.rows / seconds) if seconds else None
+        }
+
+    def _apply_dump_alters(self):
+        """Keys, AUTO_INCREMENT and constraints from the dump, for tables this run created"""
+        pending = [(table, statement) for table, statement in self.alter_statements if table in self.created_tables]
+        if not pending:
+            return
+        conn = engine_registry.raw_connection(BULK_ENGINE)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET SESSION FOREIGN_KEY_CHECKS = 0")
+            for table, statement in pending:
+                self._report(f"{table}: applying dump keys/constraints")
+                cursor.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load(self, paths: list) -> list:
+        started = time.perf_counter()
+        spools = {}
+        try:
+            for path in paths:
+                Console.processing(f"Parsing {path}")
+                extension = os.path.splitext(path)[1].lower()
+                if extension == ".sql":
+                    self.spool_dump(path, spools)
+                elif extension == ".csv":
+                    self.spool_csv(path, spools)
+                elif extension in (".xlsx", ".xlsm"):
+                    self.spool_xlsx(path, spools)
+                else:
+                    raise ValueError(f"Unsupported input {path}; expected .sql, .csv or .xlsx")
+            for spool in spools.values():
+                spool.close()
+            Console.success(f"Parsed {sum(s.rows for s in spools.values()):,} rows for {len(spools)} tables "
+                            f"in {time.perf_counter() - started:.1f}s")
+
+            results = []
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                futures = {pool.submit(self.load_table, spool): spool for spool in spools.values()}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                        results.append(result)
+                        Console.success(f"{result['table']}: {result['rows']:,} rows via {result['method']} in "
+                                        f"{result['seconds']}s ({result['rows_per_second']:,} rows/s)")
+                    except Exception as e:
+                        Console.error(f"{futures[future].table}: {e}")
+                        results.append({"table": futures[future].table, "error": str(e)})
+            self._apply_dump_alters()
+        finally:
+            for spool in spools.values():
+                spool.close()
+                spool.remove()
+
+        total_rows = sum(r.get("rows", 0) for r in results if "error" not in r)
+        seconds = time.perf_counter() - started
+        Console.info(f"Loaded {total_rows:,} rows in {seconds:.1f}s ({total_rows / max(seconds, 1e-6):,.0f} rows/s)")
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load SQL dumps or CSV/XLSX extracts into MySQL")
+    parser.add_argument("paths", nargs="+", help=".sql dump, or .csv/.xlsx named after the target table/sheet")
+    parser.add_argument("--tables", help="comma-separated subset of tables to load")
+    parser.add_argument("--workers", type=int, default=4, help="tables loaded in parallel")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per executemany batch/commit")
+    parser.add_argument("--method", choices=["auto", "infile", "executemany"], default="auto")
+    parser.add_argument("--truncate", action="store_true", help="empty each table before loading")
+    parser.add_argument("--keep-indexes", action="store_true", help="don't drop/rebuild secondary indexes")
+    args = parser.parse_args()
+
+    results = BulkLoader(
+        workers=args.workers, batch_size=args.batch_size, method=args.method, truncate=args.truncate,
+        keep_indexes=args.keep_indexes, tables=args.tables.split(",") if args.tables else None
+    ).load(args.paths)
+    if any("error" in result for result in results):
+        raise SystemExit(1)
+    Console.info("Refresh derived tables with POST /admin/typed-tables/refresh")
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,135 @@
-from sqlalchemy import create_engine, text
+import asyncio
+from sqlalchemy import text
 from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.services.index_advisor import index_advisor
+from src.services.local_mirror import local_mirror
+from src.services.query_cache import cache_key_for, query_cache
+from src.services.replica_router import replica_router
+from src.services.rollups import rollup_router
 from src.utils.console import Console
 
 class DatabaseManager:
     def __init__(self):
         self.config = Config()
         self.config.validate()
-        self.engine = create_engine(self.config.mysql_connection_string)
+        self.engine = engine_registry.get_engine()
     
     def execute_query(self, sql: str):
+        if self.config.MIRROR_ONLY:
+            try:
+                return local_mirror.execute(sql, self.config.ROW_LIMIT)
+            except Exception as e:
+                return {"success": False, "error": str(e), "data": None}
+        sql = self._route(sql)
+        index_advisor.capture(sql)
+        mirrored = self._execute_on_mirror(sql)
+        if mirrored:
+            return mirrored
+        
+        cache_key, tables = self._cache_lookup_key(sql)
+        if cache_key:
+            cached = query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            with self.engine.connect() as conn:
+            with replica_router.connect(sql) as conn:
                 result = conn.execute(text(sql))
+                rows, truncated = self._fetch_rows(result)
                 
-                if self.config.ROW_LIMIT > 0:
-                    rows = result.fetchmany(self.config.ROW_LIMIT)
-                    if len(rows) == self.config.ROW_LIMIT:
-                        Console.warning(f"Results limited to {self.config.ROW_LIMIT} rows")
-                else:
-                    rows = result.fetchall()
+                response = {"success": True, "data": rows, "columns": list(result.keys()), "row_count": len(rows),
+                            "truncated": truncated}
+        except Exception as e:
+            return {"success": False, "error": str(e), "data": None}
+        
+        if cache_key:
+            query_cache.put(cache_key, {**response, "cached": True}, tables)
+        return response
+    
+    async def execute_query_async(self, sql: str):
+        """Non-blocking execute_query on the aiomysql pool; same result contract"""
+        if self.config.MIRROR_ONLY:
+            return await asyncio.to_thread(self.execute_query, sql)
+        sql = await asyncio.to_thread(self._route, sql)
+        index_advisor.capture(sql)
+        mirrored = await asyncio.to_thread(self._execute_on_mirror, sql)
+        if mirrored:
+            return mirrored
+        
+        cache_key, tables = await asyncio.to_thread(self._cache_lookup_key, sql)
+        if cache_key:
+            cached = query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        target = await asyncio.to_thread(replica_router.choose, sql)
+        try:
+            async with replica_router.connect_async(target) as conn:
+                result = await conn.execute(text(sql))
+                rows, truncated = self._fetch_rows(result)
                 
-                return {"success": True, "data": rows, "row_count": len(rows)}
+                response = {"success": True, "data": rows, "columns": list(result.keys()), "row_count": len(rows),
+                            "truncated": truncated}
         except Exception as e:
             return {"success": False, "error": str(e), "data": None}
+        
+        if cache_key:
+            query_cache.put(cache_key, {**response, "cached": True}, tables)
+        return response
+    
+    def _route(self, sql: str) -> str:
+        """Answer matching GROUP BY queries from a pre-aggregated rollup instead of the base table"""
+        try:
+            routed = rollup_router.rewrite(sql)
+        except Exception as e:
+            Console.warning(f"Rollup routing skipped: {e}")
+            return sql
+        return routed or sql
+    
+    def _execute_on_mirror(self, sql: str):
+        """Result from the local DuckDB mirror, or None to fall back to MySQL"""
+        if not local_mirror.enabled:
+            return None
+        try:
+            return local_mirror.execute(sql, self.config.ROW_LIMIT)
+        except Exception as e:
+            local_mirror.fallbacks += 1
+            Console.warning(f"Mirror skipped, using MySQL: {e}")
+            return None
+    
+    def _cache_lookup_key(self, sql: str):
+        try:
+            return cache_key_for(sql)
+        except Exception as e:
+            # Unknown table, CTE name, lost connection... just run the query uncached
+            Console.warning(f"Query cache bypassed: {e}")
+            return None, None
+    
+    def stream_query(self, sql: str, chunk_size: int = 1000):
+        """Yield the column names, then row batches, from an unbuffered server-side cursor"""
+        with replica_router.connect(sql) as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(text(sql))
+            yield list(result.keys())
+            for batch in result.partitions(chunk_size):
+                yield batch
+    
+    def _fetch_rows(self, result):
+        """Up to ROW_LIMIT rows, plus whether more were available (one extra row is read to tell)"""
+        if self.config.ROW_LIMIT > 0:
+            rows = result.fetchmany(self.config.ROW_LIMIT + 1)
+            truncated = len(rows) > self.config.ROW_LIMIT
+            if truncated:
+                rows = rows[:self.config.ROW_LIMIT]
+                Console.warning(f"Results limited to {self.config.ROW_LIMIT} rows")
+        else:
+            rows = result.fetchall()
+            truncated = False
+        return rows, truncated
     
     def test_connection(self):
         try:
-            with self.engine.connect() as conn:
+            with engine_registry.connect() as conn:
                 result = conn.execute(text("SELECT 1 as test"))
                 return result.fetchone()[0] == 1
         except Exception as e:
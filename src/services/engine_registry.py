@@ -0,0 +1,135 @@
+"""Process-wide SQLAlchemy engine and connection pool registry"""
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.core.config import Config
+
+class EngineRegistry:
+    def __init__(self):
+        self._engines = {}
+        self._async_engines = {}
+        self._wait_stats = {}
+        self._lock = threading.Lock()
+
+    def get_engine(self, name: str = "primary", url: str = None):
+        """Return the shared engine for `name`, creating it on first use"""
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                config = Config()
+                engine = create_engine(
+                    url or config.mysql_connection_string,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=config.DB_POOL_PRE_PING
+                )
+                self._engines[name] = engine
+                self._wait_stats[name] = {"checkouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+            return engine
+
+    def get_async_engine(self, name: str = "primary", url: str = None):
+        """Return the shared aiomysql-backed engine for `name`, with its own pool"""
+        engine = self._async_engines.get(name)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            engine = self._async_engines.get(name)
+            if engine is None:
+                config = Config()
+                engine = create_async_engine(
+                    url or config.mysql_async_connection_string,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=config.DB_POOL_PRE_PING
+                )
+                self._async_engines[name] = engine
+                self._wait_stats[f"{name}:async"] = {"checkouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+            return engine
+
+    @contextmanager
+    def connect(self, name: str = "primary"):
+        """Check out a SQLAlchemy connection, recording how long the pool made us wait"""
+        engine = self.get_engine(name)
+        started = time.perf_counter()
+        conn = engine.connect()
+        self._record_wait(name, time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @asynccontextmanager
+    async def connect_async(self, name: str = "primary"):
+        """Async counterpart of connect(); awaits a pooled aiomysql connection"""
+        engine = self.get_async_engine(name)
+        started = time.perf_counter()
+        conn = await engine.connect()
+        self._record_wait(f"{name}:async", time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    def raw_connection(self, name: str = "primary"):
+        """Check out a pooled DBAPI connection; close() returns it to the pool"""
+        engine = self.get_engine(name)
+        started = time.perf_counter()
+        conn = engine.raw_connection()
+        self._record_wait(name, time.perf_counter() - started)
+        return conn
+
+    def _record_wait(self, name: str, waited: float):
+        with self._lock:
+            stats = self._wait_stats[name]
+            stats["checkouts"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+
+    def pool_stats(self) -> dict:
+        """Pool occupancy and checkout wait times for every registered engine"""
+        engines = dict(self._engines)
+        engines.update({f"{name}:async": engine.sync_engine for name, engine in self._async_engines.items()})
+
+        stats = {}
+        for name, engine in engines.items():
+            pool = engine.pool
+            waits = self._wait_stats[name]
+            checkouts = waits["checkouts"]
+            stats[name] = {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": Config.DB_MAX_OVERFLOW,
+                "checkouts": checkouts,
+                "avg_wait_ms": round(waits["total_wait"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_wait_ms": round(waits["max_wait"] * 1000, 3)
+            }
+        return stats
+
+    def dispose(self):
+        """Close all pooled connections, e.g. on application shutdown"""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+
+    async def dispose_async(self):
+        """Close the async pools; they must be disposed from the event loop"""
+        for engine in list(self._async_engines.values()):
+            await engine.dispose()
+
+engine_registry = EngineRegistry()
+
+def get_engine(name: str = "primary"):
+    return engine_registry.get_engine(name)
@@ -0,0 +1,198 @@
+"""Workload-driven index advisor.
+
+DatabaseManager hands every executed SELECT to `index_advisor.capture()`. The report
+re-parses the captured workload for filter/join/group/order columns, runs EXPLAIN on
+each statement, and ranks missing indexes on full-scanned tables by
+(executions x rows examined x column role weight)."""
+import re
+import threading
+import time
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.utils.sql_text import extract_aliases, is_read_only, normalize_sql, strip_literals
+
+ROLE_WEIGHTS = {"filter": 1.0, "join": 1.0, "group": 0.5, "order": 0.25}
+FULL_SCAN_TYPES = {"ALL", "index"}
+
+_COLUMN = r"(?:`?(\w+)`?\s*\.\s*)?`?([a-zA-Z_]\w*)`?"
+_PREDICATE_RE = re.compile(
+    _COLUMN + r"\s*(=|<=>|<>|!=|<=|>=|<|>|\blike\b|\bnot\s+like\b|\bin\s*\(|\bnot\s+in\s*\(|\bbetween\b|\bis\b)",
+    re.I
+)
+_COLUMN_PAIR_RE = re.compile(_COLUMN + r"\s*=\s*" + _COLUMN, re.I)
+_CLAUSE_RES = {
+    "where": re.compile(r"\bwhere\b(.+?)(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|\)|;|$)", re.I | re.S),
+    "on": re.compile(r"\bon\b(.+?)(?=\bwhere\b|\b(?:inner|left|right|cross)?\s*join\b|\bgroup\s+by\b|\border\s+by\b|\blimit\b|;|$)", re.I | re.S),
+    "group": re.compile(r"\bgroup\s+by\b(.+?)(?=\bhaving\b|\border\s+by\b|\blimit\b|\)|;|$)", re.I | re.S),
+    "order": re.compile(r"\border\s+by\b(.+?)(?=\blimit\b|\)|;|$)", re.I | re.S)
+}
+
+def extract_column_roles(sql: str) -> list:
+    """(qualifier, column, role) triples; qualifier is the alias/table prefix or None"""
+    cleaned = strip_literals(sql)
+    refs = []
+    for clause in _CLAUSE_RES["on"].findall(cleaned):
+        for match in _COLUMN_PAIR_RE.finditer(clause):
+            refs.append((match.group(1), match.group(2), "join"))
+            refs.append((match.group(3), match.group(4), "join"))
+    for clause in _CLAUSE_RES["where"].findall(cleaned):
+        paired = set()
+        for match in _COLUMN_PAIR_RE.finditer(clause):
+            if match.group(3) and match.group(1) and match.group(1) != match.group(3):
+                refs.append((match.group(1), match.group(2), "join"))
+                refs.append((match.group(3), match.group(4), "join"))
+                paired.add(match.start())
+        for match in _PREDICATE_RE.finditer(clause):
+            if match.start() not in paired:
+                refs.append((match.group(1), match.group(2), "filter"))
+    for role in ("group", "order"):
+        for clause in _CLAUSE_RES[role].findall(cleaned):
+            for item in clause.split(","):
+                match = re.fullmatch(r"\s*" + _COLUMN + r"(?:\s+(?:asc|desc))?\s*", item, re.I)
+                if match:
+                    refs.append((match.group(1), match.group(2), role))
+    return refs
+
+class IndexAdvisor:
+    def __init__(self, max_statements: int = 500):
+        self.max_statements = max_statements
+        self._statements = {}  # normalized sql -> {"sql", "executions", "last_seen"}
+        self._lock = threading.Lock()
+
+    def capture(self, sql: str):
+        if not Config.INDEX_ADVISOR_ENABLED or not is_read_only(sql):
+            return
+        key = normalize_sql(sql)
+        if not key.startswith(("select", "with")):
+            return
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    coldest = min(self._statements, key=lambda k: (self._statements[k]["executions"], self._statements[k]["last_seen"]))
+                    del self._statements[coldest]
+                entry = self._statements[key] = {"sql": sql, "executions": 0, "last_seen": 0.0}
+            entry["executions"] += 1
+            entry["last_seen"] = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+    def _table_columns(self, conn) -> dict:
+        columns = {}
+        for table, column in conn.execute(text("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+        """)):
+            columns.setdefault(table.lower(), set()).add(column.lower())
+        return columns
+
+    def _index_prefixes(self, conn) -> dict:
+        """Existing indexes per table as tuples of their columns, for prefix matching"""
+        indexes = {}
+        for table, index_name, column in conn.execute(text("""
+            SELECT table_name, index_name, column_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+            ORDER BY table_name, index_name, seq_in_index
+        """)):
+            indexes.setdefault(table.lower(), {}).setdefault(index_name, []).append(column.lower())
+        return {table: [tuple(cols) for cols in by_name.values()] for table, by_name in indexes.items()}
+
+    def _explain(self, conn, sql: str) -> list:
+        return [dict(row) for row in conn.execute(text("EXPLAIN " + sql.strip().rstrip(";"))).mappings()]
+
+    def report(self, limit: int = 20) -> dict:
+        with self._lock:
+            workload = list(self._statements.values())
+
+        candidates = {}
+        explained = failed = 0
+        with engine_registry.connect() as conn:
+            table_columns = self._table_columns(conn)
+            existing = self._index_prefixes(conn)
+
+            for statement in workload:
+                try:
+                    plan = self._explain(conn, statement["sql"])
+                    explained += 1
+                except Exception:
+                    conn.rollback()
+                    failed += 1
+                    continue
+
+                aliases = extract_aliases(statement["sql"])
+                scanned = {}
+                for step in plan:
+                    table = aliases.get(str(step.get("table") or "").lower())
+                    if table and step.get("type") in FULL_SCAN_TYPES:
+                        scanned[table.lower()] = max(scanned.get(table.lower(), 0), int(step.get("rows") or 0))
+                if not scanned:
+                    continue
+
+                per_table = {}
+                for qualifier, column, role in extract_column_roles(statement["sql"]):
+                    column = column.lower()
+                    if qualifier:
+                        table = (aliases.get(qualifier.lower()) or "").lower()
+                    else:
+                        owners = [t.lower() for t in set(aliases.values()) if column in table_columns.get(t.lower(), set())]
+                        table = owners[0] if len(owners) == 1 else ""
+                    if table in scanned and column in table_columns.get(table, set()):
+                        roles = per_table.setdefault(table, {})
+                        if ROLE_WEIGHTS[role] > ROLE_WEIGHTS.get(roles.get(column), 0):
+                            roles[column] = role
+
+                for table, roles in per_table.items():
+                    rows_examined = scanned[table] * statement["executions"]
+                    keys = [(column,) for column in roles]
+                    filters = tuple(c for c, role in roles.items() if role in ("filter", "join"))
+                    if len(filters) > 1:
+                        keys.append(filters)
+                    for key in keys:
+                        if any(index[:len(key)] == key for index in existing.get(table, [])):
+                            continue
+                        weight = max(ROLE_WEIGHTS[roles[c]] for c in key) * (1 + 0.25 * (len(key) - 1))
+                        candidate = candidates.setdefault((table, key), {
+                            "table": table, "columns": list(key), "benefit": 0.0,
+                            "rows_examined": 0, "statements": 0, "roles": {c: roles[c] for c in key},
+                            "example_sql": statement["sql"]
+                        })
+                        candidate["benefit"] += rows_examined * weight
+                        candidate["rows_examined"] += rows_examined
+                        candidate["statements"] += 1
+
+        ranked = sorted(candidates.values(), key=lambda c: c["benefit"], reverse=True)[:limit]
+        for candidate in ranked:
+            candidate["benefit"] = round(candidate["benefit"], 1)
+            candidate["ddl"] = self.ddl(candidate["table"], candidate["columns"])
+        return {
+            "statements_captured": len(workload),
+            "statements_explained": explained,
+            "statements_failed": failed,
+            "apply_enabled": Config.INDEX_ADVISOR_ALLOW_APPLY,
+            "recommendations": ranked
+        }
+
+    @staticmethod
+    def ddl(table: str, columns: list) -> str:
+        name = ("idx_adv_" + "_".join(columns))[:64]
+        return f"ALTER TABLE `{table}` ADD INDEX `{name}` (" + ", ".join(f"`{c}`" for c in columns) + ")"
+
+    def apply(self, table: str, columns: list) -> dict:
+        """Create one recommended index; refuses anything the current report doesn't recommend"""
+        if not Config.INDEX_ADVISOR_ALLOW_APPLY:
+            raise PermissionError("Index creation is disabled; set INDEX_ADVISOR_ALLOW_APPLY=true to allow it")
+        wanted = (table.lower(), [c.lower() for c in columns])
+        recommended = [c for c in self.report(limit=1000)["recommendations"] if (c["table"], c["columns"]) == wanted]
+        if not recommended:
+            raise ValueError("Index is not among the current recommendations")
+
+        started = time.perf_counter()
+        with engine_registry.connect() as conn:
+            conn.execute(text(recommended[0]["ddl"]))
+            conn.commit()
+        return {"status": "applied", "ddl": recommended[0]["ddl"], "seconds": round(time.perf_counter() - started, 3)}
+
+index_advisor = IndexAdvisor()
@@ -0,0 +1,116 @@
+"""Two-tier cache for chat completions: an in-memory LRU in front of a SQLite file.
+
+Keys hash the model, messages and sampling params, so only byte-identical requests
+hit. Entries carry the schema fingerprint they were produced under and expire after
+LLM_CACHE_TTL; a different fingerprint is a miss even when the prompt happens to
+match. Only low-temperature calls are cached (LLM_CACHE_MAX_TEMPERATURE), since
+sampled answers are expected to vary."""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.core.config import Config
+
+def make_key(model: str, messages: list, params: dict) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(self, path: str, max_entries: int, ttl: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (content, schema_tag, expires_at, latency)
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self._stats = {}
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    method TEXT,
+                    content TEXT,
+                    schema_tag TEXT,
+                    expires_at REAL,
+                    latency REAL
+                )
+            """)
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        return self._db
+
+    def _method_stats(self, method: str) -> dict:
+        return self._stats.setdefault(method, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "saved_seconds": 0.0})
+
+    def get(self, method: str, key: str, schema_tag: str = None):
+        """Cached content or None; counts the lookup against `method`"""
+        now = time.time()
+        with self._lock:
+            stats = self._method_stats(method)
+            entry = self._memory.get(key)
+            tier = "memory_hits"
+            if entry is None:
+                row = self._connection().execute(
+                    "SELECT content, schema_tag, expires_at, latency FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                entry = tuple(row) if row else None
+                tier = "disk_hits"
+            if entry is None or entry[2] < now or entry[1] != schema_tag:
+                self._memory.pop(key, None)
+                stats["misses"] += 1
+                return None
+            self._remember(key, entry)
+            stats[tier] += 1
+            stats["saved_seconds"] += entry[3] or 0.0
+            return entry[0]
+
+    def put(self, method: str, key: str, content: str, latency: float, schema_tag: str = None):
+        entry = (content, schema_tag, time.time() + self.ttl, latency)
+        with self._lock:
+            self._remember(key, entry)
+            db = self._connection()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, method, *entry))
+            self._puts += 1
+            if self._puts % 100 == 0:
+                db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            db.commit()
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> int:
+        with self._lock:
+            self._memory.clear()
+            removed = self._connection().execute("DELETE FROM responses").rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            methods = {}
+            for method, counts in self._stats.items():
+                lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+                methods[method] = {
+                    **counts,
+                    "saved_seconds": round(counts["saved_seconds"], 3),
+                    "hit_ratio": round((lookups - counts["misses"]) / lookups, 3) if lookups else 0.0
+                }
+            disk_entries = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "enabled": Config.LLM_CACHE_ENABLED,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "methods": methods
+            }
+
+llm_cache = LLMCache(path=Config.LLM_CACHE_PATH, max_entries=Config.LLM_CACHE_MAX_ENTRIES, ttl=Config.LLM_CACHE_TTL)
@@ -0,0 +1,282 @@
+"""Optional embedded DuckDB mirror of the reporting tables.
+
+`refresh()` snapshots the base tables (plus any typed copies and rollups that exist)
+from MySQL into a local DuckDB file. With MIRROR_ENABLED, DatabaseManager runs
+read-only generated SQL there after translating it from the MySQL dialect (sqlglot
+when installed, else a regex translator for the constructs our prompts produce) and
+falls back to MySQL whenever translation or execution fails. MIRROR_ONLY runs generated
+queries on the mirror alone; startup, schema loading, the value dictionary, feedback
+storage and result paging still need MySQL.
+
+Run `python -m src.services.local_mirror` (or POST /admin/mirror/refresh)."""
+import os
+import re
+import tempfile
+import threading
+import time
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.services.rollups import ROLLUPS
+from src.services.typed_tables import BASE_TABLES, typed_name
+from src.utils.console import Console
+from src.utils.sql_text import is_read_only, tokenize
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import sqlglot
+except ImportError:
+    sqlglot = None
+
+class MirrorUnavailable(Exception):
+    pass
+
+class TranslationError(Exception):
+    pass
+
+class MirrorRow(tuple):
+    """Tuple row with `_fields` and attribute access, like the SQLAlchemy rows the app consumes"""
+    _fields = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[self._fields.index(name)]
+        except ValueError:
+            raise AttributeError(name)
+
+def _row_class(columns: list):
+    return type("MirrorRow", (MirrorRow,), {"_fields": tuple(columns), "__slots__": ()})
+
+def _duckdb_type(data_type: str, precision, scale) -> str:
+    data_type = data_type.lower()
+    if data_type in ("tinyint", "smallint", "mediumint", "int", "integer", "bigint", "year"):
+        return "BIGINT"
+    if data_type == "decimal":
+        return f"DECIMAL({min(int(precision or 18), 38)},{int(scale or 0)})"
+    if data_type in ("float", "double", "real"):
+        return "DOUBLE"
+    if data_type == "date":
+        return "DATE"
+    if data_type in ("datetime", "timestamp"):
+        return "TIMESTAMP"
+    # MySQL's default collations compare case-insensitively; keep that for WHERE/GROUP BY
+    return "VARCHAR COLLATE NOCASE"
+
+_REGEX_RULES = [
+    (re.compile(r"\bifnull\s*\(", re.I), "COALESCE("),
+    (re.compile(r"\bcurdate\s*\(\s*\)", re.I), "CURRENT_DATE"),
+    (re.compile(r"\bnow\s*\(\s*\)", re.I), "CURRENT_TIMESTAMP"),
+    (re.compile(r"\bdate_format\s*\(", re.I), "STRFTIME("),
+    (re.compile(r"\bstr_to_date\s*\(", re.I), "STRPTIME("),
+    (re.compile(r"\bas\s+signed(?:\s+integer)?\b", re.I), "AS BIGINT"),
+    (re.compile(r"\bas\s+unsigned(?:\s+integer)?\b", re.I), "AS UBIGINT"),
+    (re.compile(r"\bas\s+char\b(?:\s*\(\s*\d+\s*\))?", re.I), "AS VARCHAR"),
+    (re.compile(r"\bas\s+datetime\b", re.I), "AS TIMESTAMP"),
+    (re.compile(r"\blimit\s+(\d+)\s*,\s*(\d+)", re.I), r"LIMIT \2 OFFSET \1"),
+    (re.compile(r"\bdiv\b", re.I), "//"),
+    (re.compile(r"\bgroup_concat\s*\(([^()]*)\)", re.I), r"STRING_AGG(\1, ',')"),
+    (re.compile(r"\bdate_sub\s*\(\s*([^,()]+(?:\([^()]*\))?)\s*,\s*interval\s+(-?\d+)\s+(\w+)\s*\)", re.I), r"(\1 - INTERVAL \2 \3)"),
+    (re.compile(r"\bdate_add\s*\(\s*([^,()]+(?:\([^()]*\))?)\s*,\s*interval\s+(-?\d+)\s+(\w+)\s*\)", re.I), r"(\1 + INTERVAL \2 \3)")
+]
+# DuckDB has no implicit VARCHAR -> date cast, and the base tables keep as_of_date as VARCHAR
+_DATE_FUNCTION_RE = re.compile(r"\b(strftime|year|month|day|quarter)\s*\(", re.I)
+_UNSUPPORTED_RE = re.compile(r"\b(regexp|rlike|separator|date_sub|date_add|sql_calc_found_rows|straight_join|with\s+rollup)\b|@", re.I)
+_LIKE_RE = re.compile(r"(?<!i)\blike\b", re.I)
+
+def _with_placeholders(sql: str):
+    """Code with literals swapped for placeholders, plus the literals rewritten for DuckDB"""
+    code, literals = [], []
+    for kind, piece in tokenize(sql):
+        if kind == "code":
+            code.append(piece)
+        elif kind == "comment":
+            code.append(" ")
+        else:
+            if kind == "identifier":
+                piece = '"' + piece[1:-1].replace('"', '""') + '"'
+            elif piece.startswith('"'):
+                piece = "'" + piece[1:-1].replace('\\"', '"').replace("'", "''") + "'"
+            code.append(f"__lit{len(literals)}__")
+            literals.append(piece)
+    return "".join(code), literals
+
+def _restore(code: str, literals: list) -> str:
+    return re.sub(r"__lit(\d+)__", lambda m: literals[int(m.group(1))], code)
+
+def _cast_date_arguments(code: str) -> str:
+    """Wrap the first argument of DuckDB date functions in CAST(... AS TIMESTAMP)"""
+    out, position = [], 0
+    for match in _DATE_FUNCTION_RE.finditer(code):
+        if match.start() < position:
+            continue
+        start = end = match.end()
+        depth = 0
+        while end < len(code) and (depth or code[end] not in ",)"):
+            depth += {"(": 1, ")": -1}.get(code[end], 0)
+            end += 1
+        argument = code[start:end].strip()
+        if re.fullmatch(r"cast\s*\(.*\bas\s+timestamp\s*\)", argument, re.I | re.S):
+            continue
+        out.append(code[position:start] + f"CAST({_cast_date_arguments(argument)} AS TIMESTAMP)")
+        position = end
+    return "".join(out) + code[position:]
+
+def translate_regex(sql: str) -> str:
+    code, literals = _with_placeholders(sql.strip().rstrip(";"))
+    for pattern, replacement in _REGEX_RULES:
+        code = pattern.sub(replacement, code)
+    unsupported = _UNSUPPORTED_RE.search(code)
+    if unsupported:
+        raise TranslationError(f"No DuckDB translation for '{unsupported.group(0)}'")
+    return _restore(_LIKE_RE.sub("ILIKE", _cast_date_arguments(code)), literals)
+
+def translate(sql: str) -> str:
+    """MySQL-dialect SQL as DuckDB SQL; raises TranslationError when it can't be done safely"""
+    if sqlglot is None:
+        return translate_regex(sql)
+    try:
+        translated = sqlglot.transpile(sql, read="mysql", write="duckdb",
+                                       unsupported_level=sqlglot.ErrorLevel.RAISE)
+    except Exception as e:
+        raise TranslationError(str(e))
+    if len(translated) != 1:
+        raise TranslationError("Expected a single statement")
+    code, literals = _with_placeholders(translated[0])
+    return _restore(_LIKE_RE.sub("ILIKE", _cast_date_arguments(code)), literals)
+
+class LocalMirror:
+    def __init__(self, path: str = None):
+        self.config = Config()
+        self.path = path or self.config.MIRROR_PATH
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return duckdb is not None and (self.config.MIRROR_ENABLED or self.config.MIRROR_ONLY)
+
+    def _open(self):
+        self._conn = duckdb.connect(self.path)
+        # MySQL sorts NULLs first ascending and last descending; DuckDB's default is NULLS LAST
+        self._conn.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+
+    def _connection(self):
+        if duckdb is None:
+            raise MirrorUnavailable("duckdb is not installed")
+        with self._lock:
+            if self._conn is None:
+                if not os.path.exists(self.path):
+                    raise MirrorUnavailable(f"No mirror at {self.path}; run a mirror refresh first")
+                self._open()
+            # One cursor per call: DuckDB cursors are safe to use from separate threads
+            return self._conn.cursor()
+
+    def execute(self, sql: str, limit: int = 0) -> dict:
+        """Run MySQL-dialect `sql` on the mirror; same result contract as DatabaseManager.execute_query"""
+        if not is_read_only(sql):
+            raise TranslationError("Only read-only statements run on the mirror")
+        translated = translate(sql)
+        cursor = self._connection()
+        try:
+            cursor.execute(translated)
+            columns = [column[0] for column in cursor.description]
+            raw = cursor.fetchmany(limit + 1) if limit > 0 else cursor.fetchall()
+        finally:
+            cursor.close()
+        truncated = limit > 0 and len(raw) > limit
+        row_class = _row_class(columns)
+        rows = [row_class(row) for row in (raw[:limit] if truncated else raw)]
+        self.hits += 1
+        return {"success": True, "data": rows, "columns": columns, "row_count": len(rows),
+                "truncated": truncated, "source": "mirror"}
+
+    def mirrored_tables(self, conn) -> list:
+        candidates = BASE_TABLES + [typed_name(t) for t in BASE_TABLES] + [r["name"] for r in ROLLUPS]
+        existing = {name for (name,) in conn.execute(text("""
+            SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()
+        """))}
+        return [table for table in candidates if table in existing]
+
+    def _copy_table(self, mysql_conn, mirror, table: str, chunk_size: int = 10000) -> int:
+        columns = mysql_conn.execute(text("""
+            SELECT column_name, data_type, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = :table
+            ORDER BY ordinal_position
+        """), {"table": table}).fetchall()
+        staging = f"{table}__staging"
+        definitions = ", ".join(f'"{name}" {_duckdb_type(kind, p, s)}' for name, kind, p, s in columns)
+        csv_columns = ", ".join(f"'{name}': '{_duckdb_type(kind, p, s).split()[0]}'" for name, kind, p, s in columns)
+
+        # Bulk-load through a CSV file: DuckDB's COPY path is far faster than row inserts
+        rows = 0
+        handle, csv_path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8", newline="") as out:
+                result = mysql_conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+                    text(f"SELECT * FROM `{table}`")
+                )
+                for batch in result.partitions(chunk_size):
+                    out.write("".join(
+                        ",".join("" if v is None else '"' + str(v).replace('"', '""') + '"' for v in row) + "\n"
+                        for row in batch
+                    ))
+                    rows += len(batch)
+            mirror.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            mirror.execute(f'CREATE TABLE "{staging}" ({definitions})')
+            mirror.execute(
+                f"INSERT INTO \"{staging}\" SELECT * FROM read_csv('{csv_path.replace(chr(39), chr(39) * 2)}', "
+                f"header = false, auto_detect = false, allow_quoted_nulls = false, columns = {{{csv_columns}}})"
+            )
+        finally:
+            os.remove(csv_path)
+
+        # DDL is transactional in DuckDB, so readers see either the old or the new table
+        mirror.execute("BEGIN TRANSACTION")
+        mirror.execute(f'DROP TABLE IF EXISTS "{table}"')
+        mirror.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+        mirror.execute("COMMIT")
+        return rows
+
+    def refresh(self, tables: list = None) -> list:
+        if duckdb is None:
+            raise MirrorUnavailable("duckdb is not installed (pip install duckdb)")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            if self._conn is None:
+                self._open()
+            mirror = self._conn.cursor()
+
+        results = []
+        try:
+            with engine_registry.connect() as conn:
+                for table in tables or self.mirrored_tables(conn):
+                    started = time.perf_counter()
+                    Console.processing(f"Mirroring {table}")
+                    rows = self._copy_table(conn, mirror, table)
+                    results.append({"table": table, "rows": rows, "seconds": round(time.perf_counter() - started, 3)})
+                    Console.success(f"{table}: {rows} rows in {results[-1]['seconds']}s")
+        finally:
+            mirror.close()
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "mirror_only": self.config.MIRROR_ONLY,
+            "path": self.path,
+            "translator": "sqlglot" if sqlglot is not None else "regex",
+            "hits": self.hits,
+            "fallbacks": self.fallbacks
+        }
+
+local_mirror = LocalMirror()
+
+if __name__ == "__main__":
+    LocalMirror().refresh()
@@ -0,0 +1,150 @@
+"""Prompt assembly with a stable prefix, local token counts and per-section budgets.
+
+Providers reuse the longest prompt prefix they have recently seen, but only once it
+reaches PROVIDER_CACHE_MIN_TOKENS (OpenAI: 1024), so every AIService prompt is laid out as:
+
+    static      instructions, mappings, rules and examples, identical across calls
+    dynamic     schema, context, data and the question, each cut to its token budget
+    closing     the answer cue ("SQL:"), static as well
+
+question_to_sql also carries the core tables' schema in its static part, which takes
+its prefix past the threshold; the shorter prefixes of the other methods are not cached.
+
+Tokens are counted with tiktoken when it is installed, else at ~4 characters per token.
+`prompt_stats` keeps per-method totals of what was built and, from the response usage,
+how many prompt tokens the provider served from its cache."""
+import functools
+import threading
+from src.core.config import Config
+from src.utils.console import Console
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TRUNCATION_MARKER = "... (truncated to fit the prompt budget)"
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # encoding files unavailable offline
+        return None
+
+@functools.lru_cache(maxsize=512)
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+def truncate_to_budget(text: str, budget: int):
+    """(text, truncated): whole lines while they fit, then the marker; a single oversized line is cut"""
+    if count_tokens(text) <= budget:
+        return text, False
+    available = budget - count_tokens(TRUNCATION_MARKER) - 1
+    kept, used = [], 0
+    for line in text.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > available:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        kept = [text[:max(available, 0) * 4]]
+    return "\n".join(kept + [TRUNCATION_MARKER]), True
+
+class PromptStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def _method(self, method: str) -> dict:
+        return self._methods.setdefault(method, {
+            "prompts": 0, "estimated_tokens": 0, "static_tokens": 0, "truncated_sections": 0,
+            "calls": 0, "prompt_tokens": 0, "cached_tokens": 0
+        })
+
+    def built(self, method: str, static_tokens: int, total_tokens: int, truncated: list):
+        with self._lock:
+            stats = self._method(method)
+            stats["prompts"] += 1
+            stats["estimated_tokens"] += total_tokens
+            stats["static_tokens"] = static_tokens
+            stats["truncated_sections"] += len(truncated)
+        if truncated:
+            Console.warning(f"{method}: prompt sections truncated to budget: {', '.join(truncated)}")
+
+    def record_usage(self, method: str, usage):
+        """Count the provider-reported prompt tokens and the part of them served from its prefix cache"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        with self._lock:
+            stats = self._method(method)
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached
+        if Config.PROMPT_USAGE_LOG:
+            Console.info(f"{method}: {prompt_tokens} prompt tokens, {cached} from the provider cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "token_counter": "tiktoken" if _encoding() is not None else "chars/4",
+                "methods": {
+                    method: {
+                        **counts,
+                        "cached_ratio": round(counts["cached_tokens"] / counts["prompt_tokens"], 3) if counts["prompt_tokens"] else 0.0
+                    }
+                    for method, counts in self._methods.items()
+                }
+            }
+
+prompt_stats = PromptStats()
+
+class PromptBuilder:
+    """Collects sections in any order and emits static ones first, then dynamic ones, then the closing cue"""
+
+    def __init__(self, method: str):
+        self.method = method
+        self._static = []
+        self._dynamic = []
+        self._closing = ""
+        self._truncated = []
+
+    def static(self, text: str) -> "PromptBuilder":
+        self._static.append(text.strip("\n"))
+        return self
+
+    def dynamic(self, label: str, text: str, budget: int = None) -> "PromptBuilder":
+        """Add a per-call section under `label`, cut to `budget` tokens; empty text adds nothing"""
+        text = str(text) if text is not None else ""
+        multiline = "\n" in text
+        text = text.strip("\n")
+        if not text:
+            return self
+        if budget is not None:
+            text, truncated = truncate_to_budget(text, budget)
+            if truncated:
+                self._truncated.append(label or "section")
+        if label:
+            text = f"{label}:\n{text}" if multiline else f"{label}: {text}"
+        self._dynamic.append(text)
+        return self
+
+    def closing(self, text: str) -> "PromptBuilder":
+        self._closing = text.strip("\n")
+        return self
+
+    def build(self) -> str:
+        prefix = "\n\n".join(self._static)
+        prompt = "\n\n".join(part for part in (prefix, *self._dynamic, self._closing) if part)
+        prompt_stats.built(self.method, count_tokens(prefix) if prefix else 0, count_tokens(prompt), self._truncated)
+        return prompt
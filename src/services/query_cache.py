@@ -0,0 +1,181 @@
+"""In-process query result cache keyed by normalized SQL and table data versions"""
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.utils.sql_text import extract_tables, is_read_only, normalize_sql
+
+class DataVersionTracker:
+    """Cheap per-table data versions, memoized for a short TTL.
+
+    A version is information_schema's UPDATE_TIME, TABLE_ROWS and DATA_LENGTH (no table
+    is scanned) plus a local write counter that `record_writes` bumps whenever this
+    process loads or rebuilds a table. MySQL 8 caches those statistics for
+    information_schema_stats_expiry seconds, so the lookup sets it to 0 for its own
+    statement with a SET_VAR hint (pooled connections keep their setting); servers without
+    that variable ignore the hint and the write counter still covers our own loads."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._versions = {}
+        self._writes = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_versions(self, tables: list) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            fresh = {t: v for t, (expires, v) in self._versions.items() if t in tables and expires > now}
+        missing = [t for t in tables if t not in fresh]
+        if missing:
+            looked_up = self._lookup(missing)
+            with self._lock:
+                for table, version in looked_up.items():
+                    self._versions[table] = (now + self.ttl, version)
+            fresh.update(looked_up)
+        with self._lock:
+            return {t: v + [self._generation, self._writes.get(t, 0)] for t, v in fresh.items()}
+
+    def forget(self, tables: list = None):
+        with self._lock:
+            if tables is None:
+                self._versions.clear()
+            else:
+                for table in tables:
+                    self._versions.pop(table, None)
+
+    def record_writes(self, tables: list = None):
+        """Mark `tables` (or every table) as written, so versions change without waiting for MySQL's statistics"""
+        with self._lock:
+            if tables is None:
+                self._generation += 1
+            else:
+                for table in tables:
+                    self._writes[table] = self._writes.get(table, 0) + 1
+        self.forget(tables)
+
+    def _lookup(self, tables: list) -> dict:
+        placeholders = ", ".join(f":t{i}" for i in range(len(tables)))
+        stats_sql = f"""
+            SELECT /*+ SET_VAR(information_schema_stats_expiry = 0) */
+                   table_name, update_time, table_rows, data_length
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+        """
+        with engine_registry.connect() as conn:
+            rows = conn.execute(text(stats_sql), {f"t{i}": t for i, t in enumerate(tables)})
+            stats = {name: [str(update_time), table_rows, data_length] for name, update_time, table_rows, data_length in rows}
+        return {table: stats.get(table, [None, None, None]) for table in tables}
+
+class QueryCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, tables, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(sql: str, versions: dict) -> str:
+        payload = normalize_sql(sql) + "|" + json.dumps(versions, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key: str, result: dict, tables: list):
+        size = self._estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, tables, result)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tables: list = None) -> int:
+        """Drop every entry, or only entries that read from any of `tables`"""
+        with self._lock:
+            if tables is None:
+                keys = list(self._entries)
+            else:
+                wanted = set(tables)
+                keys = [key for key, entry in self._entries.items() if wanted & set(entry[2])]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+    @staticmethod
+    def _estimate_size(result: dict) -> int:
+        rows = result.get("data") or []
+        size = sys.getsizeof(rows)
+        for row in rows:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        return size
+
+config = Config()
+query_cache = QueryCache(
+    max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=config.QUERY_CACHE_MAX_MB * 1024 * 1024,
+    ttl=config.QUERY_CACHE_TTL
+)
+data_versions = DataVersionTracker(ttl=config.QUERY_CACHE_VERSION_TTL)
+
+def cache_key_for(sql: str):
+    """Return (key, tables) for a cacheable SELECT, or (None, None) when it must hit the database"""
+    if not Config.QUERY_CACHE_ENABLED or not is_read_only(sql):
+        return None, None
+    if not normalize_sql(sql).startswith(("select", "with")):
+        return None, None
+    tables = extract_tables(sql)
+    if not tables or any(schema not in (None, Config.MYSQL_DATABASE) for schema, _ in tables):
+        return None, None
+    names = sorted({table for _, table in tables})
+    if not all(re.fullmatch(r"\w+", name) for name in names):
+        return None, None
+    return query_cache.make_key(sql, data_versions.get_versions(names)), names
+
+def invalidate(tables: list = None) -> int:
+    data_versions.record_writes(tables)
+    return query_cache.invalidate(tables)
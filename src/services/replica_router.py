@@ -0,0 +1,138 @@
+"""Read-replica selection for generated read-only SQL.
+
+Replicas from MYSQL_REPLICA_HOSTS get their own engines in the registry
+("replica-0", "replica-1", ...). Reads go round-robin to replicas whose lag is within
+REPLICA_MAX_LAG_SECONDS; everything else, and every read when no replica qualifies,
+goes to the primary."""
+import threading
+import time
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.utils.console import Console
+from src.utils.sql_text import is_read_only
+
+PRIMARY = "primary"
+
+class ReplicaRouter:
+    def __init__(self, hosts: list = None):
+        self.config = Config()
+        self.replicas = []
+        for i, host in enumerate(self.config.MYSQL_REPLICA_HOSTS if hosts is None else hosts):
+            name, _, port = host.partition(":")
+            self.replicas.append({
+                "name": f"replica-{i}", "host": name, "port": int(port or self.config.MYSQL_PORT),
+                "healthy": False, "lag_seconds": None, "error": None, "checked_at": 0.0, "routed": 0
+            })
+        self._next = 0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self.primary_fallbacks = 0
+
+    def _register(self, replica: dict):
+        engine_registry.get_engine(replica["name"], self.config.replica_connection_string(replica["host"], replica["port"]))
+        engine_registry.get_async_engine(replica["name"], self.config.replica_connection_string(replica["host"], replica["port"], "aiomysql"))
+
+    def _replication_lag(self, conn):
+        """Seconds behind the source; None when replication is stopped. A server that is not
+        replicating at all (e.g. a read-only clone) reports no status rows and counts as current."""
+        try:
+            row = conn.execute(text("SHOW REPLICA STATUS")).mappings().fetchone()
+            key = "Seconds_Behind_Source"
+        except Exception:
+            # MySQL < 8.0.22 / MariaDB
+            row = conn.execute(text("SHOW SLAVE STATUS")).mappings().fetchone()
+            key = "Seconds_Behind_Master"
+        if row is None:
+            return 0
+        lag = row.get(key)
+        return None if lag is None else int(lag)
+
+    def check(self, replica: dict):
+        self._register(replica)
+        try:
+            with engine_registry.connect(replica["name"]) as conn:
+                lag = self._replication_lag(conn)
+            replica["lag_seconds"] = lag
+            replica["error"] = None if lag is not None else "replication stopped"
+            replica["healthy"] = lag is not None and lag <= self.config.REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            replica.update(healthy=False, lag_seconds=None, error=str(e))
+        replica["checked_at"] = time.monotonic()
+
+    def _refresh_health(self):
+        now = time.monotonic()
+        stale = [r for r in self.replicas if now - r["checked_at"] >= self.config.REPLICA_HEALTH_INTERVAL]
+        # One thread re-checks; concurrent callers route on the last known status
+        if stale and self._check_lock.acquire(blocking=False):
+            try:
+                for replica in stale:
+                    was_healthy = replica["healthy"]
+                    self.check(replica)
+                    if was_healthy and not replica["healthy"]:
+                        reason = replica["error"] or f"lag {replica['lag_seconds']}s"
+                        Console.warning(f"{replica['name']} ({replica['host']}) taken out of rotation: {reason}")
+            finally:
+                self._check_lock.release()
+
+    def choose(self, sql: str = None) -> str:
+        """Registry name to run `sql` on: a healthy replica for read-only SQL, else the primary"""
+        if not self.replicas or (sql is not None and not is_read_only(sql)):
+            return PRIMARY
+        self._refresh_health()
+        with self._lock:
+            healthy = [r for r in self.replicas if r["healthy"]]
+            if not healthy:
+                self.primary_fallbacks += 1
+                return PRIMARY
+            replica = healthy[self._next % len(healthy)]
+            self._next += 1
+            replica["routed"] += 1
+            return replica["name"]
+
+    def mark_failed(self, name: str, error: Exception):
+        for replica in self.replicas:
+            if replica["name"] == name:
+                replica.update(healthy=False, error=str(error), checked_at=time.monotonic())
+                Console.warning(f"{name} unreachable, falling back to primary: {error}")
+
+    @contextmanager
+    def connect(self, sql: str = None):
+        """Connection for `sql`; if the chosen replica can't be reached, the primary is used instead"""
+        name = self.choose(sql)
+        with ExitStack() as stack:
+            try:
+                conn = stack.enter_context(engine_registry.connect(name))
+            except Exception as e:
+                if name == PRIMARY:
+                    raise
+                self.mark_failed(name, e)
+                self.primary_fallbacks += 1
+                conn = stack.enter_context(engine_registry.connect(PRIMARY))
+            yield conn
+
+    @asynccontextmanager
+    async def connect_async(self, name: str):
+        """Async connection on a name from choose(), with the same primary failover"""
+        async with AsyncExitStack() as stack:
+            try:
+                conn = await stack.enter_async_context(engine_registry.connect_async(name))
+            except Exception as e:
+                if name == PRIMARY:
+                    raise
+                self.mark_failed(name, e)
+                self.primary_fallbacks += 1
+                conn = await stack.enter_async_context(engine_registry.connect_async(PRIMARY))
+            yield conn
+
+    def status(self) -> dict:
+        return {
+            "max_lag_seconds": self.config.REPLICA_MAX_LAG_SECONDS,
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {k: v for k, v in replica.items() if k != "checked_at"} for replica in self.replicas
+            ]
+        }
+
+replica_router = ReplicaRouter()
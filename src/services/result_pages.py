@@ -0,0 +1,301 @@
+"""Paginated browsing of results that hit ROW_LIMIT, in the query's own order.
+
+A handle pages its result one of two ways:
+
+    keyset      single-table queries MySQL can merge into the page query (no GROUP BY,
+                DISTINCT, aggregates, LIMIT or UNION) whose ORDER BY terms are output
+                columns and whose output carries the table's primary key. The keys are
+                the ORDER BY terms followed by the primary key as tie-breaker, so they
+                are unique and keep the requested order; each page is
+                    SELECT * FROM (<sql>) _q WHERE <after cursor> ORDER BY <keys> LIMIT n + 1
+                and, the derived table being merged, seeks past the cursor.
+    snapshot    everything else (expression or alias ORDER BYs, joins, aggregates): the
+                query runs once and up to RESULT_SNAPSHOT_MAX_ROWS rows are kept, in the
+                order the database returned them; pages are slices and the cursor an offset.
+                Snapshots share a budget of RESULT_SNAPSHOT_TOTAL_ROWS rows across handles;
+                opening one past it evicts the least recently used snapshots first.
+
+Results larger than a snapshot can hold are not paged at all."""
+import base64
+import json
+import re
+import secrets
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.replica_router import replica_router
+from src.services.rollups import rollup_router
+from src.services.schema_state import schema_watcher
+from src.utils.sql_text import extract_tables, strip_literals
+
+MAX_PAGE_SIZE = 5000
+
+_UNMERGEABLE_RE = re.compile(
+    r"\b(?:group\s+by|having|distinct|limit|union|over|join)\b|\b(?:sum|count|avg|min|max|group_concat)\s*\(", re.I
+)
+_COLUMN_ITEM_RE = re.compile(r"(?:`?\w+`?\s*\.\s*)?`?(\w+)`?(?:\s+(?:as\s+)?`?(\w+)`?)?", re.I)
+
+def _top_level(cleaned: str) -> str:
+    """`cleaned` with everything inside parentheses blanked out, positions preserved"""
+    depth = 0
+    masked = []
+    for char in cleaned:
+        depth += char == "("
+        masked.append(char if depth == 0 else " ")
+        depth -= char == ")"
+    return "".join(masked)
+
+def _split_top_level(text: str) -> list:
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        depth += (char == "(") - (char == ")")
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+def _top_level_order_by(sql: str) -> list:
+    """[(term, direction)] from the outermost ORDER BY, or [] when there is none"""
+    cleaned = strip_literals(sql).strip().rstrip(";")
+    masked = _top_level(cleaned)
+    matches = list(re.finditer(r"\border\s+by\b", masked, re.I))
+    if not matches:
+        return []
+    start = matches[-1].end()
+    end = re.search(r"\blimit\b|$", masked[start:], re.I).start() + start
+    ordered = []
+    for term in _split_top_level(cleaned[start:end]):
+        match = re.fullmatch(r"\s*(.+?)(?:\s+(asc|desc))?\s*", term, re.I | re.S)
+        ordered.append((match.group(1), (match.group(2) or "asc").lower()))
+    return ordered
+
+def _select_sources(sql: str, columns: list):
+    """{output column: source column} for select items that are plain column references,
+    or None when the select list doesn't line up with `columns`"""
+    cleaned = strip_literals(sql).strip().rstrip(";")
+    masked = _top_level(cleaned)
+    select = re.search(r"\bselect\b", masked, re.I)
+    end = re.search(r"\bfrom\b", masked[select.end():], re.I) if select else None
+    if not end:
+        return None
+    items = [item.strip() for item in _split_top_level(cleaned[select.end():select.end() + end.start()])]
+    if items == ["*"]:
+        return {column: column for column in columns}
+    if len(items) != len(columns):
+        return None
+    sources = {}
+    for column, item in zip(columns, items):
+        match = _COLUMN_ITEM_RE.fullmatch(item)
+        if match and (match.group(2) or match.group(1)).lower() == column.lower():
+            sources[column] = match.group(1)
+    return sources
+
+def _primary_key(table: str) -> list:
+    store = schema_watcher.current.store
+    return store.primary_key(table) if store is not None else []
+
+def sort_keys(sql: str, columns: list):
+    """Unique keyset order [(column, direction)] that keeps the query's own ORDER BY, or None
+    when the query can't be keyset-paged and needs a snapshot instead"""
+    lowered = [c.lower() for c in columns]
+    if len(set(lowered)) != len(lowered):
+        return None
+    tables = extract_tables(sql)
+    if len(tables) != 1 or _UNMERGEABLE_RE.search(strip_literals(sql)):
+        return None
+    sources = _select_sources(sql, columns)
+    if sources is None:
+        return None
+    by_source = {source.lower(): column for column, source in sources.items()}
+
+    keys = []
+    for term, direction in _top_level_order_by(sql):
+        term = term.strip()
+        name = None
+        if term.isdigit() and 1 <= int(term) <= len(columns):
+            name = columns[int(term) - 1]
+        elif re.fullmatch(r"`?(\w+)`?", term) and term.strip("`").lower() in lowered:
+            name = columns[lowered.index(term.strip("`").lower())]
+        else:
+            match = re.fullmatch(r"(?:`?\w+`?\s*\.\s*)?`?(\w+)`?", term)
+            name = by_source.get(match.group(1).lower()) if match else None
+        if name is None:
+            return None  # expression or unknown term: keyset order would differ from the query's
+        if name not in (k for k, _ in keys):
+            keys.append((name, direction))
+
+    primary_key = _primary_key(tables[0][1])
+    if not primary_key or any(column.lower() not in by_source for column in primary_key):
+        return None
+    keys += [(by_source[column.lower()], "asc") for column in primary_key
+             if by_source[column.lower()] not in (k for k, _ in keys)]
+    return keys
+
+def _quote(column: str) -> str:
+    return "`" + column.replace("`", "``") + "`"
+
+def keyset_predicate(keys: list, after: list):
+    """WHERE clause selecting rows strictly after `after` in MySQL sort order (NULLs first ascending,
+    last descending), expanded as (k1 > v1) OR (k1 <=> v1 AND k2 > v2) OR ..."""
+    params = {}
+    branches = []
+    for i, (column, direction) in enumerate(keys):
+        terms = [f"{_quote(keys[j][0])} <=> :k{j}" for j in range(i)]
+        value = after[i]
+        if value is None:
+            if direction == "desc":
+                continue  # nothing sorts after NULL descending
+            terms.append(f"{_quote(column)} IS NOT NULL")
+        elif direction == "asc":
+            terms.append(f"{_quote(column)} > :k{i}")
+        else:
+            terms.append(f"({_quote(column)} < :k{i} OR {_quote(column)} IS NULL)")
+        branches.append("(" + " AND ".join(terms) + ")")
+    for i, value in enumerate(after):
+        params[f"k{i}"] = value
+    return " OR ".join(branches) or "1 = 0", params
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$td": value.total_seconds()}
+    if isinstance(value, bytes):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    return value
+
+def _decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    (tag, raw), = value.items()
+    return {
+        "$dec": Decimal, "$dt": datetime.fromisoformat, "$date": date.fromisoformat,
+        "$time": dt_time.fromisoformat, "$td": lambda s: timedelta(seconds=s), "$b": base64.b64decode
+    }[tag](raw)
+
+def encode_cursor(row) -> str:
+    payload = json.dumps([_encode_value(v) for v in row], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(padded))]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+class ResultPager:
+    def __init__(self, ttl: int, max_handles: int, snapshot_rows: int, snapshot_total_rows: int):
+        self.ttl = ttl
+        self.max_handles = max_handles
+        self.snapshot_rows = snapshot_rows
+        self.snapshot_total_rows = snapshot_total_rows
+        self._handles = {}  # handle -> {"sql", "columns", "keys" | "rows", "expires_at"}
+        self._lock = threading.Lock()
+
+    def open(self, sql: str, columns: list, page_size: int):
+        """Register `sql` and return its first page, or None when it is too large to page"""
+        sql = (rollup_router.rewrite(sql) or sql).strip().rstrip(";")
+        entry = {"sql": sql, "columns": columns}
+        keys = sort_keys(sql, columns)
+        if keys:
+            entry["keys"] = keys
+        else:
+            rows = self._snapshot(sql)
+            if rows is None:
+                return None
+            entry["rows"] = rows
+        handle = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            while len(self._handles) >= self.max_handles:
+                self._evict(self._handles)
+            if "rows" in entry:
+                snapshots = {h: e for h, e in self._handles.items() if "rows" in e}
+                held = sum(len(e["rows"]) for e in snapshots.values())
+                while snapshots and held + len(entry["rows"]) > self.snapshot_total_rows:
+                    held -= len(self._evict(snapshots)["rows"])
+            self._handles[handle] = {**entry, "expires_at": time.monotonic() + self.ttl}
+        return {"handle": handle, **self.page(handle, None, page_size)}
+
+    def page(self, handle: str, cursor: str = None, page_size: int = None) -> dict:
+        """Rows after `cursor` (from the start when None) plus the cursor for the next page"""
+        with self._lock:
+            self._expire()
+            entry = self._handles.get(handle)
+            if entry is None:
+                raise KeyError(handle)
+            entry["expires_at"] = time.monotonic() + self.ttl
+        page_size = max(1, min(page_size or Config.ROW_LIMIT or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+        if "rows" in entry:
+            return self._snapshot_page(entry, cursor, page_size)
+
+        keys = entry["keys"]
+        where, params = ("", {})
+        if cursor:
+            after = decode_cursor(cursor)
+            if len(after) != len(keys):
+                raise ValueError("Cursor does not match this result")
+            where, params = keyset_predicate(keys, after)
+            where = f" WHERE {where}"
+        order = ", ".join(f"{_quote(column)} {direction.upper()}" for column, direction in keys)
+        page_sql = f"SELECT * FROM ({entry['sql']}) _q{where} ORDER BY {order} LIMIT {page_size + 1}"
+
+        with replica_router.connect(page_sql) as conn:
+            result = conn.execute(text(page_sql), params)
+            columns = list(result.keys())
+            rows = result.fetchall()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        positions = [columns.index(column) for column, _ in keys]
+        next_cursor = encode_cursor([rows[-1][i] for i in positions]) if has_more else None
+        return {"columns": columns, "data": rows, "row_count": len(rows), "next_cursor": next_cursor}
+
+    def _snapshot(self, sql: str):
+        """Up to `snapshot_rows` rows of `sql` in the order the database returns them, or None if there are more"""
+        with replica_router.connect(sql) as conn:
+            result = conn.execute(text(sql).execution_options(stream_results=True))
+            rows = result.fetchmany(self.snapshot_rows + 1)
+            result.close()
+        return None if len(rows) > self.snapshot_rows else rows
+
+    @staticmethod
+    def _snapshot_page(entry: dict, cursor: str, page_size: int) -> dict:
+        offset = 0
+        if cursor:
+            after = decode_cursor(cursor)
+            if len(after) != 1 or not isinstance(after[0], int) or not 0 <= after[0] <= len(entry["rows"]):
+                raise ValueError("Cursor does not match this result")
+            offset = after[0]
+        rows = entry["rows"][offset:offset + page_size]
+        end = offset + len(rows)
+        next_cursor = encode_cursor([end]) if end < len(entry["rows"]) else None
+        return {"columns": entry["columns"], "data": rows, "row_count": len(rows), "next_cursor": next_cursor}
+
+    def _evict(self, candidates: dict) -> dict:
+        """Drop the least recently used handle among `candidates` and return its entry"""
+        handle = min(candidates, key=lambda h: candidates[h]["expires_at"])
+        candidates.pop(handle, None)
+        return self._handles.pop(handle)
+
+    def _expire(self):
+        now = time.monotonic()
+        for handle in [h for h, entry in self._handles.items() if entry["expires_at"] < now]:
+            del self._handles[handle]
+
+result_pager = ResultPager(ttl=Config.RESULT_HANDLE_TTL, max_handles=Config.RESULT_HANDLE_MAX,
+                           snapshot_rows=Config.RESULT_SNAPSHOT_MAX_ROWS,
+                           snapshot_total_rows=Config.RESULT_SNAPSHOT_TOTAL_ROWS)
@@ -0,0 +1,178 @@
+"""Compact, token-budgeted profile of a query result for narrative prompts.
+
+Small results are passed through as rows, since the narrative quotes exact names and
+values. Larger ones are replaced by a profile computed column-wise with NumPy, in
+priority order until the budget is spent:
+
+    shape           row count, columns and their kinds
+    numeric         sum / mean / quartiles / min / max / std, skew, top-k share of total
+    extremes        top-k and bottom-k rows by each numeric column, labelled
+    categorical     most frequent values with counts
+    periods         per-period sums and period-over-period deltas along a date/year column"""
+import re
+from datetime import date, datetime
+import numpy as np
+from src.core.config import Config
+from src.services.prompt_builder import count_tokens
+
+TOP_K = 5
+BOTTOM_K = 3
+MAX_PERIOD_DELTAS = 6
+_PERIOD_NAME_RE = re.compile(r"(^|_)(date|month|year|quarter|period|as_of)($|_)", re.I)
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}(-\d{2})?")
+
+def _fmt(value: float) -> str:
+    magnitude = abs(value)
+    for limit, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if magnitude >= limit:
+            return f"{value / limit:.2f}{suffix}"
+    return f"{value:.2f}".rstrip("0").rstrip(".") if value != int(value) else str(int(value))
+
+def _row_values(results: list):
+    """(column names, one list of values per column)"""
+    first = results[0]
+    if hasattr(first, "_fields"):
+        names = list(first._fields)
+        columns = [[getattr(row, name) for row in results] for name in names]
+    else:
+        names = [f"col{i + 1}" for i in range(len(first))]
+        columns = [list(values) for values in zip(*results)]
+    return names, columns
+
+def _as_numbers(values: list):
+    """float64 array with NaN for nulls, or None when any non-null value isn't numeric"""
+    raw = np.array(values, dtype=object)
+    present = np.array([v is not None and v != "" for v in values], dtype=bool)
+    if not present.any() or any(isinstance(v, (date, datetime, bool)) for v in raw[present][:50]):
+        return None
+    numbers = np.full(len(values), np.nan)
+    try:
+        numbers[present] = raw[present].astype(str).astype(np.float64)
+    except ValueError:
+        return None
+    return numbers
+
+def _as_periods(name: str, values: list):
+    """ISO period strings ("2024", "2024-03", "2024-03-31"), or None when the column isn't a date/period"""
+    sample = [v for v in values[:50] if v is not None]
+    if not sample:
+        return None
+    if all(isinstance(v, (date, datetime)) for v in sample):
+        return np.array([v.isoformat()[:10] if v is not None else "" for v in values])
+    text = np.array(["" if v is None else str(v) for v in values])
+    if all(_ISO_DATE_RE.match(str(v)) for v in sample):
+        return np.array([t[:10] for t in text])
+    if _PERIOD_NAME_RE.search(name) and all(re.fullmatch(r"\d{4}", str(v)) for v in sample):
+        return text
+    return None
+
+class _Budget:
+    """Accepts lines while they fit; a line that doesn't is dropped and shorter later ones may still fit"""
+    def __init__(self, tokens: int):
+        self.remaining = tokens
+        self.lines = []
+
+    def add(self, line: str) -> bool:
+        cost = count_tokens(line)
+        if cost > self.remaining:
+            return False
+        self.lines.append(line)
+        self.remaining -= cost
+        return True
+
+def _rows_text(names: list, results: list) -> list:
+    first = results[0]
+    if hasattr(first, "_fields"):
+        return [str({name: getattr(row, name) for name in names}) for row in results]
+    return [str(row) for row in results]
+
+def summarize_results(results: list, token_budget: int = None) -> str:
+    """Rows verbatim when they fit `token_budget`, else a statistical profile that does"""
+    if not results:
+        return ""
+    token_budget = token_budget or Config.NARRATIVE_TOKEN_BUDGET
+    names, columns = _row_values(results)
+    rows_text = _rows_text(names, results)
+    if count_tokens("\n".join(rows_text)) <= token_budget:
+        return "\n".join(rows_text)
+
+    numeric, periods, labels = {}, None, []
+    for name, values in zip(names, columns):
+        if periods is None:
+            as_periods = _as_periods(name, values)
+            if as_periods is not None:
+                periods = (name, as_periods)
+                continue
+        numbers = None if re.search(r"(^|_)id$", name, re.I) else _as_numbers(values)
+        if numbers is not None:
+            numeric[name] = numbers
+        else:
+            labels.append((name, np.array(["" if v is None else str(v) for v in values])))
+    label_name, label_values = labels[0] if labels else (None, None)
+
+    budget = _Budget(token_budget)
+    kinds = [f"{n} ({'number' if n in numeric else 'period' if periods and n == periods[0] else 'text'})" for n in names]
+    budget.add(f"Profile of all {len(results)} rows (raw rows omitted); columns: {', '.join(kinds)}")
+
+    for name, numbers in numeric.items():
+        valid = numbers[~np.isnan(numbers)]
+        if not valid.size:
+            continue
+        q1, median, q3 = np.percentile(valid, [25, 50, 75])
+        std = float(valid.std())
+        skew = float(((valid - valid.mean()) ** 3).mean() / std ** 3) if std else 0.0
+        shape = "roughly symmetric" if abs(skew) < 0.5 else "right-skewed (a few large values)" if skew > 0 else "left-skewed"
+        line = (f"{name}: sum {_fmt(valid.sum())}, mean {_fmt(valid.mean())}, min {_fmt(valid.min())}, "
+                f"p25 {_fmt(q1)}, median {_fmt(median)}, p75 {_fmt(q3)}, max {_fmt(valid.max())}, std {_fmt(std)}; {shape}")
+        total = valid.sum()
+        if (valid >= 0).all() and total > 0 and valid.size > TOP_K:
+            share = np.sort(valid)[-TOP_K:].sum() / total
+            line += f"; top {TOP_K} hold {share:.0%} of the total"
+        if len(valid) < len(numbers):
+            line += f"; {len(numbers) - len(valid)} nulls"
+        budget.add(line)
+
+    for name, numbers in numeric.items():
+        order = np.argsort(np.where(np.isnan(numbers), -np.inf, numbers))[::-1]
+        order = order[~np.isnan(numbers[order])]
+        if not order.size:
+            continue
+        label = (lambda i: label_values[i]) if label_values is not None else (lambda i: f"row {i + 1}")
+        top = ", ".join(f"{label(i)}={_fmt(numbers[i])}" for i in order[:TOP_K])
+        bottom = ", ".join(f"{label(i)}={_fmt(numbers[i])}" for i in order[::-1][:BOTTOM_K])
+        by = f" ({label_name})" if label_name else ""
+        budget.add(f"Highest {name}{by}: {top}")
+        budget.add(f"Lowest {name}{by}: {bottom}")
+
+    for name, values in labels:
+        distinct, counts = np.unique(values, return_counts=True)
+        if len(distinct) == len(values):
+            budget.add(f"{name}: all {len(distinct)} values distinct")
+            continue
+        order = np.argsort(-counts, kind="stable")[:TOP_K]
+        budget.add(f"{name}: {len(distinct)} distinct; most frequent " +
+                   ", ".join(f"{distinct[i] or 'NULL'} ({counts[i]})" for i in order))
+
+    if periods is not None and numeric:
+        period_name, keys = periods
+        if len(np.unique(keys)) > 24 and all(len(k) == 10 for k in keys[:50]):
+            keys = np.array([k[:7] for k in keys])  # daily dates -> months
+        buckets, inverse = np.unique(keys, return_inverse=True)
+        for name, numbers in numeric.items():
+            sums = np.bincount(inverse, weights=np.nan_to_num(numbers), minlength=len(buckets))
+            if len(buckets) < 2:
+                break
+            deltas = []
+            for i in range(max(1, len(buckets) - MAX_PERIOD_DELTAS), len(buckets)):
+                change = sums[i] - sums[i - 1]
+                pct = f" ({change / sums[i - 1]:+.1%})" if sums[i - 1] else ""
+                deltas.append(f"{buckets[i - 1]}->{buckets[i]} {'+' if change >= 0 else ''}{_fmt(change)}{pct}")
+            overall = sums[-1] - sums[0]
+            overall_pct = f" ({overall / sums[0]:+.1%})" if sums[0] else ""
+            budget.add(f"{name} by {period_name} over {len(buckets)} periods: {buckets[0]} {_fmt(sums[0])} -> "
+                       f"{buckets[-1]} {_fmt(sums[-1])}{overall_pct}; recent changes: {'; '.join(deltas)}")
+
+    for row_text in rows_text[:TOP_K]:
+        if not budget.add(f"Sample row: {row_text}"):
+            break
+    return "\n".join(budget.lines)
@@ -0,0 +1,248 @@
+"""Pre-aggregated rollup tables over the typed shadow tables, plus a query router.
+
+Each rollup keeps one row per (as_of_date, dimensions...) with SUM() of its measures
+stored under the measure's own column name and a row_count. That makes rewriting a
+dashboard query a table swap: SUM(mpe) over the rollup equals SUM(mpe) over the base,
+and COUNT(*) becomes SUM(row_count).
+
+Refresh is incremental per as_of_date: a date is rebuilt only when its row count or
+content checksum in the source changed since the last refresh.
+Run `python -m src.services.rollups` (or POST /admin/rollups/refresh)."""
+import re
+import threading
+import time
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.services.typed_tables import typed_name
+from src.utils.console import Console
+from src.utils.sql_text import strip_literals
+
+ROLLUPS = [
+    {
+        "name": "rollup_counterparty_exposure",
+        "source": typed_name("counterparty_new"),
+        "dimensions": ["as_of_date", "entity", "counterparty_sector", "counterparty_country", "internal_rating"],
+        "measures": ["mpe", "mpe_limit", "epe", "batch_mtm"]
+    },
+    {
+        "name": "rollup_trade_notional",
+        "source": typed_name("trade_new"),
+        "dimensions": ["as_of_date", "entity", "reporting_counterparty_id", "product_type"],
+        "measures": ["notional_usd", "batch_mtm"]
+    },
+    {
+        "name": "rollup_concentration",
+        "source": typed_name("concentration_new"),
+        "dimensions": ["as_of_date", "entity", "concentration_group", "concentration_value"],
+        "measures": ["mpe", "counterparty_count"]
+    }
+]
+
+STATE_TABLE = "rollup_refresh_state"
+
+class RollupRefresher:
+    def _ensure_state_table(self, conn):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS `{STATE_TABLE}` (
+                rollup_name VARCHAR(64) NOT NULL,
+                as_of_key VARCHAR(32) NOT NULL,
+                source_rows BIGINT NOT NULL,
+                source_checksum BIGINT NOT NULL,
+                refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (rollup_name, as_of_key)
+            )
+        """))
+
+    def _ensure_rollup_table(self, conn, rollup: dict):
+        dims = ", ".join(f"`{d}`" for d in rollup["dimensions"])
+        measures = ", ".join(f"SUM(`{m}`) AS `{m}`" for m in rollup["measures"])
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS `{rollup['name']}` AS
+            SELECT {dims}, {measures}, COUNT(*) AS row_count
+            FROM `{rollup['source']}` WHERE 1 = 0 GROUP BY {dims}
+        """))
+        index_name = f"idx_{rollup['name']}_dims"
+        has_index = conn.execute(text("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index
+        """), {"table": rollup["name"], "index": index_name}).scalar()
+        if not has_index:
+            conn.execute(text(f"ALTER TABLE `{rollup['name']}` ADD KEY `{index_name}` ({dims})"))
+
+    def _source_fingerprints(self, conn, rollup: dict) -> dict:
+        """COUNT(*) and an order-independent CRC per as_of_date in the source"""
+        columns = ", ".join(f"`{c}`" for c in rollup["dimensions"] + rollup["measures"])
+        rows = conn.execute(text(f"""
+            SELECT COALESCE(CAST(as_of_date AS CHAR), 'NULL') AS as_of_key,
+                   COUNT(*) AS source_rows,
+                   COALESCE(SUM(CRC32(CONCAT_WS('|', {columns}))), 0) AS source_checksum
+            FROM `{rollup['source']}`
+            GROUP BY as_of_key
+        """)).fetchall()
+        return {key: (int(count), int(checksum)) for key, count, checksum in rows}
+
+    def refresh(self, rollup: dict) -> dict:
+        started = time.perf_counter()
+        dims = ", ".join(f"`{d}`" for d in rollup["dimensions"])
+        measures = ", ".join(f"SUM(`{m}`)" for m in rollup["measures"])
+        date_match = "COALESCE(CAST(as_of_date AS CHAR), 'NULL') = :as_of_key"
+
+        with engine_registry.connect() as conn:
+            self._ensure_state_table(conn)
+            self._ensure_rollup_table(conn, rollup)
+            current = self._source_fingerprints(conn, rollup)
+            recorded = {
+                key: (int(count), int(checksum)) for key, count, checksum in conn.execute(text(f"""
+                    SELECT as_of_key, source_rows, source_checksum FROM `{STATE_TABLE}` WHERE rollup_name = :name
+                """), {"name": rollup["name"]})
+            }
+
+            changed = [key for key, fingerprint in current.items() if recorded.get(key) != fingerprint]
+            removed = [key for key in recorded if key not in current]
+
+            for key in changed + removed:
+                conn.execute(text(f"DELETE FROM `{rollup['name']}` WHERE {date_match}"), {"as_of_key": key})
+            for key in changed:
+                conn.execute(text(f"""
+                    INSERT INTO `{rollup['name']}` ({dims}, {", ".join(f"`{m}`" for m in rollup["measures"])}, row_count)
+                    SELECT {dims}, {measures}, COUNT(*)
+                    FROM `{rollup['source']}`
+                    WHERE {date_match}
+                    GROUP BY {dims}
+                """), {"as_of_key": key})
+                rows, checksum = current[key]
+                conn.execute(text(f"""
+                    REPLACE INTO `{STATE_TABLE}` (rollup_name, as_of_key, source_rows, source_checksum)
+                    VALUES (:name, :as_of_key, :rows, :checksum)
+                """), {"name": rollup["name"], "as_of_key": key, "rows": rows, "checksum": checksum})
+            for key in removed:
+                conn.execute(text(f"DELETE FROM `{STATE_TABLE}` WHERE rollup_name = :name AND as_of_key = :as_of_key"),
+                             {"name": rollup["name"], "as_of_key": key})
+            conn.commit()
+
+        return {
+            "rollup": rollup["name"],
+            "dates_refreshed": len(changed),
+            "dates_removed": len(removed),
+            "dates_unchanged": len(current) - len(changed),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def refresh_all(self) -> list:
+        results = []
+        for rollup in ROLLUPS:
+            Console.processing(f"Refreshing {rollup['name']}")
+            result = self.refresh(rollup)
+            Console.success(f"{result['rollup']}: {result['dates_refreshed']} dates rebuilt, "
+                            f"{result['dates_unchanged']} unchanged in {result['seconds']}s")
+            results.append(result)
+        rollup_router.reset()
+        return results
+
+_SQL_WORDS = {
+    "select", "from", "where", "group", "by", "order", "asc", "desc", "limit", "offset", "and", "or", "not",
+    "in", "is", "null", "as", "between", "like", "having", "case", "when", "then", "else", "end", "interval",
+    "day", "month", "year", "quarter", "week", "date_format", "date", "coalesce", "ifnull", "round",
+    "upper", "lower", "concat", "date_sub", "date_add", "curdate", "now", "cast", "decimal", "signed",
+    "unsigned", "char", "true", "false"
+}
+_QUERY_RE = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+`?(?P<table>\w+)`?(?:\s+(?:as\s+)?(?!where\b|group\b)(?P<alias>\w+))?"
+    r"(?P<rest>\s+(?:where|group\s+by)\b.*)$",
+    re.I | re.S
+)
+_AGGREGATE_RE = re.compile(r"\b(sum|count|avg|min|max|group_concat|std\w*|var\w*|bit_\w+)\s*\(\s*([^()]*?)\s*\)", re.I)
+
+class RollupRouter:
+    """Rewrites single-table GROUP BY queries onto a matching rollup when it is exact to do so"""
+
+    def __init__(self, ttl: int = 60):
+        self.ttl = ttl
+        self._available = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.routed = 0
+
+    def reset(self):
+        with self._lock:
+            self._available = None
+
+    def available(self) -> set:
+        with self._lock:
+            if self._available is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._available
+        with engine_registry.connect() as conn:
+            names = {name for (name,) in conn.execute(text(f"""
+                SELECT DISTINCT rollup_name FROM `{STATE_TABLE}`
+            """))} if conn.execute(text("""
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = :table
+            """), {"table": STATE_TABLE}).scalar() else set()
+        with self._lock:
+            self._available = names
+            self._checked_at = time.monotonic()
+        return names
+
+    def match(self, sql: str):
+        """Return (rollup, rewritten_sql) or None. Row filters on measures (`mpe <> 0`) never
+        route: they decide which groups exist, which a rollup of sums can't reproduce."""
+        cleaned = strip_literals(sql)
+        if re.search(r"\bjoin\b|\(\s*select\b|\bunion\b|\bdistinct\b|\bover\s*\(", cleaned, re.I):
+            return None
+        if not re.search(r"\bgroup\s+by\b", cleaned, re.I):
+            return None
+        parsed = _QUERY_RE.match(cleaned)
+        if not parsed or "," in cleaned[parsed.start("table"):parsed.start("rest")]:
+            return None
+
+        table = parsed.group("table").lower()
+        rollup = next((r for r in ROLLUPS if r["source"] == table), None)
+        if rollup is None:
+            return None
+
+        alias = (parsed.group("alias") or "").lower()
+        dims = {d.lower() for d in rollup["dimensions"]}
+        measures = {m.lower() for m in rollup["measures"]}
+        qualifiers = {table, alias} - {""}
+
+        def unqualify(expr):
+            return re.sub(r"`?\b(\w+)`?\s*\.\s*`?(\w+)`?", lambda m: m.group(2) if m.group(1).lower() in qualifiers else m.group(0), expr)
+
+        for function, argument in _AGGREGATE_RE.findall(cleaned):
+            function, argument = function.lower(), unqualify(argument).strip("` ").lower()
+            if function == "sum" and argument in measures:
+                continue
+            if function == "count" and argument in ("*", "1"):
+                continue
+            return None
+
+        remainder = _AGGREGATE_RE.sub(" ", cleaned)
+        remainder = unqualify(remainder)
+        output_aliases = {a.lower() for a in re.findall(r"\bas\s+`?(\w+)`?", remainder, re.I)}
+        allowed = _SQL_WORDS | dims | output_aliases | qualifiers
+        for word in re.findall(r"`?\b([a-z_]\w*)\b`?", remainder, re.I):
+            if word.lower() not in allowed:
+                return None
+
+        from_table = re.compile(rf"(\bfrom\s+`?){re.escape(table)}(`?)", re.I)
+        if len(from_table.findall(sql)) != 1:
+            return None
+        rewritten = from_table.sub(lambda m: m.group(1) + rollup["name"] + m.group(2), sql)
+        rewritten = re.sub(r"\bcount\s*\(\s*(\*|1)\s*\)", "SUM(row_count)", rewritten, flags=re.I)
+        return rollup, rewritten
+
+    def rewrite(self, sql: str):
+        """The rollup-backed SQL when a refreshed rollup answers `sql` exactly, else None"""
+        if not Config.ROLLUP_ROUTING_ENABLED:
+            return None
+        matched = self.match(sql)
+        if not matched or matched[0]["name"] not in self.available():
+            return None
+        self.routed += 1
+        return matched[1]
+
+rollup_router = RollupRouter()
+
+if __name__ == "__main__":
+    RollupRefresher().refresh_all()
@@ -1,75 +1,159 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.services.schema_store import SchemaStore, render_schema, write_store
+from src.services.typed_tables import BASE_TABLES, TYPED_SUFFIX, typed_name
+from src.services.rollups import ROLLUPS, STATE_TABLE
 from src.utils.console import Console
 
+ROLLUP_TABLES = {rollup["name"] for rollup in ROLLUPS}
+
 class SchemaCache:
     def __init__(self, cache_file="schema_cache.json"):
         self.cache_file = cache_file
+        self.store_file = os.path.splitext(cache_file)[0] + ".bin"
         self.config = Config()
-        self.engine = create_engine(self.config.mysql_connection_string)
+        self.engine = engine_registry.get_engine()
     
     def fetch_schema(self, database: str = None) -> str:
-        if database is None:
-            database = self.config.MYSQL_DATABASE
-            
-        schema_description = ""
-        with self.engine.connect() as conn:
-            tables_query = """
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = :db
-                ORDER BY table_name
-            """
-            tables = conn.execute(text(tables_query), {"db": database}).fetchall()
-
-            for (table_name,) in tables:
-                if self.config.ALLOWED_TABLES and table_name not in self.config.ALLOWED_TABLES:
-                    continue
-                    
-                schema_description += f"\nTable: {table_name}\nColumns: "
-                
-                columns_query = """
-                    SELECT column_name, data_type, is_nullable, column_default, column_key
-                    FROM information_schema.columns 
-                    WHERE table_schema = :db AND table_name = :table
-                    ORDER BY ordinal_position
-                """
-                columns = conn.execute(
-                    text(columns_query), 
-                    {"db": database, "table": table_name}
-                ).fetchall()
-
-                col_defs = []
-                for col_name, data_type, is_nullable, default, key in columns:
-                    col_def = f"{col_name} ({data_type}"
-                    if key == "PRI":
-                        col_def += ", PRIMARY KEY"
-                    if is_nullable == "NO":
-                        col_def += ", NOT NULL"
-                    if default:
-                        col_def += f", DEFAULT {default}"
-                    col_def += ")"
-                    col_defs.append(col_def)
-                
-                schema_description += ", ".join(col_defs) + "\n"
-
-        return schema_description.strip()
+        """Prompt-ready schema text for `database`, or for every ALLOWED_SCHEMAS entry when not given"""
+        return self.format_schema(self.fetch_schema_tables(database))
+    
+    def fetch_schema_tables(self, database: str = None) -> list:
+        if database is None and len(self.config.ALLOWED_SCHEMAS) > 1:
+            return self.fetch_tables_concurrently(self.config.ALLOWED_SCHEMAS)
+        return self.fetch_tables(database or self._schemas()[0])
+    
+    def _schemas(self) -> list:
+        return self.config.ALLOWED_SCHEMAS or [self.config.MYSQL_DATABASE]
+    
+    def fingerprint(self) -> str:
+        """Cheap change detector: column count plus an order-independent CRC over every column definition"""
+        placeholders = ", ".join(f":s{i}" for i in range(len(self._schemas())))
+        query = f"""
+            SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', table_schema, table_name, column_name,
+                   ordinal_position, column_type, is_nullable, IFNULL(column_default, ''), column_key))), 0)
+            FROM information_schema.columns
+            WHERE table_schema IN ({placeholders})
+        """
+        with engine_registry.connect() as conn:
+            count, checksum = conn.execute(text(query), {f"s{i}": s for i, s in enumerate(self._schemas())}).fetchone()
+        return f"{count}:{checksum}"
+    
+    def fetch_tables(self, database: str) -> list:
+        """All visible tables of one schema with columns, indexes and size estimates, from one bulk
+        information_schema query per kind (columns, indexes, tables) rather than one per table"""
+        columns_query = """
+            SELECT table_name, column_name, data_type, is_nullable, column_default, column_key, extra, column_comment
+            FROM information_schema.columns
+            WHERE table_schema = :db
+            ORDER BY table_name, ordinal_position
+        """
+        indexes_query = """
+            SELECT table_name, index_name, non_unique, seq_in_index, column_name, cardinality
+            FROM information_schema.statistics
+            WHERE table_schema = :db
+            ORDER BY table_name, index_name, seq_in_index
+        """
+        tables_query = """
+            SELECT table_name, table_rows, table_comment
+            FROM information_schema.tables
+            WHERE table_schema = :db
+        """
+        with engine_registry.connect() as conn:
+            rows = conn.execute(text(columns_query), {"db": database}).fetchall()
+            index_rows = conn.execute(text(indexes_query), {"db": database}).fetchall()
+            table_rows = {name: (count, comment) for name, count, comment in conn.execute(text(tables_query), {"db": database})}
+        
+        by_table = {}
+        for table_name, col_name, data_type, is_nullable, default, key, extra, comment in rows:
+            by_table.setdefault(table_name, []).append({
+                "name": col_name,
+                "type": data_type,
+                "nullable": is_nullable != "NO",
+                "default": default,
+                "primary_key": key == "PRI",
+                "unique": key == "UNI",
+                "indexed": bool(key),
+                "auto_increment": "auto_increment" in (extra or "").lower(),
+                "comment": comment or None,
+                "cardinality": None
+            })
+        
+        # Index definitions; a leading index column's cardinality is its distinct-value estimate
+        indexes, leading_cardinality = {}, {}
+        for table_name, index_name, non_unique, seq, col_name, cardinality in index_rows:
+            table_indexes = indexes.setdefault(table_name, {})
+            table_indexes.setdefault(index_name, {"name": index_name, "unique": not non_unique, "columns": []})["columns"].append(col_name)
+            if seq == 1 and cardinality is not None:
+                key = (table_name, col_name)
+                leading_cardinality[key] = max(leading_cardinality.get(key, 0), int(cardinality))
+        for table_name, columns in by_table.items():
+            for column in columns:
+                column["cardinality"] = leading_cardinality.get((table_name, column["name"]))
+        
+        table_names = set(by_table)
+        tables = []
+        for table_name, columns in by_table.items():
+            if self.config.ALLOWED_TABLES and table_name not in self.config.ALLOWED_TABLES:
+                continue
+            if self._is_hidden_table(table_name, table_names):
+                continue
+            row_count, table_comment = table_rows.get(table_name, (None, None))
+            tables.append({
+                "schema": database,
+                "name": table_name,
+                "comment": table_comment or None,
+                "row_estimate": row_count,
+                "columns": columns,
+                "indexes": list(indexes.get(table_name, {}).values())
+            })
+        return tables
+    
+    def fetch_tables_concurrently(self, databases: list) -> list:
+        """fetch_tables for several schemas at once, each on its own pooled connection"""
+        with ThreadPoolExecutor(max_workers=min(len(databases), self.config.DB_POOL_SIZE) or 1) as pool:
+            results = list(pool.map(self.fetch_tables, databases))
+        return [table for tables in results for table in tables]
+    
+    def format_schema(self, tables: list) -> str:
+        """Render tables as the "Table: ... Columns: ..." text the prompts expect; tables outside
+        MYSQL_DATABASE are schema-qualified so generated SQL can reach them"""
+        return render_schema(tables, self.config.MYSQL_DATABASE)
     
-    def save_schema_to_cache(self, database: str = None):
-        if database is None:
-            database = self.config.MYSQL_DATABASE
+    def _is_hidden_table(self, table_name: str, table_names: set) -> bool:
+        """Skip refresh leftovers and rollups (queries are routed to those automatically),
+        and base tables shadowed by a typed copy when enabled"""
+        if table_name.endswith((f"{TYPED_SUFFIX}_staging", f"{TYPED_SUFFIX}_old")):
+            return True
+        if table_name == STATE_TABLE or table_name in ROLLUP_TABLES:
+            return True
+        if self.config.USE_TYPED_TABLES:
+            return table_name in BASE_TABLES and typed_name(table_name) in table_names
+        return table_name.endswith(TYPED_SUFFIX)
+    
+    def save_schema_to_cache(self, database: str = None, fingerprint: str = None):
+        label = database or ", ".join(self._schemas())
             
-        Console.processing(f"Generating schema for database: {database}")
-        schema = self.fetch_schema(database)
+        Console.processing(f"Generating schema for database: {label}")
+        # Taken before the fetch: a change racing the fetch then shows up on the next poll
+        if fingerprint is None and database is None:
+            fingerprint = self.fingerprint()
+        tables = self.fetch_schema_tables(database)
+        write_store(self.store_file, tables, fingerprint)
+        schema = self.format_schema(tables)
+        database = label
         
         cache_data = {
             "database": database,
             "schema": schema,
             "generated_at": datetime.now().isoformat(),
-            "table_count": schema.count("Table:")
+            "table_count": schema.count("Table:"),
+            "fingerprint": fingerprint
         }
         
         with open(self.cache_file, 'w') as f:
@@ -82,6 +166,16 @@ class SchemaCache:
         
         return schema
     
+    def open_store(self):
+        """mmap view of the structured cache written alongside the JSON one, or None before the first save"""
+        if not os.path.exists(self.store_file):
+            return None
+        try:
+            return SchemaStore(self.store_file)
+        except ValueError as e:
+            Console.warning(str(e))
+            return None
+    
     def load_schema_from_cache(self) -> str:
         if not os.path.exists(self.cache_file):
             raise FileNotFoundError(f"Schema cache file {self.cache_file} not found. Run generate_schema() first.")
@@ -107,8 +201,18 @@ class SchemaCache:
             "database": cache_data['database'],
             "table_count": cache_data['table_count'],
             "generated_at": cache_data['generated_at'],
-            "file_size": os.path.getsize(self.cache_file)
+            "fingerprint": cache_data.get('fingerprint'),
+            "file_size": os.path.getsize(self.cache_file),
+            "store_size": os.path.getsize(self.store_file) if os.path.exists(self.store_file) else None
         }
     
+    def cached_fingerprint(self):
+        if not os.path.exists(self.cache_file):
+            return None
+        with open(self.cache_file, 'r') as f:
+            return json.load(f).get('fingerprint')
+    
     def is_cache_valid(self) -> bool:
-        return os.path.exists(self.cache_file)
\ No newline at end of file
+        """The cache file exists and was built from the schema as it is now"""
+        fingerprint = self.cached_fingerprint()
+        return fingerprint is not None and fingerprint == self.fingerprint()
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""Question-relevant pruning of the cached schema text.
+
+The index is built once per schema version: each table and column gets a bag of
+identifier tokens ("counterparty_sector" -> counterparty, sector) plus domain
+synonyms, weighted by IDF over all columns. A question then keeps the pinned tables
+plus the top-k other tables by score and, within them, the best-matching columns plus keys, dates and anything
+the prompt's own rules name. Nothing matching at all falls back to the full schema."""
+import math
+import re
+import threading
+from src.core.config import Config
+from src.utils.console import Console
+
+# Business vocabulary -> identifier tokens it usually means
+SYNONYMS = {
+    "exposure": ["mpe", "epe", "ce", "exposure"],
+    "exposures": ["mpe", "epe", "ce", "exposure"],
+    "risk": ["mpe", "epe", "rating"],
+    "limit": ["limit", "mpe_limit"],
+    "breach": ["limit", "mpe", "utilization"],
+    "industry": ["sector"],
+    "rating": ["rating", "internal_rating"],
+    "rated": ["rating"],
+    "nation": ["country"],
+    "geography": ["country", "region"],
+    "client": ["counterparty"],
+    "clients": ["counterparty"],
+    "cp": ["counterparty"],
+    "deal": ["trade"],
+    "deals": ["trade"],
+    "size": ["notional"],
+    "volume": ["notional", "count"],
+    "value": ["notional", "mtm", "value"],
+    "mark": ["mtm"],
+    "when": ["date"],
+    "month": ["date"],
+    "monthly": ["date"],
+    "trend": ["date"],
+    "year": ["date"],
+    "daily": ["date"],
+    "maturity": ["maturity", "tenor"],
+    "product": ["product", "asset"]
+}
+
+_STOP_WORDS = {
+    "the", "a", "an", "of", "for", "by", "in", "on", "to", "and", "or", "with", "what", "which", "who",
+    "show", "me", "list", "give", "get", "all", "is", "are", "was", "were", "top", "how", "many", "much",
+    "per", "each", "from", "at", "as", "be", "do", "does", "their", "there", "this", "that", "than", "new"
+}
+
+def tokens(text: str) -> list:
+    """Lowercase word stems from identifiers or prose: snake_case and camelCase are split"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    stems = []
+    for word in words:
+        if word in _STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        stems.append(word)
+    return stems
+
+def _split_top_level(text: str) -> list:
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        depth += (char == "(") - (char == ")")
+        current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+def parse_schema(schema: str) -> list:
+    """[{"name", "columns": [(column_name, definition)]}] from the "Table: ...\\nColumns: ..." text"""
+    tables = []
+    for match in re.finditer(r"Table: (\S+)\nColumns: (.*)", schema):
+        columns = [(definition.split(" ", 1)[0], definition) for definition in _split_top_level(match.group(2))]
+        tables.append({"name": match.group(1), "columns": columns})
+    return tables
+
+def _is_key_column(name: str, definition: str) -> bool:
+    return "PRIMARY KEY" in definition or name == "id" or name.endswith("_id") or name == "entity"
+
+def _is_date_column(name: str, definition: str) -> bool:
+    return name.endswith("date") or bool(re.search(r"\((date|datetime|timestamp)\b", definition))
+
+class SchemaIndex:
+    def __init__(self, schema: str):
+        self.schema = schema
+        self.tables = parse_schema(schema)
+        documents = []
+        for position, table in enumerate(self.tables):
+            table["position"] = position
+            table["tokens"] = set(tokens(table["name"]))
+            table["column_tokens"] = {name: set(tokens(name)) for name, _ in table["columns"]}
+            documents.extend(table["column_tokens"].values())
+        total = max(len(documents), 1)
+        frequency = {}
+        for document in documents:
+            for token in document:
+                frequency[token] = frequency.get(token, 0) + 1
+        self.idf = {token: math.log(1 + total / count) for token, count in frequency.items()}
+        self.default_idf = math.log(1 + total)
+
+    def _question_terms(self, question: str) -> dict:
+        """Question stems (weight 1) plus synonym expansions (weight 0.6)"""
+        terms = {}
+        for word in re.findall(r"[a-z0-9]+", question.lower()):
+            for synonym in SYNONYMS.get(word, []):
+                for token in tokens(synonym):
+                    terms[token] = max(terms.get(token, 0), 0.6)
+        for token in tokens(question):
+            terms[token] = 1.0
+        return terms
+
+    def _score(self, document: set, terms: dict) -> float:
+        return sum(weight * self.idf.get(token, self.default_idf) for token, weight in terms.items() if token in document)
+
+    def render(self, names=None, excluded=()) -> str:
+        """Unpruned text of the `names` tables (default all) minus `excluded`, in schema order"""
+        return "\n\n".join(
+            "Table: {}\nColumns: {}".format(table["name"], ", ".join(d for _, d in table["columns"]))
+            for table in self.tables
+            if (names is None or table["name"] in names) and table["name"] not in excluded
+        )
+
+    def prune(self, question: str, pinned_tables=(), pinned_columns=(), top_tables: int = None,
+              top_columns: int = None, excluded_tables=()):
+        """(schema_text, report) keeping only what the question plausibly needs; `excluded_tables`
+        are left out entirely (callers that already show them elsewhere in the prompt)"""
+        top_tables = top_tables or Config.SCHEMA_PRUNE_TOP_TABLES
+        top_columns = top_columns or Config.SCHEMA_PRUNE_TOP_COLUMNS
+        terms = self._question_terms(question)
+        pinned_tables = set(pinned_tables)
+        pinned_columns = set(pinned_columns)
+        excluded_tables = set(excluded_tables)
+
+        scored = []
+        for table in self.tables:
+            if table["name"] in excluded_tables:
+                continue
+            column_scores = {name: self._score(column_tokens, terms) for name, column_tokens in table["column_tokens"].items()}
+            best = sorted(column_scores.values(), reverse=True)[:3]
+            table_score = 2 * self._score(table["tokens"], terms) + sum(best)
+            scored.append((table_score, table, column_scores))
+
+        chosen = [item for item in scored if item[1]["name"] in pinned_tables]
+        ranked = sorted((item for item in scored if item[1]["name"] not in pinned_tables and item[0] > 0),
+                        key=lambda item: item[0], reverse=True)
+        chosen += ranked[:top_tables]  # pinned tables ride along outside the top-k budget
+        if not chosen or not any(score > 0 for score, _, _ in chosen):
+            full = self.render(excluded=excluded_tables) if excluded_tables else self.schema
+            return full, self._report(full, [item[1]["name"] for item in scored], pruned=False)
+        chosen.sort(key=lambda item: item[1]["position"])
+        chosen_names = {item[1]["name"] for item in chosen}
+
+        # Columns shared by two chosen tables are likely join keys
+        seen, shared = set(), set()
+        for _, table, _ in chosen:
+            for name, _ in table["columns"]:
+                (shared if name in seen else seen).add(name)
+
+        parts = []
+        for _, table, column_scores in chosen:
+            relevant = {name for name, score in sorted(column_scores.items(), key=lambda kv: kv[1], reverse=True)[:top_columns] if score > 0}
+            kept = [
+                definition for name, definition in table["columns"]
+                if len(table["columns"]) <= top_columns or name in relevant or name in pinned_columns
+                or name in shared or _is_key_column(name, definition) or _is_date_column(name, definition)
+            ]
+            parts.append(f"Table: {table['name']}\nColumns: " + ", ".join(kept))
+        pruned = "\n\n".join(parts)
+        return pruned, self._report(pruned, sorted(chosen_names), pruned=True)
+
+    def _report(self, text: str, tables: list, pruned: bool) -> dict:
+        full, kept = len(self.schema), len(text)
+        return {
+            "pruned": pruned,
+            "tables": tables,
+            "full_chars": full,
+            "pruned_chars": kept,
+            "full_tokens_est": full // 4,
+            "pruned_tokens_est": kept // 4,
+            "reduction_pct": round(100 * (1 - kept / full), 1) if full else 0.0
+        }
+
+class SchemaIndexCache:
+    """Keeps the index for the latest schema text; rebuilt only when the text changes"""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.chars_saved = 0
+
+    def get(self, schema: str) -> SchemaIndex:
+        index = self._index
+        if index is None or index.schema != schema:
+            with self._lock:
+                if self._index is None or self._index.schema != schema:
+                    self._index = SchemaIndex(schema)
+                index = self._index
+        return index
+
+    def tables(self, schema: str, names) -> str:
+        """Unpruned text of just the `names` tables"""
+        return self.get(schema).render(names=set(names)) if schema else ""
+
+    def prune(self, question: str, schema: str, **kwargs):
+        if not Config.SCHEMA_PRUNING_ENABLED or not schema:
+            excluded = set(kwargs.get("excluded_tables", ()))
+            return (self.get(schema).render(excluded=excluded) if schema and excluded else schema), None
+        pruned, report = self.get(schema).prune(question, **kwargs)
+        self.requests += 1
+        self.chars_saved += report["full_chars"] - report["pruned_chars"]
+        Console.info(f"Schema pruned to {len(report['tables'])} tables: {report['full_tokens_est']} -> "
+                     f"{report['pruned_tokens_est']} tokens est. ({report['reduction_pct']}% smaller)")
+        return pruned, report
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "enabled": Config.SCHEMA_PRUNING_ENABLED,
+            "indexed_tables": len(index.tables) if index else 0,
+            "indexed_columns": sum(len(t["columns"]) for t in index.tables) if index else 0,
+            "requests": self.requests,
+            "chars_saved": self.chars_saved,
+            "avg_chars_saved": round(self.chars_saved / self.requests) if self.requests else 0
+        }
+
+schema_index = SchemaIndexCache()
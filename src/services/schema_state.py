@@ -0,0 +1,128 @@
+"""Versioned, atomically swapped schema text with fingerprint-driven background refresh.
+
+Readers take `schema_watcher.current` once per request and use that snapshot
+throughout, so a rebuild never hands them half-old, half-new state. A rebuild
+happens off the request path when the information_schema fingerprint changes;
+listeners registered with `on_change` then drop whatever was keyed on the old schema.
+Each state also carries the structured SchemaStore the text was rendered from; a replaced
+store is closed STORE_CLOSE_GRACE_SECONDS after the swap, once readers that took the old
+state just before it are done with their lookups."""
+import asyncio
+import os
+import threading
+from datetime import datetime
+from src.core.config import Config
+from src.services.schema_cache import SchemaCache
+from src.utils.console import Console
+
+STORE_CLOSE_GRACE_SECONDS = 5
+
+class SchemaState:
+    __slots__ = ("text", "fingerprint", "version", "loaded_at", "store")
+
+    def __init__(self, text: str, fingerprint: str, version: int, store=None):
+        self.text = text
+        self.store = store
+        self.fingerprint = fingerprint
+        self.version = version
+        self.loaded_at = datetime.now().isoformat()
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "table_count": self.text.count("Table:") if self.text else 0
+        }
+
+class SchemaWatcher:
+    def __init__(self, schema_cache: SchemaCache = None):
+        self.schema_cache = schema_cache or SchemaCache()
+        self._state = SchemaState("", None, 0)
+        self._rebuild_lock = threading.Lock()
+        self._listeners = []
+        self._task = None
+
+    @property
+    def current(self) -> SchemaState:
+        return self._state
+
+    @property
+    def schema(self) -> str:
+        return self._state.text
+
+    def on_change(self, listener):
+        """Call `listener(old_state, new_state)` after every swap"""
+        self._listeners.append(listener)
+        return listener
+
+    def load(self) -> SchemaState:
+        """Startup: use the cached schema when its fingerprint still matches, else rebuild"""
+        try:
+            fingerprint = self.schema_cache.fingerprint()
+        except Exception as e:
+            Console.warning(f"Schema fingerprint unavailable: {e}")
+            fingerprint = None
+        store = self.schema_cache.open_store()
+        if store is not None and store.fingerprint and (fingerprint is None or store.fingerprint == fingerprint):
+            return self._swap(store.prompt(Config.MYSQL_DATABASE), store.fingerprint, store)
+        if store is not None:
+            store.close()
+        cached = self.schema_cache.cached_fingerprint()
+        if os.path.exists(self.schema_cache.cache_file) and (fingerprint is None or cached == fingerprint):
+            return self._swap(self.schema_cache.load_schema_from_cache(), cached)
+        return self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> SchemaState:
+        """Rebuild when the fingerprint moved (always when `force`); returns the current state"""
+        with self._rebuild_lock:
+            fingerprint = self.schema_cache.fingerprint()
+            if not force and fingerprint == self._state.fingerprint:
+                return self._state
+            text = self.schema_cache.save_schema_to_cache(fingerprint=fingerprint)
+            return self._swap(text, fingerprint, self.schema_cache.open_store())
+
+    def _swap(self, text: str, fingerprint: str, store=None) -> SchemaState:
+        old = self._state
+        new = SchemaState(text, fingerprint, old.version + 1, store)
+        self._state = new  # single reference assignment: readers see old or new, never a mix
+        if old.store is not None and old.store is not store:
+            self._retire(old.store)
+        if old.version:
+            Console.info(f"Schema updated to version {new.version}")
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                Console.warning(f"Schema change listener failed: {e}")
+        return new
+
+    def _retire(self, store):
+        """Close a replaced store (its mmap and file descriptor) after the grace period"""
+        timer = threading.Timer(STORE_CLOSE_GRACE_SECONDS, store.close)
+        timer.daemon = True
+        timer.start()
+
+    async def _poll(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                Console.warning(f"Schema poll failed: {e}")
+
+    def start(self, interval: int = None):
+        interval = interval or Config.SCHEMA_POLL_INTERVAL
+        if interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+schema_watcher = SchemaWatcher()
@@ -0,0 +1,237 @@
+"""Compact binary schema cache, read lazily through mmap.
+
+Layout (little-endian), every section a flat array of fixed-size records:
+
+    header   magic "SCHS", version, counts, section offsets, fingerprint string id
+    tables   schema, name, comment, first column, column count, first index, index count, row estimate
+    columns  name, type, comment, default, distinct estimate, flags
+    indexes  name, first index column, column count, unique
+    idxcols  column-name string ids, in index order
+    strings  offsets array plus one UTF-8 blob; records refer to strings by id
+
+Opening a store only reads the header; a table's records and strings are decoded the
+first time that table is asked for, so looking up one column never parses the rest."""
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"SCHS"
+VERSION = 1
+NO_STRING = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<4sH6I6I")
+_TABLE = struct.Struct("<7Iq")
+_COLUMN = struct.Struct("<4IqB")
+_INDEX = struct.Struct("<3IB")
+_U32 = struct.Struct("<I")
+
+NULLABLE, PRIMARY_KEY, UNIQUE, INDEXED, AUTO_INCREMENT = 1, 2, 4, 8, 16
+
+def render_schema(tables: list, default_schema: str) -> str:
+    """The "Table: ... Columns: ..." prompt text; tables outside `default_schema` are schema-qualified"""
+    schema_description = ""
+    for table in tables:
+        name = table["name"] if table["schema"] == default_schema else f"{table['schema']}.{table['name']}"
+        schema_description += f"\nTable: {name}\nColumns: "
+
+        col_defs = []
+        for column in table["columns"]:
+            col_def = f"{column['name']} ({column['type']}"
+            if column["primary_key"]:
+                col_def += ", PRIMARY KEY"
+            if not column["nullable"]:
+                col_def += ", NOT NULL"
+            if column["default"]:
+                col_def += f", DEFAULT {column['default']}"
+            col_def += ")"
+            col_defs.append(col_def)
+
+        schema_description += ", ".join(col_defs) + "\n"
+
+    return schema_description.strip()
+
+def _column_flags(column: dict) -> int:
+    return ((NULLABLE if column["nullable"] else 0) | (PRIMARY_KEY if column["primary_key"] else 0)
+            | (UNIQUE if column.get("unique") else 0) | (INDEXED if column.get("indexed") else 0)
+            | (AUTO_INCREMENT if column.get("auto_increment") else 0))
+
+def write_store(path: str, tables: list, fingerprint: str = None):
+    """Serialize SchemaCache.fetch_tables output to `path`, replacing any previous file atomically"""
+    strings, string_ids = [], {}
+
+    def string_id(value) -> int:
+        if value is None:
+            return NO_STRING
+        value = str(value)
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return string_ids[value]
+
+    table_records, column_records, index_records, index_columns = [], [], [], []
+    for table in tables:
+        first_column, first_index = len(column_records), len(index_records)
+        for column in table["columns"]:
+            column_records.append(_COLUMN.pack(
+                string_id(column["name"]), string_id(column["type"]), string_id(column.get("comment") or None),
+                string_id(column["default"]), -1 if column.get("cardinality") is None else int(column["cardinality"]),
+                _column_flags(column)
+            ))
+        for index in table.get("indexes", []):
+            index_records.append(_INDEX.pack(string_id(index["name"]), len(index_columns), len(index["columns"]),
+                                             1 if index["unique"] else 0))
+            index_columns.extend(_U32.pack(string_id(name)) for name in index["columns"])
+        row_estimate = table.get("row_estimate")
+        table_records.append(_TABLE.pack(
+            string_id(table["schema"]), string_id(table["name"]), string_id(table.get("comment") or None),
+            first_column, len(column_records) - first_column, first_index, len(index_records) - first_index,
+            -1 if row_estimate is None else int(row_estimate)
+        ))
+    fingerprint_id = string_id(fingerprint)
+
+    string_offsets, position = [], 0
+    for encoded in strings:
+        string_offsets.append(_U32.pack(position))
+        position += len(encoded)
+    string_offsets.append(_U32.pack(position))
+
+    sections = [b"".join(table_records), b"".join(column_records), b"".join(index_records),
+                b"".join(index_columns), b"".join(string_offsets), b"".join(strings)]
+    offsets, position = [], _HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = _HEADER.pack(MAGIC, VERSION, len(table_records), len(column_records), len(index_records),
+                          len(index_columns), len(strings), fingerprint_id, *offsets)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as out:
+            out.write(header)
+            for section in sections:
+                out.write(section)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+class SchemaStore:
+    """Read-only view over a file written by `write_store`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._table_count, self._column_count, self._index_count, self._index_column_count,
+         self._string_count, fingerprint_id, *self._offsets) = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a version {VERSION} schema store")
+        self._strings = {}
+        self._tables = {}
+        self._names = None
+        self.fingerprint = self._string(fingerprint_id)
+
+    def _string(self, string_id: int):
+        if string_id == NO_STRING:
+            return None
+        value = self._strings.get(string_id)
+        if value is None:
+            offsets = self._offsets[4]
+            start, end = struct.unpack_from("<2I", self._buffer, offsets + string_id * _U32.size)
+            base = self._offsets[5]
+            value = self._strings[string_id] = self._buffer[base + start:base + end].decode("utf-8")
+        return value
+
+    def _table_record(self, position: int):
+        return _TABLE.unpack_from(self._buffer, self._offsets[0] + position * _TABLE.size)
+
+    def _positions(self) -> dict:
+        """Table name (bare and schema-qualified) -> record position"""
+        if self._names is None:
+            names = {}
+            for position in range(self._table_count):
+                schema_id, name_id = self._table_record(position)[:2]
+                name = self._string(name_id)
+                names.setdefault(name, position)
+                names[f"{self._string(schema_id)}.{name}"] = position
+            self._names = names
+        return self._names
+
+    def _decode_table(self, position: int) -> dict:
+        table = self._tables.get(position)
+        if table is not None:
+            return table
+        schema_id, name_id, comment_id, first_column, column_count, first_index, index_count, rows = self._table_record(position)
+        columns = []
+        for i in range(first_column, first_column + column_count):
+            name, kind, comment, default, cardinality, flags = _COLUMN.unpack_from(
+                self._buffer, self._offsets[1] + i * _COLUMN.size)
+            columns.append({
+                "name": self._string(name),
+                "type": self._string(kind),
+                "nullable": bool(flags & NULLABLE),
+                "default": self._string(default),
+                "primary_key": bool(flags & PRIMARY_KEY),
+                "unique": bool(flags & UNIQUE),
+                "indexed": bool(flags & INDEXED),
+                "auto_increment": bool(flags & AUTO_INCREMENT),
+                "comment": self._string(comment),
+                "cardinality": None if cardinality < 0 else cardinality
+            })
+        indexes = []
+        for i in range(first_index, first_index + index_count):
+            name, first, count, unique = _INDEX.unpack_from(self._buffer, self._offsets[2] + i * _INDEX.size)
+            indexes.append({
+                "name": self._string(name),
+                "unique": bool(unique),
+                "columns": [self._string(_U32.unpack_from(self._buffer, self._offsets[3] + j * _U32.size)[0])
+                            for j in range(first, first + count)]
+            })
+        table = self._tables[position] = {
+            "schema": self._string(schema_id),
+            "name": self._string(name_id),
+            "comment": self._string(comment_id),
+            "row_estimate": None if rows < 0 else rows,
+            "columns": columns,
+            "indexes": indexes
+        }
+        return table
+
+    def __len__(self) -> int:
+        return self._table_count
+
+    def __iter__(self):
+        return (self._decode_table(position) for position in range(self._table_count))
+
+    def table_names(self) -> list:
+        return [self._string(self._table_record(position)[1]) for position in range(self._table_count)]
+
+    def table(self, name: str):
+        """Table dict by bare or schema-qualified name, or None"""
+        position = self._positions().get(name)
+        return None if position is None else self._decode_table(position)
+
+    def columns(self, table: str) -> list:
+        found = self.table(table)
+        return found["columns"] if found else []
+
+    def column(self, table: str, column: str):
+        return next((c for c in self.columns(table) if c["name"] == column), None)
+
+    def primary_key(self, table: str) -> list:
+        return [c["name"] for c in self.columns(table) if c["primary_key"]]
+
+    def indexes(self, table: str) -> list:
+        found = self.table(table)
+        return found["indexes"] if found else []
+
+    def prompt(self, default_schema: str, tables: list = None) -> str:
+        """Prompt text for every table, or only `tables` (by name) in the given order"""
+        selected = list(self) if tables is None else [t for t in map(self.table, tables) if t is not None]
+        return render_schema(selected, default_schema)
+
+    def close(self):
+        self._buffer.close()
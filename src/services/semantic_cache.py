@@ -0,0 +1,124 @@
+"""Near-duplicate question cache: confirmed question -> SQL pairs found by embedding similarity.
+
+Vectors live in one preallocated float32 matrix of unit rows, so a lookup is a single
+matrix-vector product. Inserts fill free rows; when full, the least recently used row
+is overwritten. A match must clear SEMANTIC_CACHE_THRESHOLD and also agree on the
+question's literal signature (numbers, quoted text, resolved dictionary values, sort
+direction and negation): "top 5" and "top 10" embed almost identically but need
+different SQL."""
+import re
+import threading
+import time
+import numpy as np
+from src.core.config import Config
+from src.services.value_dictionary import value_dictionary
+
+_DIRECTION_WORDS = {
+    "top": "desc", "highest": "desc", "largest": "desc", "biggest": "desc", "most": "desc", "max": "desc", "maximum": "desc",
+    "bottom": "asc", "lowest": "asc", "smallest": "asc", "least": "asc", "min": "asc", "minimum": "asc", "fewest": "asc"
+}
+_NEGATION_WORDS = {"not", "no", "excluding", "except", "without", "exclude", "non"}
+
+def literal_signature(question: str) -> frozenset:
+    """Everything in the question that changes the SQL even when the wording barely changes"""
+    signature = set(re.findall(r"\d+(?:\.\d+)?", question))
+    signature.update(f"'{quoted.lower()}'" for quoted in re.findall(r"['\"]([^'\"]+)['\"]", question))
+    signature.update(f"={hint['column']}:{hint['value']}" for hint in value_dictionary.resolve(question))
+    for word in re.findall(r"[a-z]+", question.lower()):
+        if word in _DIRECTION_WORDS:
+            signature.add(f"order:{_DIRECTION_WORDS[word]}")
+        elif word in _NEGATION_WORDS:
+            signature.add("negated")
+    return frozenset(signature)
+
+class SemanticCache:
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._vectors = None  # (capacity, dim) float32, allocated on first insert
+        self._entries = [None] * capacity  # slot -> {"question", "sql", "signature", "schema_tag", "hits"}
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return Config.SEMANTIC_CACHE_ENABLED
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _best(self, vector: np.ndarray):
+        """(slot, score) of the closest stored question, or (None, -1)"""
+        if self._vectors is None or not self._used.any() or vector.shape[0] != self._vectors.shape[1]:
+            return None, -1.0
+        scores = self._vectors @ vector
+        scores[~self._used] = -1.0
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def lookup(self, question: str, vector, schema_tag: str = None):
+        """Stored SQL for a near-duplicate of `question`, or None"""
+        vector = self._normalize(vector)
+        signature = literal_signature(question)
+        with self._lock:
+            slot, score = self._best(vector)
+            entry = self._entries[slot] if slot is not None else None
+            if (entry is None or score < self.threshold or entry["signature"] != signature
+                    or entry["schema_tag"] != schema_tag):
+                self.misses += 1
+                return None
+            self._last_used[slot] = time.monotonic()
+            entry["hits"] += 1
+            self.hits += 1
+            return {"sql": entry["sql"], "question": entry["question"], "score": round(score, 4)}
+
+    def add(self, question: str, sql: str, vector, schema_tag: str = None):
+        """Store a confirmed pair; a near-identical stored question is overwritten instead of duplicated"""
+        vector = self._normalize(vector)
+        signature = literal_signature(question)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._used[:] = False
+                self._entries = [None] * self.capacity
+            slot, score = self._best(vector)
+            if slot is None or score < 0.99 or self._entries[slot]["signature"] != signature:
+                free = np.flatnonzero(~self._used)
+                slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._entries[slot] = {"question": question, "sql": sql, "signature": signature,
+                                   "schema_tag": schema_tag, "hits": 0}
+            self._used[slot] = True
+            self._last_used[slot] = time.monotonic()
+
+    def evict(self, question: str = None) -> int:
+        """Drop every entry, or the one stored for `question` (e.g. after negative feedback)"""
+        with self._lock:
+            slots = [i for i, entry in enumerate(self._entries)
+                     if entry and (question is None or entry["question"] == question)]
+            for slot in slots:
+                self._entries[slot] = None
+                self._used[slot] = False
+                self._last_used[slot] = 0.0
+            return len(slots)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": int(self._used.sum()),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+semantic_cache = SemanticCache(capacity=Config.SEMANTIC_CACHE_CAPACITY, threshold=Config.SEMANTIC_CACHE_THRESHOLD)
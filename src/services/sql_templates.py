@@ -0,0 +1,295 @@
+"""Local NL->SQL for formulaic questions, so they never reach the LLM.
+
+Two stages:
+
+    system      the MySQL housekeeping questions ("show tables", "current user")
+    risk        a small grammar over the question's words: every word must be a metric
+                (notional, MPE, trade count, counterparty count), a grouping (counterparties,
+                by sector/country/rating/product type/concentration group, monthly, by year),
+                a slot (top/bottom N, year), a value the value dictionary resolves
+                ("Energy", "BB") or filler. One unknown word and the question falls
+                through to the LLM, so anything the grammar can't fully account for
+                (exclusions, thresholds, other columns) is never half-answered.
+
+Recognised classes render through AIService._sql_dialect(), so typed tables and the
+varchar base tables both get their own casts and date filters:
+
+    top_n           top 5 counterparties by notional in 2024
+    breakdown       MPE by sector for BB counterparties, notional by product type
+    monthly_trend   monthly MPE for 2024
+    yearly          trade count 2023 vs 2024
+    total           total notional for the Energy sector"""
+import re
+import threading
+import time
+from src.core.config import Config
+from src.services.value_dictionary import value_dictionary
+
+_PHRASES = [
+    (r"\bmarket price exposures?\b", "mpe"),
+    (r"\b(?:trade counts?|number of trades|count of trades|how many trades)\b", "tradecount"),
+    (r"\bcounterparty counts?\b", "cptycount"),
+    (r"\bconcentration groups\b", "concgroups"),
+    (r"\bconcentration group\b", "concgroup"),
+    (r"\bproduct types\b", "producttypes"),
+    (r"\bproduct type\b", "producttype"),
+    (r"\b(?:internal|credit) ratings\b", "ratings"),
+    (r"\b(?:internal|credit) rating\b", "rating"),
+    (r"\bnotional (?:values?|amounts?|usd)\b", "notional"),
+    (r"\b(?:year over year|year on year)\b", "yoy"),
+    (r"\bmonth over month\b", "monthly")
+]
+_PHRASES = [(re.compile(pattern), token) for pattern, token in _PHRASES]
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+# metric -> (table alias, aggregate built from the dialect, result column)
+_METRICS = {
+    "notional": ("t", lambda sql: f"SUM({sql['notional_expr']})", "total_notional"),
+    "mpe": ("c", lambda sql: f"SUM({sql['mpe_expr']})", "total_mpe"),
+    "trade_count": ("t", lambda sql: "COUNT(t.trade_id)", "trade_count"),
+    "counterparty_count": ("con", lambda sql: f"SUM({sql['count_expr']})", "total_count")
+}
+_METRIC_WORDS = {"notional": "notional", "notionals": "notional", "mpe": "mpe", "tradecount": "trade_count",
+                 "cptycount": "counterparty_count"}
+# grouping word -> (dimension, plural)
+_DIMENSION_WORDS = {
+    "counterparty": ("counterparty", False), "counterparties": ("counterparty", True),
+    "sector": ("sector", False), "sectors": ("sector", True),
+    "country": ("country", False), "countries": ("country", True),
+    "rating": ("rating", False), "ratings": ("rating", True),
+    "producttype": ("product_type", False), "producttypes": ("product_type", True),
+    "concgroup": ("concentration_group", False), "concgroups": ("concentration_group", True)
+}
+_DIMENSIONS = {
+    "counterparty": ("c", "counterparty_name"),
+    "sector": ("c", "counterparty_sector"),
+    "country": ("c", "counterparty_country"),
+    "rating": ("c", "internal_rating"),
+    "product_type": ("t", "product_type"),
+    "concentration_group": ("con", "concentration_group")
+}
+# value dictionary (table, column) -> alias; the base-table names are used in both dialects.
+# Both product_type columns map to "t" so a value found in each is one filter; _render moves
+# it onto the counterparty table for counterparty metrics.
+_FILTER_COLUMNS = {
+    ("counterparty_new", "counterparty_sector"): "c",
+    ("counterparty_new", "counterparty_country"): "c",
+    ("counterparty_new", "internal_rating"): "c",
+    ("counterparty_new", "product_type"): "t",
+    ("trade_new", "product_type"): "t",
+    ("concentration_new", "concentration_group"): "con"
+}
+_DIRECTIONS = {"top": "DESC", "highest": "DESC", "largest": "DESC", "biggest": "DESC", "most": "DESC",
+               "bottom": "ASC", "lowest": "ASC", "smallest": "ASC", "least": "ASC"}
+_CONNECTORS = {"by", "per", "each", "across", "every"}
+_FILLER = {
+    "show", "me", "the", "a", "an", "of", "in", "for", "what", "whats", "is", "are", "was", "were", "list", "give",
+    "get", "display", "please", "with", "during", "all", "to", "from", "our", "my", "how", "much", "and", "between",
+    "total", "sum", "overall", "aggregate", "trend", "trends", "breakdown", "distribution", "vs", "versus", "compare",
+    "comparison", "compared", "change", "over", "on", "at", "trade", "trades", "exposure", "value", "values", "usd",
+    "wise", "grouped", "group", "split", "which", "who", "have", "has", "had", "time", "data", "their", "s"
+}
+
+def _system_sql(question_lower: str):
+    """MySQL system queries"""
+    if (("show" in question_lower or "all" in question_lower) and "users" in question_lower):
+        if "active" in question_lower:
+            return "SHOW PROCESSLIST;"
+        else:
+            return "SELECT User, Host FROM mysql.user;"
+    elif "active" in question_lower and "user" in question_lower:
+        return "SHOW PROCESSLIST;"
+    elif "show" in question_lower and "databases" in question_lower:
+        return "SHOW DATABASES;"
+    elif "show" in question_lower and "tables" in question_lower:
+        return "SHOW TABLES;"
+    elif "show" in question_lower and "processes" in question_lower:
+        return "SHOW PROCESSLIST;"
+    elif "current" in question_lower and "user" in question_lower:
+        return "SELECT USER(), CURRENT_USER();"
+    return None
+
+def _filters(question: str, text: str):
+    """(text with resolved values replaced by slot tokens, [(alias, column, value)]), or None when a
+    resolved value is ambiguous; values whose mention is only grammar words are left as words"""
+    by_mention = {}
+    for hint in value_dictionary.resolve(question):
+        mention = hint["mention"].lower()
+        if all(word in _FILLER or word in _METRIC_WORDS or word in _DIMENSION_WORDS or word in _DIRECTIONS
+               or word in _CONNECTORS for word in _TOKEN_RE.findall(mention)):
+            continue
+        alias = _FILTER_COLUMNS.get((hint["table"], hint["column"]))
+        by_mention.setdefault(mention, set()).add((alias, hint["column"], hint["value"]) if alias else None)
+    filters = []
+    for mention, candidates in by_mention.items():
+        if len(candidates) != 1 or None in candidates:
+            return None
+        pattern = r"(?<![\w])" + r"\s+".join(re.escape(part) for part in mention.split()) + r"(?![\w])"
+        text, replaced = re.subn(pattern, f" valueslot{len(filters)} ", text)
+        if not replaced:
+            return None
+        filters.append(candidates.pop())
+    return text, filters
+
+def _parse(question: str):
+    """Slots of a question the grammar fully accounts for, else None"""
+    text = question.lower()
+    for pattern, token in _PHRASES:
+        text = pattern.sub(token, text)
+    resolved = _filters(question, text)
+    if resolved is None:
+        return None
+    text, filters = resolved
+    slots = {"metrics": set(), "dimensions": [], "grain": None, "years": [], "n": None, "direction": None,
+             "filters": filters}
+    tokens = _TOKEN_RE.findall(text.replace("'", ""))
+    skip = False
+    for i, token in enumerate(tokens):
+        previous = tokens[i - 1] if i else ""
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if skip:
+            skip = False
+        elif token.startswith("valueslot"):
+            # "Energy sector", "BB counterparties": the word qualifies the value instead of grouping by it
+            column = filters[int(token[len("valueslot"):])][1]
+            dimension = _DIMENSION_WORDS.get(following)
+            skip = bool(dimension) and (dimension[0] == "counterparty" or _DIMENSIONS[dimension[0]][1] == column)
+        elif token in _METRIC_WORDS:
+            slots["metrics"].add(_METRIC_WORDS[token])
+        elif token in _DIMENSION_WORDS:
+            dimension, plural = _DIMENSION_WORDS[token]
+            if not plural and previous not in _CONNECTORS:
+                return None
+            if dimension not in slots["dimensions"]:
+                slots["dimensions"].append(dimension)
+        elif token in ("monthly", "yoy", "yearly", "annual", "annually"):
+            slots["grain"] = "month" if token == "monthly" else "year"
+        elif token in ("month", "months", "year", "years") and previous in _CONNECTORS:
+            slots["grain"] = "month" if token.startswith("month") else "year"
+        elif token == "year" and re.fullmatch(r"(19|20)\d\d", following):
+            continue
+        elif token in _DIRECTIONS:
+            slots["direction"] = _DIRECTIONS[token]
+        elif re.fullmatch(r"(19|20)\d\d", token):
+            slots["years"].append(int(token))
+        elif token.isdigit() and 0 < int(token) <= 1000 and slots["n"] is None:
+            slots["n"] = int(token)
+        elif token not in _FILLER and token not in _CONNECTORS:
+            return None
+    return slots
+
+def _render(slots: dict, sql: dict):
+    """(template name, SQL) for the parsed slots, or None when they don't form a supported question"""
+    if len(slots["metrics"]) != 1 or len(slots["dimensions"]) > 1:
+        return None
+    metric = next(iter(slots["metrics"]))
+    alias, aggregate, measure = _METRICS[metric]
+    grain, years, dimensions = slots["grain"], sorted(set(slots["years"])), slots["dimensions"]
+    if len(years) > 1 and grain is None:
+        grain = "year"
+    ranked = slots["n"] is not None or slots["direction"] is not None
+    if ranked and (grain or not dimensions):
+        return None
+
+    # A trade-level join repeats each counterparty row once per trade, so only trade metrics
+    # may join; counterparty metrics group by the counterparty's own product_type instead
+    def on_metric_table(column_alias, column):
+        if alias == "c" and (column_alias, column) == ("t", "product_type"):
+            return "c", column
+        return column_alias, column
+    dimension_columns = [on_metric_table(*_DIMENSIONS[d]) for d in dimensions]
+    filters = [(*on_metric_table(f[0], f[1]), f[2]) for f in slots["filters"]]
+
+    select, group = [], []
+    if grain == "month":
+        select.append(f"DATE_FORMAT({alias}.as_of_date, '%Y-%m') AS month")
+        group.append("month")
+    elif grain == "year":
+        select.append(f"LEFT({alias}.as_of_date, 4) AS year")
+        group.append("year")
+    for dimension_column in dimension_columns:
+        column = "{}.{}".format(*dimension_column)
+        select.append(column)
+        group.append(column)
+    select.append(f"{aggregate(sql)} AS {measure}")
+
+    aliases = {alias} | {a for a, _ in dimension_columns} | {f[0] for f in filters}
+    if aliases == {"t", "c"} and alias == "t":
+        tables = f"{sql['trade']} t, {sql['counterparty']} c"
+        where = ["c.entity = t.entity", "c.counterparty_id = t.reporting_counterparty_id"]
+    elif len(aliases) == 1:
+        table = {"t": sql["trade"], "c": sql["counterparty"], "con": sql["concentration"]}[alias]
+        tables, where = f"{table} {alias}", []
+    else:
+        return None
+    if alias == "con" and (grain or years):
+        return None
+    if metric == "mpe":
+        where.append(sql["mpe_filter"])
+    if years:
+        ranges = [sql["year_range"].format(column=f"{alias}.as_of_date", year=year, next_year=year + 1) for year in years]
+        where.append(ranges[0] if len(ranges) == 1 else "(" + " OR ".join(f"({r})" for r in ranges) + ")")
+    for filter_alias, column, value in filters:
+        value = str(value).replace("'", "''")
+        where.append(f"{filter_alias}.{column} = '{value}'")
+
+    lines = [f"SELECT {', '.join(select)}", f"FROM {tables}"]
+    if where:
+        lines.append("WHERE " + "\n  AND ".join(where))
+    if group:
+        lines.append(f"GROUP BY {', '.join(group)}")
+    if grain:
+        lines.append(f"ORDER BY {group[0]}")
+        name = "monthly_trend" if grain == "month" else "yearly"
+    elif dimensions:
+        lines.append(f"ORDER BY {measure} {slots['direction'] or 'DESC'}")
+        name = "top_n" if ranked else "breakdown"
+    else:
+        name = "total"
+    if slots["n"] is not None:
+        lines.append(f"LIMIT {slots['n']}")
+    return name, "\n".join(lines) + ";"
+
+class SQLTemplates:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = 0
+        self.match_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return Config.SQL_TEMPLATES_ENABLED
+
+    def match(self, question: str, sql: dict):
+        """{"template", "sql", "slots"} when the question is answered locally, else None"""
+        started = time.perf_counter()
+        system = _system_sql(question.lower())
+        if system:
+            matched = {"template": "system", "sql": system, "slots": {}}
+        elif self.enabled:
+            slots = _parse(question)
+            rendered = _render(slots, sql) if slots else None
+            matched = {"template": rendered[0], "sql": rendered[1], "slots": slots} if rendered else None
+        else:
+            return None
+        with self._lock:
+            self.match_seconds += time.perf_counter() - started
+            if matched:
+                self.hits[matched["template"]] = self.hits.get(matched["template"], 0) + 1
+            else:
+                self.misses += 1
+        return matched
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self.hits.values()) + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_ratio": round(sum(self.hits.values()) / lookups, 3) if lookups else 0.0,
+                "avg_match_us": round(self.match_seconds / lookups * 1e6, 1) if lookups else 0.0
+            }
+
+sql_templates = SQLTemplates()
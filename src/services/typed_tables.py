@@ -0,0 +1,177 @@
+"""Typed shadow copies of the varchar-only reporting tables.
+
+The dump stores amounts, counts and dates as varchar, which forces CAST(...) and
+LIKE '2024%' into every generated query. Each refresh rebuilds `<table>_typed` with
+DECIMAL/INT/DATE columns and real indexes, then swaps it in with one RENAME TABLE.
+
+Run `python -m src.services.typed_tables` (or POST /admin/typed-tables/refresh)."""
+import re
+import sys
+import time
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.utils.console import Console
+
+TYPED_SUFFIX = "_typed"
+BASE_TABLES = ["trade_new", "counterparty_new", "concentration_new"]
+
+_DATE_NAME_RE = re.compile(r"(^|_)date$")
+_INT_NAME_RE = re.compile(r"^_of_|_count$|^tenor_month$")
+_DECIMAL_NAME_RE = re.compile(r"(^|_)(mpe|epe|ce|mtm|notional|limit|amount|usd|dv01|fx01|vega|buffer)(_|$)")
+
+_NUMBER_PATTERN = "^-?[0-9]+([.][0-9]+)?$"
+_INTEGER_PATTERN = "^-?[0-9]+$"
+_COMPACT_DATE_PATTERN = "^[0-9]{8}$"
+_ISO_DATE_PATTERN = "^[0-9]{4}-[0-9]{2}-[0-9]{2}"
+
+# Columns the generated SQL filters, joins or groups on
+TYPED_INDEXES = {
+    "trade_new": [
+        ("as_of_date",), ("entity", "reporting_counterparty_id"), ("reporting_counterparty_id",),
+        ("product_type",), ("asset_class",), ("trade_id",)
+    ],
+    "counterparty_new": [
+        ("as_of_date",), ("entity", "counterparty_id"), ("counterparty_id",), ("counterparty_name",),
+        ("counterparty_sector",), ("counterparty_country",), ("internal_rating",), ("product_type",)
+    ],
+    "concentration_new": [
+        ("as_of_date",), ("entity",), ("concentration_group", "concentration_value")
+    ]
+}
+
+def typed_name(table: str) -> str:
+    return f"{table}{TYPED_SUFFIX}"
+
+def _date_expr(column: str) -> str:
+    value = f"TRIM(`{column}`)"
+    return (
+        f"CAST(CASE WHEN {value} REGEXP '{_COMPACT_DATE_PATTERN}' THEN STR_TO_DATE({value}, '%Y%m%d') "
+        f"WHEN {value} REGEXP '{_ISO_DATE_PATTERN}' THEN STR_TO_DATE(LEFT({value}, 10), '%Y-%m-%d') END AS DATE)"
+    )
+
+def _int_expr(column: str) -> str:
+    value = f"TRIM(`{column}`)"
+    return f"CASE WHEN {value} REGEXP '{_INTEGER_PATTERN}' THEN CAST({value} AS SIGNED) END"
+
+def _decimal_expr(column: str) -> str:
+    value = f"TRIM(`{column}`)"
+    return f"CASE WHEN {value} REGEXP '{_NUMBER_PATTERN}' THEN CAST({value} AS DECIMAL(24,4)) END"
+
+_CONVERTERS = {"DATE": _date_expr, "INT": _int_expr, "DECIMAL": _decimal_expr}
+_VALID_PATTERNS = {
+    "DATE": f"(TRIM(`{{c}}`) REGEXP '{_COMPACT_DATE_PATTERN}' OR TRIM(`{{c}}`) REGEXP '{_ISO_DATE_PATTERN}')",
+    "INT": f"TRIM(`{{c}}`) REGEXP '{_INTEGER_PATTERN}'",
+    "DECIMAL": f"TRIM(`{{c}}`) REGEXP '{_NUMBER_PATTERN}'"
+}
+
+class TypedTableMaterializer:
+    def __init__(self):
+        self.config = Config()
+
+    def _columns(self, conn, table: str) -> list:
+        rows = conn.execute(text("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = :table
+            ORDER BY ordinal_position
+        """), {"table": table}).fetchall()
+        return [(name, data_type.lower()) for name, data_type in rows]
+
+    def _candidate_type(self, column: str, data_type: str):
+        if data_type not in ("varchar", "char", "text"):
+            return None
+        if _DATE_NAME_RE.search(column):
+            return "DATE"
+        if _INT_NAME_RE.search(column):
+            return "INT"
+        if _DECIMAL_NAME_RE.search(column):
+            return "DECIMAL"
+        return None
+
+    def plan_types(self, conn, table: str, columns: list) -> dict:
+        """Pick a type per column by name, then keep it only if every non-blank value parses"""
+        candidates = {}
+        for column, data_type in columns:
+            kind = self._candidate_type(column, data_type)
+            if kind:
+                candidates[column] = kind
+        if not candidates:
+            return {}
+
+        checks = ", ".join(
+            f"SUM(TRIM(`{column}`) <> '' AND NOT {_VALID_PATTERNS[kind].format(c=column)}) AS `{column}`"
+            for column, kind in candidates.items()
+        )
+        bad_counts = conn.execute(text(f"SELECT {checks} FROM `{table}`")).mappings().fetchone()
+        planned = {}
+        for column, kind in candidates.items():
+            if not bad_counts[column]:
+                planned[column] = kind
+            else:
+                Console.warning(f"{table}.{column}: {bad_counts[column]} values are not {kind}, keeping varchar")
+        return planned
+
+    def refresh_table(self, table: str) -> dict:
+        started = time.perf_counter()
+        target = typed_name(table)
+        staging = f"{target}_staging"
+        retired = f"{target}_old"
+
+        with engine_registry.connect() as conn:
+            columns = self._columns(conn, table)
+            if not columns:
+                raise ValueError(f"Table {table} not found")
+            types = self.plan_types(conn, table, columns)
+
+            select_list = ", ".join(
+                f"{_CONVERTERS[types[column]](column)} AS `{column}`" if column in types else f"`{column}`"
+                for column, _ in columns
+            )
+            column_names = {column for column, _ in columns}
+            index_defs = []
+            if "id" in column_names:
+                index_defs.append("ADD PRIMARY KEY (`id`)")
+            for index_columns in TYPED_INDEXES.get(table, []):
+                if all(column in column_names for column in index_columns):
+                    index_name = "idx_" + "_".join(index_columns)
+                    index_defs.append(f"ADD KEY `{index_name}` (" + ", ".join(f"`{c}`" for c in index_columns) + ")")
+
+            conn.execute(text(f"DROP TABLE IF EXISTS `{staging}`"))
+            conn.execute(text(f"CREATE TABLE `{staging}` AS SELECT {select_list} FROM `{table}`"))
+            if index_defs:
+                conn.execute(text(f"ALTER TABLE `{staging}` " + ", ".join(index_defs)))
+
+            exists = conn.execute(text("""
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = :table
+            """), {"table": target}).scalar()
+            conn.execute(text(f"DROP TABLE IF EXISTS `{retired}`"))
+            if exists:
+                # Single RENAME TABLE is atomic: readers see either the old or the new copy
+                conn.execute(text(f"RENAME TABLE `{target}` TO `{retired}`, `{staging}` TO `{target}`"))
+                conn.execute(text(f"DROP TABLE `{retired}`"))
+            else:
+                conn.execute(text(f"RENAME TABLE `{staging}` TO `{target}`"))
+            row_count = conn.execute(text(f"SELECT COUNT(*) FROM `{target}`")).scalar()
+            conn.commit()
+
+        return {
+            "table": target,
+            "rows": row_count,
+            "typed_columns": types,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def refresh_all(self, tables: list = None) -> list:
+        results = []
+        for table in tables or BASE_TABLES:
+            Console.processing(f"Materializing {typed_name(table)}")
+            result = self.refresh_table(table)
+            Console.success(f"{result['table']}: {result['rows']} rows, "
+                            f"{len(result['typed_columns'])} typed columns in {result['seconds']}s")
+            results.append(result)
+        return results
+
+if __name__ == "__main__":
+    TypedTableMaterializer().refresh_all(sys.argv[1:] or None)
@@ -0,0 +1,200 @@
+"""Distinct-value dictionaries for low-cardinality filter columns.
+
+Questions name values ("Energy", "BB", "HK") whose exact spelling the model would
+otherwise have to guess. Each configured column's distinct values and counts are kept
+in value_dictionary.json; `resolve(question)` matches the question's words against
+them locally (exact, whole-word prefix, then difflib) so the prompt can carry the real
+literals. `refresh()` only rescans tables whose data version (information_schema
+UPDATE_TIME/TABLE_ROWS) moved since the last scan, and runs on the schema poll interval."""
+import asyncio
+import difflib
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime
+from sqlalchemy import text
+from src.core.config import Config
+from src.services.engine_registry import engine_registry
+from src.services.query_cache import data_versions
+from src.utils.console import Console
+
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_&.\-]*")
+_SKIP_WORDS = {
+    "the", "and", "for", "with", "from", "show", "list", "what", "which", "total", "count", "sum", "all",
+    "top", "by", "in", "of", "to", "on", "per", "is", "are", "me", "give", "get", "how", "many", "much"
+}
+MAX_NGRAM = 3
+FUZZY_CUTOFF = 0.85
+
+def _parse_columns(spec: str) -> list:
+    """"table.column,..." -> [(table, column)]"""
+    pairs = []
+    for item in spec.split(","):
+        table, _, column = item.strip().partition(".")
+        if table and column:
+            pairs.append((table, column))
+    return pairs
+
+class ValueDictionary:
+    def __init__(self, path: str = "value_dictionary.json"):
+        self.path = path
+        self.columns = _parse_columns(Config.VALUE_DICTIONARY_COLUMNS)
+        self.max_distinct = Config.VALUE_DICTIONARY_MAX_DISTINCT
+        self._data = {"tables": {}, "columns": {}}
+        self._index = {}
+        self._long_values = []
+        self._refresh_lock = threading.Lock()
+        self._task = None
+        self.resolved = 0
+
+    def load(self):
+        """Read the last saved dictionaries (no database access)"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                Console.warning(f"Ignoring unreadable value dictionary: {e}")
+        self._rebuild_index()
+
+    def refresh(self, force: bool = False) -> list:
+        """Rescan the tables whose data changed (all when `force`); returns the tables rescanned"""
+        with self._refresh_lock:
+            tables = sorted({table for table, _ in self.columns})
+            if not tables:
+                return []
+            data_versions.forget(tables)
+            versions = data_versions.get_versions(tables)
+            stale = [t for t in tables if force or self._data["tables"].get(t, {}).get("version") != versions.get(t)]
+            if not stale:
+                return []
+
+            data = {"tables": dict(self._data["tables"]), "columns": dict(self._data["columns"])}
+            for table in stale:
+                try:
+                    data["columns"].update(self._scan(table))
+                except Exception as e:
+                    Console.warning(f"Value dictionary scan of {table} failed: {e}")
+                    continue
+                data["tables"][table] = {"version": versions.get(table), "refreshed_at": datetime.now().isoformat()}
+            self._data = data
+            self._rebuild_index()
+            self._save()
+            Console.info(f"Value dictionaries refreshed for {', '.join(stale)}")
+            return stale
+
+    def _scan(self, table: str) -> dict:
+        scanned = {}
+        with engine_registry.connect() as conn:
+            for column in [c for t, c in self.columns if t == table]:
+                key = f"{table}.{column}"
+                try:
+                    rows = conn.execute(text(
+                        f"SELECT `{column}`, COUNT(*) FROM `{table}` WHERE `{column}` IS NOT NULL AND `{column}` <> '' "
+                        f"GROUP BY `{column}` ORDER BY COUNT(*) DESC LIMIT {self.max_distinct + 1}"
+                    )).fetchall()
+                except Exception as e:
+                    scanned[key] = {"skipped": str(e), "values": {}}
+                    continue
+                if len(rows) > self.max_distinct:
+                    scanned[key] = {"skipped": f"more than {self.max_distinct} distinct values", "values": {}}
+                else:
+                    scanned[key] = {"values": {str(value).strip(): count for value, count in rows}}
+        return scanned
+
+    def _save(self):
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(self._data, f, indent=2, default=str)
+        os.replace(temp_path, self.path)
+
+    def _rebuild_index(self):
+        """lowercased value -> [(table, column, value, count)]"""
+        index = {}
+        for key, entry in self._data["columns"].items():
+            table, _, column = key.partition(".")
+            for value, count in entry.get("values", {}).items():
+                index.setdefault(value.lower(), []).append((table, column, value, count))
+        self._index = index
+        self._long_values = [value for value in index if len(value) > 3]
+
+    def values(self, table: str, column: str) -> dict:
+        return dict(self._data["columns"].get(f"{table}.{column}", {}).get("values", {}))
+
+    def _lookup(self, phrase: str):
+        """(match kind, index key) for a question phrase, or None"""
+        lowered = phrase.lower()
+        if lowered in self._index:
+            # Short codes ("HK", "BB") only count when written as codes, so prose like "in"/"us" is ignored
+            if len(lowered) > 3 or phrase.isupper():
+                return "exact", lowered
+            return None
+        if len(lowered) < 4 or lowered in _SKIP_WORDS:
+            return None
+        prefixed = [value for value in self._long_values if re.match(re.escape(lowered) + r"\b", value)]
+        if len(prefixed) == 1:
+            return "prefix", prefixed[0]
+        close = difflib.get_close_matches(lowered, self._long_values, n=1, cutoff=FUZZY_CUTOFF)
+        return ("fuzzy", close[0]) if close else None
+
+    def resolve(self, question: str) -> list:
+        """Dictionary values the question refers to, longest phrases first, as
+        [{"mention", "table", "column", "value", "count", "match"}]"""
+        if not self._index:
+            return []
+        words = _WORD_RE.findall(question)
+        used = [False] * len(words)
+        hints = []
+        for size in range(min(MAX_NGRAM, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                if any(used[start:start + size]):
+                    continue
+                phrase = " ".join(words[start:start + size])
+                if size == 1 and phrase.lower() in _SKIP_WORDS:
+                    continue
+                found = self._lookup(phrase)
+                if found is None:
+                    continue
+                kind, key = found
+                used[start:start + size] = [True] * size
+                for table, column, value, count in self._index[key]:
+                    hints.append({"mention": phrase, "table": table, "column": column, "value": value,
+                                  "count": count, "match": kind})
+        self.resolved += bool(hints)
+        return hints
+
+    async def _poll(self, interval: int):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                Console.warning(f"Value dictionary refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: int = None):
+        interval = interval or Config.SCHEMA_POLL_INTERVAL
+        if interval > 0 and self.columns and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "columns": {
+                key: {"distinct_values": len(entry.get("values", {})), "skipped": entry.get("skipped")}
+                for key, entry in self._data["columns"].items()
+            },
+            "tables": self._data["tables"],
+            "questions_resolved": self.resolved
+        }
+
+value_dictionary = ValueDictionary()
@@ -0,0 +1,80 @@
+"""Query result serialization helpers"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+def json_default(value):
+    """json.dumps fallback for the types MySQL drivers hand back"""
+    if isinstance(value, (Decimal, datetime, date, time)):
+        return _native(value)
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+def sse_event(event: str, data) -> str:
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+def _native(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+def _column_converters(columns, rows):
+    """Pick one converter per column from its first non-null value instead of testing every cell"""
+    converters = [None] * len(columns)
+    pending = set(range(len(columns)))
+    for row in rows:
+        for i in list(pending):
+            value = row[i]
+            if value is not None:
+                if isinstance(value, (Decimal, datetime, date, time)):
+                    converters[i] = _native
+                pending.discard(i)
+        if not pending:
+            break
+    return converters
+
+def to_columns(columns, rows) -> list:
+    """Column-oriented form: one array per column, aligned with `columns`"""
+    converters = _column_converters(columns, rows)
+    arrays = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    for i, convert in enumerate(converters):
+        if convert:
+            arrays[i] = [convert(value) for value in arrays[i]]
+    return arrays
+
+def to_records(columns, rows) -> list:
+    """Row-oriented form: one dict per row, as the chat UI consumes it"""
+    converters = _column_converters(columns, rows)
+    if not any(converters):
+        return [dict(zip(columns, row)) for row in rows]
+    converters = [convert or (lambda value: value) for convert in converters]
+    return [
+        {col: convert(value) for col, convert, value in zip(columns, converters, row)}
+        for row in rows
+    ]
+
+def iter_ndjson(columns, batches):
+    """Encode row batches as newline-delimited JSON objects"""
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=json_default) + "\n"
+            for row in batch
+        )
+
+def iter_json_array(columns, batches):
+    """Encode row batches as one JSON array, emitted chunk by chunk"""
+    yield "["
+    first = True
+    for batch in batches:
+        chunk = ",".join(json.dumps(dict(zip(columns, row)), default=json_default) for row in batch)
+        if not chunk:
+            continue
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
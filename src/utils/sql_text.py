@@ -0,0 +1,139 @@
+"""Lightweight SQL text helpers (no full parser; enough for the generated analytics SQL)"""
+import re
+
+_TOKEN_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|(--[^\n]*|#[^\n]*|/\*.*?\*/)|(\s+)", re.S)
+_READ_ONLY_PREFIXES = ("select", "with", "show", "describe", "desc", "explain")
+_FROM_RE = re.compile(r"\bfrom\s+", re.I)
+_CLAUSE_END_RE = re.compile(
+    r"(.+?)(?=\bwhere\b|\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|\bunion\b|"
+    r"\b(?:inner|left|right|cross|straight|natural)?\s*join\b|\)|;|$)",
+    re.I | re.S
+)
+_JOIN_RE = re.compile(r"\bjoin\s+([`\w.]+)", re.I)
+_AFTER_DERIVED_RE = re.compile(r"\)\s*(?:as\s+)?\w+\s*,\s*([`\w.]+)", re.I)
+
+def _normalize_code(code: str) -> str:
+    code = re.sub(r"\s+", " ", code.lower())
+    return re.sub(r"\s*([(),=<>])\s*", r"\1", code)
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form: comments dropped, whitespace collapsed, keywords/identifiers lowercased.
+    Only the code between literals is rewritten: string literals are kept byte for byte, so
+    'Energy' and 'energy' (or 'A  B' and 'A B') stay distinct."""
+    parts = []
+    code = []
+    for kind, piece in _pieces(sql):
+        if kind == "string":
+            parts.append(_normalize_code("".join(code)))
+            parts.append(piece)
+            code = []
+        else:
+            code.append(piece.lower() if kind == "identifier" else piece)
+    parts.append(_normalize_code("".join(code)))
+    return "".join(parts).strip().rstrip("; ")
+
+def _pieces(sql: str):
+    """(kind, text) for every piece of `sql`, whitespace included; comments come back as a single space"""
+    pos = 0
+    for match in _TOKEN_RE.finditer(sql):
+        if match.start() > pos:
+            yield "code", sql[pos:match.start()]
+        literal, comment, space = match.groups()
+        if literal:
+            yield ("identifier" if literal.startswith("`") else "string"), literal
+        else:
+            yield "code", " " if comment else space
+        pos = match.end()
+    if pos < len(sql):
+        yield "code", sql[pos:]
+
+def strip_literals(sql: str) -> str:
+    """Replace string literals and comments with placeholders so regexes can't match inside them"""
+    def replace(match):
+        literal, comment, space = match.groups()
+        if literal and not literal.startswith("`"):
+            return "''"
+        if comment:
+            return " "
+        return match.group(0)
+    return _TOKEN_RE.sub(replace, sql)
+
+def is_read_only(sql: str) -> bool:
+    """True for statements that cannot modify data (single statement only)"""
+    stripped = strip_literals(sql).strip().rstrip(";").strip()
+    if ";" in stripped:
+        return False
+    first_word = stripped.split(None, 1)[0].lower() if stripped else ""
+    if first_word not in _READ_ONLY_PREFIXES:
+        return False
+    return not re.search(r"\b(insert|update|delete|replace|drop|alter|create|truncate|grant|into\s+outfile)\b", stripped, re.I)
+
+def extract_tables(sql: str) -> list:
+    """Return the (schema, table) pairs referenced in FROM/JOIN clauses; schema is None when unqualified"""
+    cleaned = strip_literals(sql)
+    names = []
+    for start in _FROM_RE.finditer(cleaned):
+        clause = _CLAUSE_END_RE.match(cleaned, start.end())
+        if not clause:
+            continue
+        for part in clause.group(1).split(","):
+            part = part.strip()
+            if not part or part.startswith("("):
+                continue
+            names.append(part.split()[0])
+    names.extend(_JOIN_RE.findall(cleaned))
+    names.extend(_AFTER_DERIVED_RE.findall(cleaned))
+
+    tables = []
+    for name in names:
+        pieces = [piece.strip("`") for piece in name.split(".")]
+        pair = (pieces[0], pieces[1]) if len(pieces) == 2 else (None, pieces[0])
+        if pair[1] and pair not in tables:
+            tables.append(pair)
+    return tables
+
+_ALIAS_STOP_WORDS = {
+    "where", "group", "order", "limit", "having", "join", "inner", "left", "right", "cross", "on",
+    "union", "natural", "straight_join", "using", "for", "lock"
+}
+
+def extract_aliases(sql: str) -> dict:
+    """Map every alias (and bare table name) in FROM/JOIN clauses to its table name"""
+    cleaned = strip_literals(sql)
+    refs = []
+    for start in _FROM_RE.finditer(cleaned):
+        clause = _CLAUSE_END_RE.match(cleaned, start.end())
+        if clause:
+            refs.extend(part.strip() for part in clause.group(1).split(","))
+    refs.extend(m.group(1) for m in re.finditer(r"\bjoin\s+([`\w.]+(?:\s+(?:as\s+)?\w+)?)", cleaned, re.I))
+
+    aliases = {}
+    for ref in refs:
+        if not ref or ref.startswith("("):
+            continue
+        words = ref.split()
+        table = words[0].split(".")[-1].strip("`")
+        aliases[table.lower()] = table
+        rest = [w for w in words[1:] if w.lower() != "as"]
+        if rest and rest[0].lower() not in _ALIAS_STOP_WORDS:
+            aliases[rest[0].strip("`").lower()] = table
+    return aliases
+
+def tokenize(sql: str) -> list:
+    """Split into (kind, text) pieces; kind is "code", "string", "identifier" (backquoted) or "comment" """
+    pieces = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(sql):
+        literal, comment, space = match.groups()
+        if space:
+            continue
+        if match.start() > pos:
+            pieces.append(("code", sql[pos:match.start()]))
+        if literal:
+            pieces.append(("identifier" if literal.startswith("`") else "string", literal))
+        else:
+            pieces.append(("comment", comment))
+        pos = match.end()
+    if pos < len(sql):
+        pieces.append(("code", sql[pos:]))
+    return pieces
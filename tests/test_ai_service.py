@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from src.services.ai_service import AIService, AsyncAIService, NO_DATA_RESPONSE
+
+TEMPLATE = {"template": "total", "sql": "SELECT 1;", "slots": {}}
+
+def _answer(method, **kwargs):
+    if method in ("interpret_question", "generate_intent_array"):
+        return '["metrics: MPE"]' if method == "generate_intent_array" else '```json\n{"data_requested": "MPE"}\n```'
+    if method == "question_to_sql":
+        return "```sql\nSELECT 2\n```"
+    return f" {method} text "
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AIService()
+    calls = []
+    def complete(method, **kwargs):
+        calls.append(method)
+        return _answer(method, **kwargs)
+    monkeypatch.setattr(service, "_complete", complete)
+    monkeypatch.setattr(service, "_question_to_sql_request", lambda *args: dict(method="question_to_sql", prompt="p", temperature=0, max_tokens=5))
+    service.calls = calls
+    return service
+
+@pytest.fixture
+def async_service(monkeypatch):
+    service = AsyncAIService()
+    calls = []
+    async def acomplete(method, **kwargs):
+        calls.append(method)
+        return _answer(method, **kwargs)
+    monkeypatch.setattr(service, "_acomplete", acomplete)
+    monkeypatch.setattr(service, "_question_to_sql_request", lambda *args: dict(method="question_to_sql", prompt="p", temperature=0, max_tokens=5))
+    service.calls = calls
+    return service
+
+def test_template_answer_returns_without_calling_the_model(service, async_service, monkeypatch):
+    for svc in (service, async_service):
+        monkeypatch.setattr(svc, "template_sql", lambda question: TEMPLATE)
+    assert service.question_to_sql("total notional", "schema") == "SELECT 1;"
+    assert asyncio.run(async_service.question_to_sql("total notional", "schema")) == "SELECT 1;"
+    assert service.calls == async_service.calls == []
+
+def test_sync_and_async_share_parsing(service, async_service, monkeypatch):
+    for svc in (service, async_service):
+        monkeypatch.setattr(svc, "template_sql", lambda question: None)
+    assert service.question_to_sql("q", "schema") == asyncio.run(async_service.question_to_sql("q", "schema")) == "SELECT 2;"
+    expected = {"data_requested": "MPE", "intent_array": ["metrics: MPE"]}
+    assert service.interpret_question("q") == asyncio.run(async_service.interpret_question("q")) == expected
+
+def test_failures_fall_back(service, async_service, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("down")
+    async def afail(*args, **kwargs):
+        raise RuntimeError("down")
+    monkeypatch.setattr(service, "_complete", fail)
+    monkeypatch.setattr(async_service, "_acomplete", afail)
+    assert service.fix_sql_query("SELECT x", "err", "schema") is None
+    assert asyncio.run(async_service.explain_sql("SELECT 1")) == "Could not generate explanation: down"
+    assert service.interpret_question("q")["intent_array"] == ["entity: Data", "metrics: ANALYSIS"]
+    with pytest.raises(Exception, match="AI service error: down"):
+        service.question_to_sql("unrecognised question", "schema")
+
+def test_streaming_without_results_or_on_error(service, async_service, monkeypatch):
+    assert list(service.stream_natural_response("q", "SELECT 1", [])) == [NO_DATA_RESPONSE]
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("down")
+        yield
+    monkeypatch.setattr(service, "_stream_complete", broken)
+    assert list(service.stream_executive_report("q", "SELECT 1", [], 0)) == ["Error generating executive report: down"]
+
+    async def collect():
+        return [delta async for delta in async_service.stream_natural_response("q", "SELECT 1", [])]
+    assert asyncio.run(collect()) == [NO_DATA_RESPONSE]
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+import pytest
+from src.services.ai_service import AIService
+from src.services.local_mirror import LocalMirror, translate_regex
+
+duckdb = pytest.importorskip("duckdb")
+
+@pytest.fixture
+def dialect():
+    return AIService._sql_dialect(SimpleNamespace(config=SimpleNamespace(USE_TYPED_TABLES=False)))
+
+@pytest.fixture
+def mirror(tmp_path):
+    """Mirror of the untyped base tables: every column VARCHAR, as refresh() copies them"""
+    path = str(tmp_path / "mirror.duckdb")
+    conn = duckdb.connect(path)
+    conn.execute("""
+        CREATE TABLE counterparty_new (entity VARCHAR COLLATE NOCASE, counterparty_id VARCHAR COLLATE NOCASE,
+            counterparty_sector VARCHAR COLLATE NOCASE, mpe VARCHAR COLLATE NOCASE, as_of_date VARCHAR COLLATE NOCASE);
+        CREATE TABLE trade_new (trade_id VARCHAR COLLATE NOCASE, entity VARCHAR COLLATE NOCASE,
+            reporting_counterparty_id VARCHAR COLLATE NOCASE, notional_usd VARCHAR COLLATE NOCASE,
+            as_of_date VARCHAR COLLATE NOCASE);
+        INSERT INTO counterparty_new VALUES ('E1', 'C1', 'Energy', '100.50', '2024-01-31'),
+                                            ('E1', 'C2', NULL, '7', '2024-02-29'),
+                                            ('E1', 'C3', 'Tech', '0', '2024-02-29'),
+                                            ('E1', 'C4', 'Tech', '5', '2023-12-31');
+        INSERT INTO trade_new VALUES ('T1', 'E1', 'C1', '10', '2024-01-31'),
+                                     ('T2', 'E1', 'C1', '20', '2024-02-29'),
+                                     ('T3', 'E1', 'C2', '30', '2023-12-31');
+    """)
+    conn.close()
+    return LocalMirror(path)
+
+def test_monthly_trends_on_varchar_dates(mirror, dialect):
+    trend = (f"SELECT DATE_FORMAT(t.as_of_date, '%Y-%m') AS month, SUM({dialect['notional_expr']}) AS monthly_notional "
+             f"FROM trade_new t WHERE {dialect['trend_year_filter']} GROUP BY month ORDER BY month;")
+    assert [tuple(row) for row in mirror.execute(trend)["data"]] == [("2024-01", 10), ("2024-02", 20)]
+
+    mpe = (f"SELECT DATE_FORMAT(c.as_of_date, '%Y-%m') AS month, SUM({dialect['mpe_expr']}) AS total_mpe "
+           f"FROM counterparty_new c WHERE {dialect['year_filter']} AND {dialect['mpe_filter']} "
+           f"GROUP BY month ORDER BY month;")
+    assert [tuple(row) for row in mirror.execute(mpe)["data"]] == [("2024-01", 100.5), ("2024-02", 7)]
+
+def test_comma_join_and_mysql_null_ordering(mirror, dialect):
+    sql = (f"SELECT c.counterparty_sector, SUM({dialect['notional_expr']}) AS notional "
+           "FROM counterparty_new c, trade_new t "
+           "WHERE c.entity = t.entity AND c.counterparty_id = t.reporting_counterparty_id "
+           "GROUP BY c.counterparty_sector ORDER BY c.counterparty_sector")
+    assert [tuple(row) for row in mirror.execute(sql)["data"]] == [(None, 30), ("Energy", 30)]
+    descending = mirror.execute("SELECT counterparty_sector FROM counterparty_new ORDER BY counterparty_sector DESC")
+    assert [row.counterparty_sector for row in descending["data"]] == ["Tech", "Tech", "Energy", None]
+
+def test_date_functions_cast_their_first_argument():
+    assert translate_regex("SELECT MONTH(MAX(as_of_date)), DATE_FORMAT(IFNULL(a, b), '%Y') FROM t") == (
+        "SELECT MONTH(CAST(MAX(as_of_date) AS TIMESTAMP)), STRFTIME(CAST(COALESCE(a, b) AS TIMESTAMP), '%Y') FROM t"
+    )
+    assert translate_regex("SELECT YEAR(CAST(d AS DATETIME)) FROM t") == "SELECT YEAR(CAST(d AS TIMESTAMP)) FROM t"
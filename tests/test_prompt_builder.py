@@ -0,0 +1,31 @@
+import os
+import re
+import pytest
+from src.services.ai_service import AIService
+from src.services.prompt_builder import PROVIDER_CACHE_MIN_TOKENS, count_tokens
+
+DUMP = os.path.join(os.path.dirname(__file__), "..", "data", "org_insights_final.sql")
+
+@pytest.fixture(scope="module")
+def schema():
+    """Prompt schema text for the tables in the sample dump"""
+    with open(DUMP, encoding="utf-8") as f:
+        dump = f.read()
+    tables = []
+    for name, body in re.findall(r"CREATE TABLE `(\w+)` \((.*?)\n\) ENGINE", dump, re.S):
+        columns = [f"{column} ({kind})" for column, kind in re.findall(r"^\s*`(\w+)` (\w+(?:\(\d+\))?)", body, re.M)]
+        tables.append(f"Table: {name}\nColumns: " + ", ".join(columns))
+    return "\n\n".join(tables)
+
+def test_question_to_sql_prefix_reaches_provider_cache_threshold(schema, monkeypatch):
+    service = AIService()
+    prompts = []
+    monkeypatch.setattr(service, "_complete", lambda method, prompt, **kwargs: prompts.append(prompt) or "SELECT 1")
+    monkeypatch.setattr(service, "template_sql", lambda question: None)
+
+    service.question_to_sql("Which counterparties breached their MPE limit?", schema, training_context=[], value_hints=[])
+    service.question_to_sql("Average batch MTM per entity last quarter", schema, training_context=[], value_hints=[])
+
+    prefix = os.path.commonprefix(prompts)
+    assert "Core tables schema:" in prefix
+    assert count_tokens(prefix) >= PROVIDER_CACHE_MIN_TOKENS
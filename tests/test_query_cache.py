@@ -0,0 +1,20 @@
+from src.services.query_cache import DataVersionTracker, QueryCache
+
+def test_versions_come_from_information_schema_and_write_counter(monkeypatch):
+    tracker = DataVersionTracker(ttl=60)
+    lookups = []
+    def lookup(tables):
+        lookups.append(list(tables))
+        return {table: ["2024-01-01 00:00:00", 10, 16384] for table in tables}
+    monkeypatch.setattr(tracker, "_lookup", lookup)
+
+    before = tracker.get_versions(["trade_new"])
+    assert tracker.get_versions(["trade_new"]) == before and len(lookups) == 1
+    tracker.record_writes(["trade_new"])
+    after = tracker.get_versions(["trade_new"])
+    assert after != before and len(lookups) == 2
+
+def test_cache_keys_differ_for_near_identical_literals():
+    versions = {"t": [None, None, None, 0, 0]}
+    assert (QueryCache.make_key("SELECT * FROM t WHERE name = 'A  B'", versions)
+            != QueryCache.make_key("SELECT * FROM t WHERE name = 'A B'", versions))
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+import pytest
+from src.services import result_pages
+from src.services.result_pages import ResultPager, sort_keys
+
+class _Result:
+    def __init__(self, columns, rows):
+        self._columns = columns
+        self._rows = rows
+
+    def keys(self):
+        return self._columns
+
+    def fetchmany(self, size):
+        return self._rows[:size]
+
+    def close(self):
+        pass
+
+class _Text(str):
+    def execution_options(self, **options):
+        return self
+
+@pytest.fixture
+def database(monkeypatch):
+    """Fake replica returning fixed rows; records every SQL it is asked to run"""
+    state = {"columns": [], "rows": [], "executed": []}
+
+    class _Connection:
+        def execute(self, statement, params=None):
+            state["executed"].append(str(statement))
+            return _Result(state["columns"], state["rows"])
+
+    @contextmanager
+    def connect(sql=None):
+        yield _Connection()
+
+    monkeypatch.setattr(result_pages.replica_router, "connect", connect)
+    monkeypatch.setattr(result_pages, "text", _Text)
+    monkeypatch.setattr(result_pages.rollup_router, "rewrite", lambda sql: None)
+    monkeypatch.setattr(result_pages, "_primary_key", lambda table: {"trade_new": ["trade_id"]}.get(table, []))
+    return state
+
+def _all_pages(pager, sql, columns, page_size):
+    page = pager.open(sql, columns, page_size)
+    handle, rows = page["handle"], list(page["data"])
+    while page["next_cursor"]:
+        page = pager.page(handle, page["next_cursor"], page_size)
+        rows += page["data"]
+    return rows
+
+def test_duplicate_rows_across_page_boundary_are_all_returned(database):
+    database["columns"] = ["entity", "mpe"]
+    database["rows"] = [("A", 5), ("B", 3), ("B", 3), ("B", 3), ("C", 1)]
+    pager = ResultPager(ttl=60, max_handles=10, snapshot_rows=100, snapshot_total_rows=1000)
+
+    rows = _all_pages(pager, "SELECT entity, mpe FROM counterparty_new ORDER BY mpe DESC", ["entity", "mpe"], 2)
+
+    assert rows == database["rows"]
+    assert len(database["executed"]) == 1  # later pages are served from the snapshot
+
+def test_expression_order_by_keeps_query_order(database):
+    sql = "SELECT entity, mpe FROM counterparty_new ORDER BY ABS(mpe) DESC, entity"
+    assert sort_keys(sql, ["entity", "mpe"]) is None
+    database["columns"] = ["entity", "mpe"]
+    database["rows"] = [("B", -9), ("A", 4), ("C", -1)]
+    pager = ResultPager(ttl=60, max_handles=10, snapshot_rows=100, snapshot_total_rows=1000)
+
+    assert _all_pages(pager, sql, ["entity", "mpe"], 1) == database["rows"]
+
+def test_alias_of_expression_is_not_keyset_paged():
+    sql = "SELECT trade_id, notional_usd * 2 AS notional_usd FROM trade_new ORDER BY trade_new.notional_usd"
+    assert sort_keys(sql, ["trade_id", "notional_usd"]) is None
+
+def test_keyset_keeps_order_by_and_appends_primary_key(database):
+    sql = "SELECT product_type, trade_id, notional_usd FROM trade_new ORDER BY notional_usd DESC"
+    assert sort_keys(sql, ["product_type", "trade_id", "notional_usd"]) == [("notional_usd", "desc"), ("trade_id", "asc")]
+
+def test_keyset_requires_primary_key_in_output(database):
+    sql = "SELECT product_type, notional_usd FROM trade_new ORDER BY notional_usd DESC"
+    assert sort_keys(sql, ["product_type", "notional_usd"]) is None
+
+def test_grouped_and_joined_queries_are_snapshotted(database):
+    assert sort_keys("SELECT trade_id, SUM(notional_usd) FROM trade_new GROUP BY trade_id", ["trade_id", "s"]) is None
+    assert sort_keys(
+        "SELECT t.trade_id FROM trade_new t JOIN counterparty_new c ON c.entity = t.entity", ["trade_id"]
+    ) is None
+
+def test_results_beyond_snapshot_limit_are_not_paged(database):
+    database["columns"] = ["entity"]
+    database["rows"] = [("A",), ("B",), ("C",)]
+    pager = ResultPager(ttl=60, max_handles=10, snapshot_rows=2, snapshot_total_rows=10)
+    assert pager.open("SELECT entity FROM counterparty_new GROUP BY entity", ["entity"], 1) is None
+
+def test_snapshots_past_the_total_budget_evict_the_least_recently_used(database):
+    database["columns"] = ["entity"]
+    database["rows"] = [("A",), ("B",)]
+    pager = ResultPager(ttl=60, max_handles=10, snapshot_rows=2, snapshot_total_rows=4)
+    sql = "SELECT entity FROM counterparty_new GROUP BY entity"
+    first, second = pager.open(sql, ["entity"], 1), pager.open(sql, ["entity"], 1)
+    pager.page(first["handle"], first["next_cursor"], 1)  # first is now the most recently used
+
+    third = pager.open(sql, ["entity"], 1)
+
+    with pytest.raises(KeyError):
+        pager.page(second["handle"])
+    assert pager.page(first["handle"], None, 1)["data"] == pager.page(third["handle"], None, 1)["data"] == [("A",)]
@@ -0,0 +1,55 @@
+import sqlite3
+import pytest
+from src.services.rollups import RollupRouter
+
+@pytest.fixture
+def router():
+    return RollupRouter()
+
+@pytest.fixture
+def database():
+    """Base rows plus their rollup; the Retail sector's MPE is all 0 or NULL"""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE counterparty_new_typed (as_of_date TEXT, entity TEXT, counterparty_sector TEXT, mpe NUMERIC);
+        INSERT INTO counterparty_new_typed VALUES ('2024-01-31', 'TSE', 'Energy', 100), ('2024-01-31', 'TSE', 'Energy', 0),
+            ('2024-01-31', 'TSE', 'Tech', 40), ('2024-01-31', 'TSE', 'Retail', 0), ('2024-01-31', 'TSE', 'Retail', NULL);
+        CREATE TABLE rollup_counterparty_exposure AS
+            SELECT as_of_date, entity, counterparty_sector, SUM(mpe) AS mpe, COUNT(*) AS row_count
+            FROM counterparty_new_typed GROUP BY as_of_date, entity, counterparty_sector;
+    """)
+    yield conn
+    conn.close()
+
+def test_measure_filter_blocks_routing_because_it_drops_groups(router, database):
+    sql = ("SELECT c.counterparty_sector, SUM(c.mpe) AS total_mpe FROM counterparty_new_typed c "
+           "WHERE c.mpe IS NOT NULL AND c.mpe <> 0 GROUP BY c.counterparty_sector ORDER BY total_mpe ASC LIMIT 3")
+    assert router.match(sql) is None
+    assert database.execute(sql).fetchall() == [("Tech", 40), ("Energy", 100)]
+
+def test_unfiltered_sum_routes_and_keeps_all_zero_groups(router, database):
+    sql = ("SELECT counterparty_sector, SUM(mpe) AS total_mpe FROM counterparty_new_typed "
+           "GROUP BY counterparty_sector ORDER BY counterparty_sector")
+    rollup, rewritten = router.match(sql)
+    assert rollup["name"] == "rollup_counterparty_exposure"
+    assert database.execute(rewritten).fetchall() == database.execute(sql).fetchall()
+    assert ("Retail", 0) in database.execute(rewritten).fetchall()
+
+def test_filter_on_other_measure_blocks_routing(router):
+    assert router.match(
+        "SELECT entity, SUM(epe) AS total_epe FROM counterparty_new_typed WHERE mpe <> 0 GROUP BY entity"
+    ) is None
+
+def test_mixed_measures_with_filter_do_not_route(router):
+    assert router.match(
+        "SELECT entity, SUM(mpe) AS total_mpe, SUM(epe) AS total_epe FROM counterparty_new_typed "
+        "WHERE mpe IS NOT NULL GROUP BY entity"
+    ) is None
+    assert router.match(
+        "SELECT entity, SUM(c.mpe), SUM(c.epe) FROM counterparty_new_typed c WHERE c.mpe <> 0 GROUP BY entity"
+    ) is None
+
+def test_mixed_measures_without_filters_still_route(router):
+    assert router.match(
+        "SELECT entity, SUM(mpe), SUM(epe) FROM counterparty_new_typed GROUP BY entity"
+    ) is not None
@@ -0,0 +1,16 @@
+from src.services.schema_index import SchemaIndex
+
+SCHEMA = "\n\n".join([
+    "Table: trade_new\nColumns: trade_id (varchar(50)), notional_usd (varchar(50)), as_of_date (varchar(20))",
+    "Table: counterparty_new\nColumns: counterparty_id (varchar(50)), counterparty_sector (varchar(100)), mpe (varchar(50))",
+    "Table: concentration_new\nColumns: concentration_group (varchar(100)), counterparty_count (varchar(20))",
+    "Table: collateral_new\nColumns: collateral_id (varchar(50)), collateral_value (varchar(50)), haircut (varchar(20))",
+    "Table: audit_log\nColumns: event_id (varchar(50)), event_type (varchar(50))"
+])
+PINNED = ("trade_new", "counterparty_new", "concentration_new")
+
+def test_pinned_tables_do_not_use_up_the_top_tables_budget():
+    pruned, report = SchemaIndex(SCHEMA).prune("collateral haircut by value", pinned_tables=PINNED, top_tables=1)
+    assert report["tables"] == sorted(PINNED + ("collateral_new",))
+    assert "Table: collateral_new" in pruned
+    assert "Table: audit_log" not in pruned
@@ -0,0 +1,26 @@
+import time
+from src.services import schema_state
+from src.services.schema_state import SchemaWatcher
+from src.services.schema_store import SchemaStore, write_store
+
+TABLES = [{"schema": "org_insights", "name": "trade_new", "comment": None, "columns": [
+    {"name": "trade_id", "type": "varchar(50)", "nullable": False, "primary_key": True, "default": None, "comment": None}
+], "indexes": [], "row_estimate": None, "data_bytes": None}]
+
+def test_swap_closes_the_replaced_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema_state, "STORE_CLOSE_GRACE_SECONDS", 0)
+    path = str(tmp_path / "schema.bin")
+    write_store(path, TABLES, "fp1")
+    old, new = SchemaStore(path), SchemaStore(path)
+    watcher = SchemaWatcher(schema_cache=object())
+
+    watcher._swap("Table: trade_new", "fp1", old)
+    watcher._swap("Table: trade_new", "fp2", new)
+
+    deadline = time.monotonic() + 2
+    while not old._buffer.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert old._buffer.closed
+    assert not new._buffer.closed
+    assert watcher.current.store.primary_key("trade_new") == ["trade_id"]
+    new.close()
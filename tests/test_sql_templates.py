@@ -0,0 +1,57 @@
+import sqlite3
+from types import SimpleNamespace
+import pytest
+from src.services.ai_service import AIService
+from src.services.sql_templates import SQLTemplates, value_dictionary
+
+@pytest.fixture
+def dialect():
+    return AIService._sql_dialect(SimpleNamespace(config=SimpleNamespace(USE_TYPED_TABLES=True)))
+
+@pytest.fixture
+def templates(monkeypatch):
+    monkeypatch.setattr(value_dictionary, "resolve", lambda question: [])
+    return SQLTemplates()
+
+@pytest.fixture
+def database():
+    """One counterparty row (MPE 100, product type Swap) with three trades of 10 each"""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE counterparty_new_typed (entity TEXT, counterparty_id TEXT, counterparty_name TEXT,
+            counterparty_sector TEXT, product_type TEXT, mpe NUMERIC, as_of_date TEXT);
+        CREATE TABLE trade_new_typed (trade_id TEXT, entity TEXT, reporting_counterparty_id TEXT,
+            product_type TEXT, notional_usd NUMERIC, as_of_date TEXT);
+        INSERT INTO counterparty_new_typed VALUES ('E1', 'C1', 'Acme', 'Energy', 'Swap', 100, '2024-03-31');
+        INSERT INTO trade_new_typed VALUES ('T1', 'E1', 'C1', 'Swap', 10, '2024-03-31'),
+                                           ('T2', 'E1', 'C1', 'Swap', 10, '2024-03-31'),
+                                           ('T3', 'E1', 'C1', 'Option', 10, '2024-03-31');
+    """)
+    yield conn
+    conn.close()
+
+def test_counterparty_metric_by_product_type_does_not_join_trades(templates, dialect, database):
+    matched = templates.match("MPE by product type", dialect)
+    assert matched["sql"] == (
+        "SELECT c.product_type, SUM(c.mpe) AS total_mpe\n"
+        "FROM counterparty_new_typed c\n"
+        "WHERE c.mpe IS NOT NULL AND c.mpe <> 0\n"
+        "GROUP BY c.product_type\n"
+        "ORDER BY total_mpe DESC;"
+    )
+    assert database.execute(matched["sql"]).fetchall() == [("Swap", 100)]
+
+def test_trade_metric_by_counterparty_dimension_joins(templates, dialect, database):
+    matched = templates.match("notional by sector", dialect)
+    assert "FROM trade_new_typed t, counterparty_new_typed c" in matched["sql"]
+    assert database.execute(matched["sql"]).fetchall() == [("Energy", 30)]
+
+def test_product_type_filter_stays_on_counterparty_table_for_mpe(templates, dialect, database, monkeypatch):
+    monkeypatch.setattr(value_dictionary, "resolve", lambda question: [
+        {"mention": "Swap", "table": table, "column": "product_type", "value": "Swap"}
+        for table in ("trade_new", "counterparty_new")
+    ])
+    matched = templates.match("total MPE for Swap", dialect)
+    assert "FROM counterparty_new_typed c\n" in matched["sql"]
+    assert "c.product_type = 'Swap'" in matched["sql"]
+    assert database.execute(matched["sql"]).fetchall() == [(100,)]
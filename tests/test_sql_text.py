@@ -0,0 +1,13 @@
+from src.utils.sql_text import normalize_sql
+
+def test_normalize_collapses_code_whitespace_and_comments():
+    assert normalize_sql("SELECT  a ,b\nFROM T -- note\nWHERE x = 1 ;") == normalize_sql("select a,b from t where x=1")
+
+def test_normalize_keeps_literals_verbatim():
+    assert normalize_sql("SELECT * FROM t WHERE name = 'A  B'") != normalize_sql("SELECT * FROM t WHERE name = 'A B'")
+    assert normalize_sql("SELECT * FROM t WHERE x = 'x = y'") != normalize_sql("SELECT * FROM t WHERE x = 'x=y'")
+    assert normalize_sql("SELECT * FROM t WHERE s = 'Energy'") != normalize_sql("SELECT * FROM t WHERE s = 'energy'")
+    assert normalize_sql("SELECT * FROM t WHERE name = 'A  B'").endswith("name='A  B'")
+
+def test_normalize_lowercases_backquoted_identifiers():
+    assert normalize_sql("SELECT `Col` FROM `T`") == "select `col` from `t`"